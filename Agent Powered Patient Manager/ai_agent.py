@@ -1,10 +1,14 @@
 import json
 import re
 from typing import Dict, List, Optional
-from database import PatientDatabase
+from storage import PatientStorage
+from metrics import AGENT_HANDLER_DURATION, instrument_methods
 
+# Every intent handler (_get_*_response / _search_patients_response) is timed
+@instrument_methods(AGENT_HANDLER_DURATION, "agent", "patient_ai", include=lambda name: name.endswith("_response"),
+                    method_label="handler")
 class PatientAIAgent:
-    def __init__(self, db: PatientDatabase):
+    def __init__(self, db: PatientStorage):
         self.db = db
         self.context = {}
     
@@ -114,16 +118,12 @@ class PatientAIAgent:
     def _get_floor_info_response(self, floor: Optional[int]) -> str:
         """Get response about floor information"""
         if floor is None:
-            # Get overview of all floors
-            patients = self.db.get_all_patients()
-            floor_counts = {}
-            for patient in patients:
-                floor_num = patient['floor']
-                floor_counts[floor_num] = floor_counts.get(floor_num, 0) + 1
-            
+            # Overview of all floors, read from the per-floor summaries instead of every patient
             response = "🏥 **Floor Overview**\n\n"
-            for floor_num in sorted(floor_counts.keys()):
-                response += f"**Floor {floor_num}**: {floor_counts[floor_num]} patients\n"
+            for summary in self.db.get_floor_summaries():
+                response += f"**Floor {summary['floor']}**: {summary['patients']} patients"
+                response += f" (🔴 {summary['critical_patients']} critical, 🟡 {summary['warning_patients']} warning,"
+                response += f" {summary['open_alerts']} open alerts)\n"
             
             return response
         
@@ -210,26 +210,18 @@ class PatientAIAgent:
     
     def _get_patient_count_response(self) -> str:
         """Get patient count information"""
-        all_patients = self.db.get_all_patients()
-        critical = self.db.get_critical_patients()
-        warning = self.db.get_warning_patients()
-        normal = self.db.get_normal_patients()
+        floors = self.db.get_floor_summaries()
         
         response = f"📊 **Patient Statistics**\n\n"
-        response += f"**Total Patients:** {len(all_patients)}\n"
-        response += f"• 🟢 Normal: {len(normal)}\n"
-        response += f"• 🟡 Warning: {len(warning)}\n"
-        response += f"• 🔴 Critical: {len(critical)}\n\n"
+        response += f"**Total Patients:** {sum(floor['patients'] for floor in floors)}\n"
+        response += f"• 🟢 Normal: {sum(floor['normal_patients'] for floor in floors)}\n"
+        response += f"• 🟡 Warning: {sum(floor['warning_patients'] for floor in floors)}\n"
+        response += f"• 🔴 Critical: {sum(floor['critical_patients'] for floor in floors)}\n\n"
         
         # Floor breakdown
-        floor_counts = {}
-        for patient in all_patients:
-            floor_num = patient['floor']
-            floor_counts[floor_num] = floor_counts.get(floor_num, 0) + 1
-        
         response += f"**By Floor:**\n"
-        for floor_num in sorted(floor_counts.keys()):
-            response += f"• Floor {floor_num}: {floor_counts[floor_num]} patients\n"
+        for floor in floors:
+            response += f"• Floor {floor['floor']}: {floor['patients']} patients\n"
         
         return response
     
@@ -0,0 +1,58 @@
+from typing import Dict, List, Optional, Tuple
+
+
+def airflow_status(airflow: int) -> str:
+    """Airflow band, the same thresholds as the dashboard"""
+    if airflow <= 59:
+        return 'critical'
+    if airflow <= 79:
+        return 'warning'
+    return 'normal'
+
+
+def respiratory_status(respiratory_rate: int) -> str:
+    """Respiratory rate band, the same thresholds as the dashboard"""
+    if respiratory_rate >= 26:
+        return 'critical'
+    if respiratory_rate >= 21:
+        return 'warning'
+    return 'normal'
+
+
+def _transition(old: str, new: str) -> Optional[str]:
+    """Severity to alert on when a vital moves between bands: into critical, or from normal into warning"""
+    if new == 'critical' and old != 'critical':
+        return 'critical'
+    if new == 'warning' and old == 'normal':
+        return 'warning'
+    return None
+
+
+def evaluate_alerts(current: Dict[str, Tuple[int, int]], readings: List[Dict]) -> List[Dict]:
+    """Alerts for every band crossing in a run of readings.
+
+    The rules match checkForCriticalConditions in the dashboard. Each reading is
+    compared with the patient's previous value: their stored vitals in `current`
+    ((respiratory_rate, airflow) by patient id, updated in place), then the run's
+    own earlier readings. Storage engines call this inside the write that stores
+    the readings, so every worker compares against the same committed state and
+    nothing advances if the write fails. Patients missing from `current` are skipped."""
+    alerts = []
+    for reading in readings:
+        patient_id = reading['patient_id']
+        previous = current.get(patient_id)
+        if previous is None:
+            continue
+        respiratory_rate, airflow = int(reading['respiratory_rate']), int(reading['airflow'])
+        current[patient_id] = (respiratory_rate, airflow)
+
+        severity = _transition(airflow_status(previous[1]), airflow_status(airflow))
+        if severity:
+            alerts.append({'patient_id': patient_id, 'alert_type': 'airflow', 'severity': severity,
+                           'value': airflow, 'message': f"Airflow {airflow}% ({severity})"})
+        severity = _transition(respiratory_status(previous[0]), respiratory_status(respiratory_rate))
+        if severity:
+            alerts.append({'patient_id': patient_id, 'alert_type': 'respiratory', 'severity': severity,
+                           'value': respiratory_rate,
+                           'message': f"Respiratory rate {respiratory_rate} bpm ({severity})"})
+    return alerts
@@ -1,11 +1,186 @@
-from flask import Flask, render_template, jsonify, request
+import hmac
+import json
+import os
+import time
+from datetime import datetime, timezone
+from flask import Flask, Response, g, render_template, jsonify, request
 from nurse_agent import NurseAgent
+from storage import PATIENT_SORTS, PATIENT_STATUSES, decode_cursor, encode_cursor, open_storage
+from invalidation import DataVersionWatcher, InvalidatingCache
+from metrics import REGISTRY, HTTP_REQUEST_DURATION, VITALS_INGESTED
+from profiling import SamplingProfiler, slow_query_log
+from scheduler import scheduler_from_env
+from downsampling import lttb
+from notifications import notifier_from_env
+from vitals_journal import journal_from_env
+from audit import api_users_from_env, audit_from_env, audit_readers_from_env
+from handoff import collect_handoff, summarize_handoff
+from responses import compress, dumps, encoded_json, json_response, negotiate_encoding, parse_fields, project
 
 app = Flask(__name__)
 
 # Initializes the nurse agent
 nurse_agent = NurseAgent()
 
+# Set up per worker process by create_app()
+db = None
+watcher = None
+patient_cache = None
+notifier = None
+vitals_compactor = None
+audit_log = None
+api_users = {}
+audit_readers = set()
+
+def create_app():
+    """Application factory: opens the database and starts this worker's change watcher.
+
+    Gunicorn calls this once per worker (`gunicorn -w 4 'app:create_app()'`), so every
+    worker has its own cache that is cleared when any other worker commits."""
+    global db, watcher, patient_cache, notifier, vitals_compactor, audit_log, api_users, audit_readers
+    if db is None:
+        # Patient storage (vitals history and early-warning scores), chosen by
+        # PATIENT_STORAGE / PATIENT_DB_SHARD_DIR -- see storage.open_storage
+        db = open_storage()
+
+        watcher = DataVersionWatcher(db.data_files, interval=float(os.environ.get('DATA_VERSION_POLL_SECONDS', 0.5)))
+        patient_cache = InvalidatingCache(watcher, max_entries=int(os.environ.get('PATIENT_CACHE_ENTRIES', 256)))
+        watcher.start()
+
+        # Optional crash-safe ingest journal, replayed into storage before serving
+        vitals_compactor = journal_from_env(db, on_apply=patient_cache.clear)
+
+        # Outbound alert notifications (webhook / pager / file), sent from background threads
+        notifier = notifier_from_env(db)
+        if notifier:
+            notifier.start()
+
+        # Who asked about or acknowledged what, buffered and written to its own database
+        audit_log = audit_from_env()
+        # Identity comes from server-side API tokens, never from a client-supplied name
+        api_users = api_users_from_env()
+        audit_readers = audit_readers_from_env()
+
+        # Per-class admission so ingestion and alerts stay fast during chat or export surges
+        app.wsgi_app = scheduler_from_env(app.wsgi_app)
+    return app
+
+DEFAULT_PATIENT_QUERY = {'floor': None, 'status': None, 'condition': None, 'sort': 'name', 'after': None, 'limit': None}
+
+def parse_patient_query(args):
+    """query_patients arguments from /api/patients query parameters; raises ValueError if invalid"""
+    query = dict(DEFAULT_PATIENT_QUERY)
+    if args.get('floor'):
+        query['floor'] = int(args['floor'])
+    if args.get('status'):
+        if args['status'] not in PATIENT_STATUSES:
+            raise ValueError(f"status must be one of: {', '.join(PATIENT_STATUSES)}")
+        query['status'] = args['status']
+    if args.get('condition'):
+        query['condition'] = args['condition'].strip()
+    if args.get('sort'):
+        if args['sort'] not in PATIENT_SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(PATIENT_SORTS)}")
+        query['sort'] = args['sort']
+    if args.get('limit'):
+        query['limit'] = max(1, min(int(args['limit']), 1000))
+    if args.get('cursor'):
+        query['after'] = decode_cursor(args['cursor'], query['sort'])
+    return query
+
+# Accepted vital sign values; anything else is a sensor or client error, not a reading
+VITAL_RANGES = {'respiratory_rate': range(0, 101), 'airflow': range(0, 101)}
+
+def parse_readings(payload):
+    """Readings from a POST /api/vitals body with integer vitals for known patients; raises ValueError"""
+    if not isinstance(payload, list):
+        raise ValueError('Expected a list of {patient_id, respiratory_rate, airflow} readings')
+    readings = []
+    for reading in payload:
+        if not isinstance(reading, dict) or not {'patient_id', 'respiratory_rate', 'airflow'} <= reading.keys():
+            raise ValueError('Expected a list of {patient_id, respiratory_rate, airflow} readings')
+        patient_id = str(reading['patient_id'])
+        values = {}
+        for vital, allowed in VITAL_RANGES.items():
+            value = reading[vital]
+            # bool is an int subclass, and floats would be silently truncated
+            if isinstance(value, (bool, float)) or not isinstance(value, (int, str)):
+                raise ValueError(f"{vital} must be an integer for {patient_id}")
+            try:
+                values[vital] = int(value)
+            except ValueError:
+                raise ValueError(f"{vital} must be an integer for {patient_id}")
+            if values[vital] not in allowed:
+                raise ValueError(f"{vital} out of range for {patient_id}: {values[vital]}")
+        if find_patient(patient_id) is None:
+            raise ValueError(f"Unknown patient id: {patient_id}")
+        readings.append({'patient_id': patient_id, **values})
+    return readings
+
+def get_all_patients():
+    return patient_cache.get('patients', db.get_all_patients)
+
+def find_patient(patient_id):
+    patients_by_id = patient_cache.get('patients_by_id', lambda: {p['id']: p for p in get_all_patients()})
+    return patients_by_id.get(patient_id)
+
+# Request latency histogram, labelled by route pattern rather than raw path
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - g.request_start,
+                                      method=request.method, route=route, status=response.status_code)
+    return response
+
+# On-demand profiling: send `X-Profile: 1` or `?profile=1` to get a sampling-profiler
+# summary with the response. Only in debug mode unless ALLOW_REQUEST_PROFILING=1.
+def profiling_allowed():
+    return app.debug or os.environ.get('ALLOW_REQUEST_PROFILING') == '1'
+
+@app.before_request
+def start_profiler():
+    if profiling_allowed() and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+        g.profiler = SamplingProfiler(interval=float(os.environ.get('PROFILE_INTERVAL_MS', 1)) / 1000)
+        g.profiler.start()
+
+@app.after_request
+def attach_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    summary = profiler.summary()
+
+    payload = response.get_json(silent=True) if response.is_json else None
+    if isinstance(payload, dict):
+        payload['profile'] = summary
+        response.set_data(json.dumps(payload))
+    else:
+        # Lists and HTML keep their shape; a short summary goes in a header instead
+        response.headers['X-Profile-Summary'] = json.dumps({
+            'elapsed_ms': summary['elapsed_ms'],
+            'samples': summary['samples'],
+            'self': summary['self'][:5],
+            'queries': {'count': summary['queries']['count'], 'total_ms': summary['queries']['total_ms']},
+        })
+    return response
+
+@app.route('/debug/slow-queries')
+def slow_queries():
+    if not profiling_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'threshold_ms': slow_query_log.threshold_ms, 'queries': slow_query_log.entries()})
+
+# Prometheus scrape endpoint (metrics are per worker process)
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Patient routes
 @app.route('/')
 def index():
@@ -15,17 +190,6 @@ def index():
 def patients():
     return render_template('patients.html')
 
-# Patient data
-patients_data = [
-    {"id": "P001", "name": "John Smith", "age": 45, "condition": "Diabetes", "last_visit": "2024-01-15", "floor": 1, "respiratory_rate": 18, "airflow": 85},
-    {"id": "P002", "name": "Sarah Johnson", "age": 32, "condition": "Hypertension", "last_visit": "2024-01-10", "floor": 2, "respiratory_rate": 25, "airflow": 65},
-    {"id": "P003", "name": "Mike Davis", "age": 58, "condition": "Heart Disease", "last_visit": "2024-01-12", "floor": 3, "respiratory_rate": 14, "airflow": 100},
-    {"id": "P004", "name": "Emily Brown", "age": 28, "condition": "Asthma", "last_visit": "2024-01-08", "floor": 4, "respiratory_rate": 30, "airflow": 45},
-    {"id": "P005", "name": "Robert Wilson", "age": 67, "condition": "Arthritis", "last_visit": "2024-01-05", "floor": 5, "respiratory_rate": 23, "airflow": 85},
-    {"id": "P006", "name": "Russell Wilson", "age": 33, "condition": "Chicken Pox", "last_visit": "2024-01-05", "floor": 1, "respiratory_rate": 17, "airflow": 94},
-    {"id": "P007", "name": "Larry Bird", "age": 72, "condition": "Respiratory Problems", "last_visit": "2024-01-05", "floor": 2, "respiratory_rate": 13, "airflow": 85},
-    {"id": "P008", "name": "Kevin Durant", "age": 83, "condition": "General Checkup", "last_visit": "2024-01-05", "floor": 3, "respiratory_rate": 22, "airflow": 80}
-]
 # returns the ventilation status if patients airflow or respiratory rate is off
 def get_ventilation_status(patient):
     if patient['respiratory_rate'] >= 26 or patient['airflow'] <= 59:
@@ -35,9 +199,153 @@ def get_ventilation_status(patient):
     else:
         return 'normal'
 #grabs the # of patients
+# Filters (floor, status, condition), sort order and keyset pagination run in the
+# storage engine's indexes; `?fields=id,name,floor` trims each record. The next
+# page's cursor comes back in the X-Next-Cursor header so the body stays a list.
 @app.route('/api/patients')
 def get_patients():
-    return jsonify(patients_data)
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        query = parse_patient_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+
+    def load():
+        if query == DEFAULT_PATIENT_QUERY:
+            patients, next_cursor = get_all_patients(), None
+        else:
+            patients = db.query_patients(**query)
+            next_cursor = None
+            if query['limit'] is not None and len(patients) == query['limit']:
+                next_cursor = encode_cursor(patients[-1], query['sort'])
+        body, content_encoding = compress(dumps(project(patients, fields)), encoding)
+        return body, content_encoding, next_cursor
+
+    # Cache the shapes dashboards poll; free-text and deep-page queries go straight to the index
+    if query['condition'] is None and query['after'] is None:
+        body, content_encoding, next_cursor = patient_cache.get(
+            ('patients_json', fields, encoding, tuple(sorted(query.items()))), load)
+    else:
+        body, content_encoding, next_cursor = load()
+
+    response = json_response(body, content_encoding)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Dashboard polling: only the patients changed since the client's cursor (all of them without one).
+# The next cursor comes back in X-Change-Cursor so the body stays a list, like /api/patients.
+@app.route('/api/patients/changes')
+def get_patient_changes():
+    since = request.args.get('since')
+    floor = request.args.get('floor', type=int)
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+
+    def load():
+        patients, cursor = db.get_patient_changes(since, floor)
+        body, content_encoding = compress(dumps(project(patients, fields)), encoding)
+        return body, content_encoding, cursor
+
+    # Every station on a floor polls with the same cursor after a tick, so they share one read
+    try:
+        body, content_encoding, cursor = patient_cache.get(('patient_changes', since, floor, fields, encoding), load)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = json_response(body, content_encoding)
+    response.headers['X-Change-Cursor'] = cursor
+    return response
+
+# "who to see next" list for charge nurses, ranked by early-warning score
+@app.route('/api/patients/ranked')
+def get_ranked_patients():
+    limit = request.args.get('limit', 10, type=int)
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ranked = project(db.get_ranked_patients(max(1, min(limit, 500))), fields)
+    return json_response(*encoded_json(ranked, request.headers.get('Accept-Encoding', '')))
+
+# Hospital-wide board: one incrementally maintained summary row per floor
+@app.route('/api/floors/summary')
+def get_floor_summaries():
+    return jsonify(db.get_floor_summaries())
+
+# Shift handoff for a floor (or the whole hospital), streamed one patient per line as it is generated
+@app.route('/api/reports/handoff')
+def handoff_report():
+    floor = request.args.get('floor', type=int)
+    as_text = request.args.get('format') == 'text'
+    # Read everything up front so no database work is held open while the report streams
+    entries = collect_handoff(db, floor)
+
+    def generate():
+        for record in summarize_handoff(entries):
+            yield f"[{record['status'].upper()}] {record['summary']}\n\n".encode('utf-8') if as_text else dumps(record) + b'\n'
+
+    return Response(generate(), mimetype='text/plain' if as_text else 'application/x-ndjson')
+
+# ingest tick: a batch of vitals readings, rescored across the census in one pass
+@app.route('/api/vitals', methods=['POST'])
+def ingest_vitals():
+    # Validated here for both paths, so bad values never reach storage or the journal
+    try:
+        readings = parse_readings(request.get_json() or [])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if vitals_compactor:
+        # Durable once journaled; the compactor commits it to storage within VITALS_COMPACT_SECONDS,
+        # raising any alerts then, so none come back in this response
+        try:
+            vitals_compactor.journal.append(readings)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        alerts = []
+    else:
+        # Alerts are evaluated against the stored vitals and recorded in the same transaction
+        alerts = db.ingest_vitals_batch(readings)
+        if alerts is None:
+            return jsonify({'error': 'Failed to store vitals'}), 500
+
+        # Other workers pick this up through their data_version watchers
+        patient_cache.clear()
+
+    VITALS_INGESTED.inc(len(readings))
+
+    return jsonify({'ingested': len(readings), 'alerts': alerts})
+
+def current_user():
+    """Username whose API token (API_TOKENS) the request carries as a bearer token, or 'anonymous'"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    token = token.strip()
+    if scheme.lower() != 'bearer' or not token:
+        return 'anonymous'
+    for known, user in api_users.items():
+        if hmac.compare_digest(token.encode(), known.encode()):
+            return user
+    return 'anonymous'
+
+@app.route('/api/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    alert = db.get_alert(alert_id)
+    if alert is None or alert['acknowledged']:
+        return jsonify({'error': 'No unacknowledged alert with that id'}), 404
+    if not db.acknowledge_alert(alert_id):
+        return jsonify({'error': 'Failed to acknowledge alert'}), 500
+
+    audit_log.record('alert_ack', current_user(), patient_id=alert['patient_id'], alert_id=alert_id,
+                     detail={'alert_type': alert['alert_type'], 'severity': alert['severity']})
+    return jsonify({'acknowledged': alert_id})
 
 @app.route('/api/patient-chat', methods=['POST'])
 def handle_patient_chat():
@@ -54,16 +362,13 @@ def handle_patient_chat():
             return jsonify({'error': 'No patient ID provided'}), 400
         
         # Finds the patient
-        patient = None
-        for p in patients_data:
-            if p['id'] == patient_id:
-                patient = p
-                break
+        patient = find_patient(patient_id)
         
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
         
         print(f"Received message for {patient['name']}: {message}")
+        audit_log.record('chat_query', current_user(), patient_id=patient_id, detail={'message': message})
         
         # Process message with nurse agent
         response = nurse_agent.process_message(message, patient)
@@ -73,15 +378,58 @@ def handle_patient_chat():
     except Exception as e:
         print(f"Error processing message: {e}")
         return jsonify({'message': 'Sorry, I encountered an error processing your request. Please try again.'}), 500
+def parse_timestamp(value):
+    """Normalise an ISO 8601 time to the database's UTC 'YYYY-MM-DD HH:MM:SS' format"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+# Vitals trend for charts: any time range, downsampled to at most `points` per series
+@app.route('/api/patient/<patient_id>/vitals')
+def get_patient_vitals_trend(patient_id):
+    try:
+        start = parse_timestamp(request.args['from']) if request.args.get('from') else None
+        end = parse_timestamp(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 timestamps'}), 400
+    points = max(3, min(request.args.get('points', 500, type=int), 5000))
+
+    if not find_patient(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+
+    vitals = db.get_patient_vitals_range(patient_id, start, end)
+    times = [datetime.fromisoformat(v['timestamp']).timestamp() for v in vitals]
+    trend = {'patient_id': patient_id, 'from': start, 'to': end, 'raw_points': len(vitals)}
+    for series in ('respiratory_rate', 'airflow'):
+        # Downsampled separately so each series keeps its own peaks and troughs
+        kept = lttb([(t, v[series]) for t, v in zip(times, vitals)], points)
+        trend[series] = [[vitals[i]['timestamp'], vitals[i][series]] for i in kept]
+
+    return json_response(*encoded_json(trend, request.headers.get('Accept-Encoding', '')))
+
+# Audit trail: filter by patient_id, event, user and from/to (ISO 8601), newest first
+@app.route('/api/audit')
+def get_audit_events():
+    # Chat text is patient data: only AUDIT_READERS may query the trail
+    if current_user() not in audit_readers:
+        return jsonify({'error': 'Audit access requires an API token for a user in AUDIT_READERS'}), 403
+    try:
+        start = parse_timestamp(request.args['from']) if request.args.get('from') else None
+        end = parse_timestamp(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 timestamps'}), 400
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+    events = audit_log.query(patient_id=request.args.get('patient_id'), event=request.args.get('event'),
+                             user=request.args.get('user'), start=start, end=end, limit=limit)
+    return jsonify(events)
+
 # grabbing the patients ID's
 @app.route('/patient/<patient_id>')
 def patient_detail(patient_id):
     # Find the specific patient
-    patient = None
-    for p in patients_data:
-        if p['id'] == patient_id:
-            patient = p
-            break
+    patient = find_patient(patient_id)
     
     if patient:
         return render_template('patient_detail.html', patient=patient)
@@ -90,4 +438,4 @@ def patient_detail(patient_id):
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,178 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from metrics import AUDIT_BUFFERED, AUDIT_DROPPED, AUDIT_EVENTS, AUDIT_OVERFLOW_FLUSHES
+from profiling import TimedConnection
+
+AUDIT_COLUMNS = ('timestamp', 'event', 'user', 'patient_id', 'alert_id', 'detail')
+
+
+class AuditLog:
+    """Compliance audit trail of who did what to which patient, kept in its own SQLite file.
+
+    record() only appends to an in-memory buffer; a background thread writes
+    the buffer in one transaction every flush_interval seconds, so auditing
+    adds one small commit per interval instead of one per request, and none
+    to the patient database. Memory is bounded: when the buffer reaches
+    max_buffer the recording thread writes the batch itself rather than drop
+    records. Triggers make the table append-only."""
+
+    def __init__(self, db_path: str = "audit.db", max_buffer: int = 10000, flush_interval: float = 1.0):
+        self.db_path = db_path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self._buffer: List[tuple] = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one writer at a time, so batches land in order
+        self._stop = threading.Event()
+        self._thread = None
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5, factory=TimedConnection)
+
+    def _init_schema(self):
+        conn = self._connect()
+        # WAL lets queries read while a worker flushes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS audit_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                event TEXT NOT NULL,
+                user TEXT NOT NULL,
+                patient_id TEXT,
+                alert_id INTEGER,
+                detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_audit_events_patient_time ON audit_events (patient_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_audit_events_time ON audit_events (timestamp);
+            CREATE TRIGGER IF NOT EXISTS audit_events_no_update BEFORE UPDATE ON audit_events
+            BEGIN SELECT RAISE(ABORT, 'audit_events is append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS audit_events_no_delete BEFORE DELETE ON audit_events
+            BEGIN SELECT RAISE(ABORT, 'audit_events is append-only'); END;
+        ''')
+        conn.close()
+
+    def record(self, event: str, user: str, patient_id: Optional[str] = None, alert_id: Optional[int] = None,
+               detail: Optional[Dict] = None):
+        """Buffer an audit event, timestamped now"""
+        row = (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), event, user or 'anonymous', patient_id, alert_id,
+               json.dumps(detail) if detail else None)
+        with self._buffer_lock:
+            self._buffer.append(row)
+            depth = len(self._buffer)
+        AUDIT_EVENTS.inc(event=event)
+        AUDIT_BUFFERED.set(depth)
+        if depth >= self.max_buffer:
+            AUDIT_OVERFLOW_FLUSHES.inc()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far in one transaction; returns the number of events written"""
+        with self._write_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                conn = self._connect()
+                conn.executemany(f'''
+                    INSERT INTO audit_events ({', '.join(AUDIT_COLUMNS)}) VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})
+                ''', batch)
+                conn.commit()
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error flushing audit log: {e}")
+                with self._buffer_lock:
+                    # Keep the unwritten batch for the next attempt, but never beyond max_buffer
+                    self._buffer[:0] = batch
+                    dropped = max(0, len(self._buffer) - self.max_buffer)
+                    del self._buffer[self.max_buffer:]
+                if dropped:
+                    AUDIT_DROPPED.inc(dropped)
+                    print(f"Audit buffer full while the store is failing: dropped {dropped} events")
+                return 0
+            finally:
+                AUDIT_BUFFERED.set(len(self._buffer))
+            return len(batch)
+
+    def query(self, patient_id: Optional[str] = None, event: Optional[str] = None, user: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Audit events, newest first, filtered by patient, event type, user and time range (inclusive).
+        This worker's buffered events are flushed first; other workers' appear within flush_interval."""
+        self.flush()
+        clauses, params = [], []
+        for column, value in (('patient_id', patient_id), ('event', event), ('user', user)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'''
+            SELECT * FROM audit_events
+            {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+        conn.close()
+
+        events = [dict(row) for row in rows]
+        for event_row in events:
+            event_row['detail'] = json.loads(event_row['detail']) if event_row['detail'] else None
+        return events
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """Flush on a daemon thread every flush_interval seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the flush thread and write whatever is still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def audit_from_env() -> AuditLog:
+    """Open and start the audit log at AUDIT_DB_PATH (audit.db), flushed every AUDIT_FLUSH_SECONDS
+    (default 1) and holding at most AUDIT_BUFFER_SIZE (default 10000) unflushed events"""
+    audit_log = AuditLog(os.environ.get('AUDIT_DB_PATH', 'audit.db'),
+                         max_buffer=int(os.environ.get('AUDIT_BUFFER_SIZE', 10000)),
+                         flush_interval=float(os.environ.get('AUDIT_FLUSH_SECONDS', 1.0)))
+    audit_log.start()
+    atexit.register(audit_log.close)
+    return audit_log
+
+
+def api_users_from_env() -> Dict[str, str]:
+    """API tokens from API_TOKENS ("user:token,user:token"), mapped to their usernames"""
+    users = {}
+    for entry in os.environ.get('API_TOKENS', '').split(','):
+        user, _, token = entry.strip().partition(':')
+        if user and token:
+            users[token] = user
+    return users
+
+
+def audit_readers_from_env() -> Set[str]:
+    """Usernames allowed to query the audit trail, from AUDIT_READERS ("user,user"); nobody by default"""
+    return {user.strip() for user in os.environ.get('AUDIT_READERS', '').split(',') if user.strip()} - {'anonymous'}
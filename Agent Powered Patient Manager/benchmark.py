@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for Patient Management System
+Measures storage engine latency, application startup time, API payload cost and ingest throughput
+"""
+
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from condition_index import ConditionIndex
+import nurse_agent
+import responses
+import scheduler
+from database import PatientDatabase
+from handoff import collect_handoff, summarize_handoff
+from memory_storage import InMemoryPatientStorage
+from nurse_agent import NurseAgent
+from vitals_journal import JournalCompactor, VitalsJournal
+
+
+def make_patients(count):
+    """Generate a synthetic census spread over ten floors"""
+    conditions = ["Diabetes", "Hypertension", "Heart Disease", "Asthma", "Arthritis", "COPD"]
+    return [
+        {
+            "id": f"B{i:05d}",
+            "name": f"Patient {i:05d}",
+            "age": random.randint(18, 95),
+            "condition": random.choice(conditions),
+            "last_visit": "2024-01-15",
+            "floor": i % 10 + 1,
+            "respiratory_rate": random.randint(8, 35),
+            "airflow": random.randint(30, 100),
+        }
+        for i in range(count)
+    ]
+
+
+def time_operation(operation, repeat):
+    """Run an operation `repeat` times and return per-call latencies in milliseconds"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {name:<28} mean {statistics.mean(samples):8.3f} ms   p50 {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def bench_storage(storage, patients, repeat):
+    """Time each storage operation against an already-populated census"""
+    ids = [p["id"] for p in patients]
+    operations = [
+        ("get_patient_by_id", lambda i: storage.get_patient_by_id(ids[i % len(ids)])),
+        ("update_patient_vitals", lambda i: storage.update_patient_vitals(ids[i % len(ids)], random.randint(8, 35), random.randint(30, 100))),
+        ("ingest_vitals_batch (100)", lambda i: storage.ingest_vitals_batch([
+            {"patient_id": ids[(i * 100 + j) % len(ids)], "respiratory_rate": random.randint(8, 35), "airflow": random.randint(30, 100)}
+            for j in range(100)
+        ])),
+        ("get_patient_vitals_history", lambda i: storage.get_patient_vitals_history(ids[i % len(ids)], 10)),
+        ("add_alert", lambda i: storage.add_alert(ids[i % len(ids)], "airflow", "critical", 45, "benchmark")),
+        ("get_unacknowledged_alerts", lambda i: storage.get_unacknowledged_alerts()),
+        ("acknowledge_alert", lambda i: storage.acknowledge_alert(i + 1)),
+        ("search_patients", lambda i: storage.search_patients(f"{i % 100:02d}")),
+        ("get_patients_by_floor", lambda i: storage.get_patients_by_floor(i % 10 + 1)),
+        ("get_critical_patients", lambda i: storage.get_critical_patients()),
+        ("get_ranked_patients (10)", lambda i: storage.get_ranked_patients(10)),
+        ("get_all_patients", lambda i: storage.get_all_patients()),
+    ]
+    for name, operation in operations:
+        report(name, time_operation(operation, repeat))
+
+
+def benchmark_storage(patient_count=1000, repeat=200):
+    """Compare the SQLite and in-memory engines operation by operation"""
+    patients = make_patients(patient_count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [
+            ("SQLite (PatientDatabase)", lambda: PatientDatabase(os.path.join(tmp, "bench.db"), seed=False)),
+            ("In-memory (no persistence)", lambda: InMemoryPatientStorage(seed=False)),
+            ("In-memory (append log)", lambda: InMemoryPatientStorage(os.path.join(tmp, "memory"), seed=False, snapshot_interval=0)),
+        ]
+        print(f"=== Storage benchmark: {patient_count} patients, {repeat} calls per operation ===")
+        for label, factory in engines:
+            start = time.perf_counter()
+            storage = factory()
+            for patient in patients:
+                storage.add_patient(patient)
+            print(f"\n{label} (setup {time.perf_counter() - start:.2f} s)")
+            bench_storage(storage, patients, repeat)
+            if isinstance(storage, InMemoryPatientStorage):
+                storage.close()
+
+
+COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def benchmark_startup(repeat=5):
+    """Time cold start of a worker, schema checks and agent knowledge loading"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"=== Startup benchmark: {repeat} runs ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cold start: a fresh interpreter importing the app and running the factory,
+        # which is what a new Gunicorn worker does after recycling or scale-up
+        env = dict(os.environ, PYTHONPATH=app_dir)
+        for label in ("new database", "existing database"):
+            process_ms, factory_ms = [], []
+            for _ in range(repeat):
+                if label == "new database" and os.path.exists(os.path.join(tmp, "patients.db")):
+                    os.remove(os.path.join(tmp, "patients.db"))
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=tmp, env=env,
+                                        capture_output=True, text=True)
+                process_ms.append((time.perf_counter() - start) * 1000)
+                if result.returncode != 0:
+                    print(f"  Cold start failed: {result.stderr.strip().splitlines()[-1]}")
+                    break
+                factory_ms.append(float(result.stdout.strip().splitlines()[-1]))
+            else:
+                print(f"\nCold start, {label}")
+                report("process (interpreter + app)", process_ms)
+                report("import app + create_app()", factory_ms)
+
+        # Schema initialisation in-process
+        print("\nPatientDatabase()")
+        path = os.path.join(tmp, "schema.db")
+
+        def fresh(i):
+            if os.path.exists(path):
+                os.remove(path)
+            PatientDatabase(path)
+        report("new file (migrate + seed)", time_operation(fresh, repeat))
+        report("up-to-date schema", time_operation(lambda i: PatientDatabase(path), repeat * 20))
+
+    # Agent knowledge is loaded on first use rather than at construction
+    print("\nNurseAgent")
+    report("construct", time_operation(lambda i: NurseAgent(), repeat * 20))
+
+    def first_access(i):
+        nurse_agent._knowledge_cache.clear()
+        NurseAgent().medical_knowledge
+    report("first knowledge access", time_operation(first_access, repeat))
+
+
+def benchmark_payload(patient_count=2000, repeat=50):
+    """Compare /api/patients body size and encode time across serialisers, projections and codings"""
+    patients = make_patients(patient_count)
+    projections = [
+        ("all fields", None),
+        ("dashboard fields", responses.parse_fields("id,name,floor,respiratory_rate,airflow")),
+        ("id,floor,airflow", responses.parse_fields("id,floor,airflow")),
+    ]
+    serializers = [("json (stdlib)", lambda obj: json.dumps(obj, indent=None).encode("utf-8"))]
+    if responses.orjson is not None:
+        serializers.append(("orjson", responses.orjson.dumps))
+    codings = [None, "gzip"] + (["br"] if responses.brotli is not None else [])
+
+    print(f"=== Payload benchmark: {patient_count} patients, {repeat} runs ===")
+    if responses.orjson is None:
+        print("  (orjson not installed, skipping)")
+    if responses.brotli is None:
+        print("  (brotli not installed, skipping br)")
+
+    for label, fields in projections:
+        records = responses.project(patients, fields)
+        print(f"\n{label}")
+        for name, serialize in serializers:
+            report(f"serialize: {name}", time_operation(lambda i: serialize(records), repeat))
+        body = responses.dumps(records)
+        for coding in codings:
+            compressed, _ = responses.compress(body, coding)
+            samples = time_operation(lambda i: responses.compress(body, coding), repeat) if coding else [0.0]
+            print(f"  {coding or 'identity':<28} {len(compressed) / 1024:9.1f} KiB   encode mean {statistics.mean(samples):8.3f} ms")
+
+
+def benchmark_scheduler(chat_requests=300, server_threads=32, chat_seconds=0.2):
+    """Vitals ingest latency during a chat surge, with and without the priority scheduler.
+
+    A stub WSGI app stands in for Flask (chat holds a thread for `chat_seconds`,
+    an ingest tick for 2 ms) and a thread pool stands in for the server's threads."""
+    def stub_app(environ, start_response):
+        time.sleep(chat_seconds if environ['PATH_INFO'] == '/api/patient-chat' else 0.002)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{}']
+
+    def call(wsgi_app, method, path):
+        statuses = []
+        body = wsgi_app({'REQUEST_METHOD': method, 'PATH_INFO': path}, lambda status, headers: statuses.append(status))
+        b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return statuses[0]
+
+    print(f"=== Scheduler benchmark: {chat_requests} chat requests of {chat_seconds * 1000:.0f} ms, {server_threads} server threads ===")
+    for label, wsgi_app in (("No scheduler", stub_app), ("Priority scheduler", scheduler.RequestScheduler(stub_app))):
+        with ThreadPoolExecutor(max_workers=server_threads) as server:
+            chat = [server.submit(call, wsgi_app, 'POST', '/api/patient-chat') for _ in range(chat_requests)]
+            ingest_ms = []
+            for _ in range(20):
+                start = time.perf_counter()
+                server.submit(call, wsgi_app, 'POST', '/api/vitals').result()
+                ingest_ms.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.01)
+            statuses = [future.result() for future in chat]
+        print(f"\n{label}")
+        report("POST /api/vitals", ingest_ms)
+        print(f"  chat served {sum(s.startswith('200') for s in statuses)}, shed with 503 {sum(s.startswith('503') for s in statuses)}")
+
+
+def benchmark_conditions(condition_count=5000, repeat=500):
+    """Build time and lookup latency of the condition index over a synthetic knowledge base"""
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(4, 10))) for _ in range(condition_count)]
+    knowledge = {
+        " ".join(random.sample(words, random.randint(1, 3))): {"synonyms": [" ".join(random.sample(words, 2))]}
+        for _ in range(condition_count)
+    }
+    names = list(knowledge)
+
+    print(f"=== Condition index benchmark: {len(knowledge)} conditions, {repeat} lookups per kind ===")
+    start = time.perf_counter()
+    index = ConditionIndex(knowledge)
+    print(f"  build {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    queries = {
+        "exact": random.sample(names, repeat),
+        "qualified": [" ".join(reversed(n.split())) + " (severe)" for n in random.sample(names, repeat)],
+        "misspelled": [n[:-1] + "x" for n in random.sample(names, repeat)],
+        "unknown": ["".join(random.choices(string.ascii_lowercase, k=9)) for _ in range(repeat)],
+    }
+    for kind, strings in queries.items():
+        report(f"{kind} (first lookup)", time_operation(lambda i: index._resolve(strings[i]), repeat))
+    for strings in queries.values():
+        for condition in strings:
+            index.resolve(condition)
+    report("memoized lookup", time_operation(lambda i: index.resolve(queries["misspelled"][i]), repeat))
+
+
+def benchmark_journal(ticks=2000, tick_size=10):
+    """Burst ingest throughput committing each tick to SQLite versus appending it to the vitals journal"""
+    patients = make_patients(1000)
+    ticks_readings = [
+        [{"patient_id": random.choice(patients)["id"], "respiratory_rate": random.randint(8, 35), "airflow": random.randint(30, 100)}
+         for _ in range(tick_size)]
+        for _ in range(ticks)
+    ]
+
+    print(f"=== Journal benchmark: burst of {ticks} ingest ticks of {tick_size} readings ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = PatientDatabase(os.path.join(tmp, "bench.db"), seed=False)
+        for patient in patients:
+            storage.add_patient(patient)
+
+        def burst(label, ingest):
+            start = time.perf_counter()
+            samples = time_operation(lambda i: ingest(ticks_readings[i]), ticks)
+            elapsed = time.perf_counter() - start
+            print(f"\n{label}: {ticks * tick_size / elapsed:,.0f} readings/s")
+            report("per tick", samples)
+
+        burst("SQLite commit per tick", storage.ingest_vitals_batch)
+        for sync in (True, False):
+            journal = VitalsJournal(os.path.join(tmp, f"journal-{sync}"), sync=sync)
+            burst(f"Journal append ({'msync' if sync else 'no msync'})", journal.append)
+            start = time.perf_counter()
+            compacted = JournalCompactor(journal, storage).compact()
+            print(f"  compaction of the burst: {compacted} readings in {time.perf_counter() - start:.2f} s")
+            journal.close()
+
+
+def benchmark_handoff(patient_count=500):
+    """Shift handoff for a whole census: one summary request per patient versus one bulk report,
+    summarized in-process and across the process pool"""
+    patients = make_patients(patient_count)
+    print(f"=== Handoff benchmark: {patient_count} patients ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = PatientDatabase(os.path.join(tmp, "bench.db"), seed=False)
+        for patient in patients:
+            storage.add_patient(patient)
+        for _ in range(10):
+            storage.ingest_vitals_batch([
+                {"patient_id": p["id"], "respiratory_rate": random.randint(8, 35), "airflow": random.randint(30, 100)}
+                for p in patients
+            ])
+        for patient in random.sample(patients, patient_count // 5):
+            storage.add_alert(patient["id"], "airflow", "critical", patient["airflow"], "benchmark")
+
+        def timed(label, produce):
+            start = time.perf_counter()
+            count = sum(1 for _ in produce())
+            print(f"  {label:<40} {count} summaries in {time.perf_counter() - start:7.3f} s")
+
+        agent = NurseAgent()
+
+        def per_patient():
+            # What the chat endpoint does for each "summary" request, minus the HTTP round trip
+            for patient in patients:
+                record = storage.get_patient_by_id(patient["id"])
+                storage.get_patient_vitals_history(patient["id"], 5)
+                yield agent.process_message("summary", record)
+
+        timed("one request per patient", per_patient)
+        timed("bulk report, in-process", lambda: summarize_handoff(collect_handoff(storage), parallel_min=patient_count + 1))
+        timed("bulk report, process pool (cold)", lambda: summarize_handoff(collect_handoff(storage), parallel_min=0))
+        timed("bulk report, process pool (warm)", lambda: summarize_handoff(collect_handoff(storage), parallel_min=0))
+
+
+def main():
+    """Main function to handle command line arguments"""
+    if len(sys.argv) < 2:
+        print("Usage: python benchmark.py <command> [args]")
+        print("Commands:")
+        print("  storage [patients] [repeat] - Per-operation latency of each storage engine")
+        print("  startup [repeat] - Cold start, schema check and agent knowledge load times")
+        print("  payload [patients] [repeat] - /api/patients size and encode time by fields and compression")
+        print("  scheduler [chat_requests] - Ingest latency during a chat surge, with and without the scheduler")
+        print("  conditions [count] - Condition index build time and fuzzy lookup latency")
+        print("  journal [ticks] - Burst ingest throughput with and without the vitals journal")
+        print("  handoff [patients] - Shift handoff report time per patient request versus in bulk")
+        return
+
+    command = sys.argv[1].lower()
+
+    if command == "storage":
+        patient_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+        benchmark_storage(patient_count, repeat)
+    elif command == "startup":
+        repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        benchmark_startup(repeat)
+    elif command == "payload":
+        patient_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+        repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        benchmark_payload(patient_count, repeat)
+    elif command == "scheduler":
+        chat_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+        benchmark_scheduler(chat_requests)
+    elif command == "conditions":
+        condition_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        benchmark_conditions(condition_count)
+    elif command == "journal":
+        ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+        benchmark_journal(ticks)
+    elif command == "handoff":
+        patient_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+        benchmark_handoff(patient_count)
+    else:
+        print("Invalid command. Use 'python benchmark.py' to see available commands.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import functools
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+# Qualifiers that describe severity or course rather than which condition it is,
+# so "Asthma (severe)" and "chronic asthma" both resolve to asthma
+QUALIFIER_WORDS = {
+    'acute', 'chronic', 'mild', 'moderate', 'severe', 'stable', 'unstable', 'suspected', 'history', 'hx',
+    'of', 'the', 'and', 'with', 'without', 'a', 'an', 'in', 'on', 'due', 'to', 'left', 'right', 'bilateral',
+    'early', 'late', 'stage', 'onset', 'exacerbation', 'flare', 'episode', 'recurrent',
+}
+
+# Minimum IDF-weighted token overlap for a word-level match
+MIN_TOKEN_SCORE = 0.5
+# Spelling correction: how many trigram-similar aliases to check by edit distance
+SPELLING_CANDIDATES = 20
+MIN_TRIGRAM_SCORE = 0.25
+
+# Prefixes with opposite meanings that are only an edit or two apart
+# ("hypotension" is not a misspelling of "hypertension")
+CONTRASTING_PREFIXES = [('hypo', 'hyper'), ('hyper', 'hypo'), ('brady', 'tachy'), ('tachy', 'brady')]
+
+
+def normalize(text: str) -> Tuple[str, ...]:
+    """Lowercase word tokens of a condition name, with qualifiers dropped"""
+    tokens = re.findall(r'[a-z0-9]+', text.lower())
+    meaningful = tuple(token for token in tokens if token not in QUALIFIER_WORDS)
+    return meaningful or tuple(tokens)
+
+
+def allowed_edits(text: str) -> int:
+    """Typos tolerated for a name of this length; short names and abbreviations must match exactly"""
+    if len(text) <= 4:
+        return 0
+    return 1 if len(text) <= 8 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein distance (optimal string alignment, so swapped letters count once),
+    giving up with limit + 1 as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = 0 if char_a == char_b else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                value = min(value, previous2[j - 2] + 1)
+            current.append(value)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def contrasting(a: str, b: str) -> bool:
+    """True if two names differ by an opposite-meaning prefix on the same word"""
+    for word_a, word_b in zip(a.split(), b.split()):
+        for prefix, opposite in CONTRASTING_PREFIXES:
+            if word_a.startswith(prefix) and word_b.startswith(opposite) and not word_b.startswith(prefix):
+                return True
+    return False
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of a normalised string, padded so word edges count"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ConditionIndex:
+    """Resolves free-text condition names to knowledge base entries.
+
+    Every entry's name and "synonyms" are normalised into aliases. Lookup
+    tries an exact alias match first, then an IDF-weighted token overlap over
+    an inverted index, then a trigram-shortlisted edit-distance check to
+    catch misspellings. Only aliases sharing a token or trigram with the
+    query are scored, so lookups
+    stay fast with thousands of conditions, and each distinct string is
+    resolved once."""
+
+    def __init__(self, knowledge: Dict[str, Dict], cache_size: int = 4096):
+        self.knowledge = knowledge
+        self._aliases: Dict[str, str] = {}  # normalised alias -> knowledge key
+        self._alias_tokens: Dict[str, Tuple[str, ...]] = {}
+        self._alias_trigrams: Dict[str, int] = {}
+        self._token_index: Dict[str, set] = defaultdict(set)
+        self._trigram_index: Dict[str, set] = defaultdict(set)
+
+        for key, info in knowledge.items():
+            for name in [key] + list(info.get('synonyms', [])):
+                tokens = normalize(name)
+                alias = ' '.join(tokens)
+                if not alias or alias in self._aliases:
+                    continue
+                self._aliases[alias] = key
+                self._alias_tokens[alias] = tokens
+                grams = trigrams(alias)
+                self._alias_trigrams[alias] = len(grams)
+                for token in tokens:
+                    self._token_index[token].add(alias)
+                for gram in grams:
+                    self._trigram_index[gram].add(alias)
+
+        alias_count = len(self._aliases)
+        self._idf = {
+            token: math.log((alias_count + 1) / (len(aliases) + 1)) + 1
+            for token, aliases in self._token_index.items()
+        }
+        # Tokens the knowledge base has never seen weigh the most: they are what
+        # stops "kidney disease" from matching "heart disease"
+        self._unknown_idf = math.log(alias_count + 1) + 1
+
+        self.resolve = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _weight(self, token: str) -> float:
+        return self._idf.get(token, self._unknown_idf)
+
+    def _resolve(self, condition: str) -> Optional[Tuple[str, float]]:
+        """(knowledge key, match score) for a condition string, or None"""
+        tokens = normalize(condition)
+        alias = ' '.join(tokens)
+        if not alias:
+            return None
+        if alias in self._aliases:
+            return self._aliases[alias], 1.0
+
+        best_alias, best_score = None, 0.0
+
+        # Weighted Jaccard over word tokens, for reordered or extra words
+        query_tokens = set(tokens)
+        candidates = set()
+        for token in query_tokens:
+            candidates.update(self._token_index.get(token, ()))
+        for candidate in candidates:
+            candidate_tokens = set(self._alias_tokens[candidate])
+            shared = sum(self._weight(t) for t in query_tokens & candidate_tokens)
+            union = sum(self._weight(t) for t in query_tokens | candidate_tokens)
+            score = shared / union
+            if score > best_score or (score == best_score and best_alias is not None and candidate < best_alias):
+                best_alias, best_score = candidate, score
+        if best_score >= MIN_TOKEN_SCORE:
+            return self._aliases[best_alias], best_score
+
+        # Misspellings: the aliases sharing the most trigrams are checked by edit distance
+        query_grams = trigrams(alias)
+        overlap = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                overlap[candidate] += 1
+        shortlist = heapq.nlargest(
+            SPELLING_CANDIDATES,
+            ((2 * count / (len(query_grams) + self._alias_trigrams[candidate]), candidate)
+             for candidate, count in overlap.items()))
+        best = None
+        for score, candidate in shortlist:
+            if score < MIN_TRIGRAM_SCORE:
+                break
+            limit = allowed_edits(candidate) if best is None else min(allowed_edits(candidate), best[0] - 1)
+            if limit < 0:
+                continue
+            distance = edit_distance(alias, candidate, limit)
+            if distance <= limit and not contrasting(alias, candidate):
+                best = (distance, candidate, score)
+                if distance <= 1:
+                    break
+        if best is not None:
+            return self._aliases[best[1]], best[2]
+        return None
+
+    def lookup(self, condition: str) -> Dict:
+        """Knowledge entry for a condition string, or {} if nothing matches closely enough"""
+        match = self.resolve(condition)
+        return self.knowledge[match[0]] if match else {}
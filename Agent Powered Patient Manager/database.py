@@ -1,18 +1,146 @@
+import json
 import sqlite3
 import os
+import re
+import time
+import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from alerting import evaluate_alerts
+from early_warning import EarlyWarningScorer
+from storage import PATIENT_SORTS, PatientStorage
+from metrics import ALERTS_FIRED, STORAGE_OPERATION_DURATION, instrument_methods
+from profiling import TimedConnection
 
-class PatientDatabase:
-    def __init__(self, db_path: str = "patients.db"):
+# Sample census used to seed an empty database
+INITIAL_PATIENTS = [
+    {"id": "P001", "name": "John Smith", "age": 45, "condition": "Diabetes", "last_visit": "2024-01-15", "floor": 1, "respiratory_rate": 18, "airflow": 85},
+    {"id": "P002", "name": "Sarah Johnson", "age": 32, "condition": "Hypertension", "last_visit": "2024-01-10", "floor": 2, "respiratory_rate": 25, "airflow": 65},
+    {"id": "P003", "name": "Mike Davis", "age": 58, "condition": "Heart Disease", "last_visit": "2024-01-12", "floor": 3, "respiratory_rate": 14, "airflow": 100},
+    {"id": "P004", "name": "Emily Brown", "age": 28, "condition": "Asthma", "last_visit": "2024-01-08", "floor": 4, "respiratory_rate": 30, "airflow": 45},
+    {"id": "P005", "name": "Robert Wilson", "age": 67, "condition": "Arthritis", "last_visit": "2024-01-05", "floor": 5, "respiratory_rate": 23, "airflow": 85},
+    {"id": "P006", "name": "Russell Wilson", "age": 33, "condition": "Chicken Pox", "last_visit": "2024-01-05", "floor": 1, "respiratory_rate": 17, "airflow": 94},
+    {"id": "P007", "name": "Larry Bird", "age": 72, "condition": "Respiratory Problems", "last_visit": "2024-01-05", "floor": 2, "respiratory_rate": 13, "airflow": 85},
+    {"id": "P008", "name": "Kevin Durant", "age": 83, "condition": "General Checkup", "last_visit": "2024-01-05", "floor": 3, "respiratory_rate": 22, "airflow": 80}
+]
+
+# Open-ended upper bound for time range queries; it must look like a timestamp, since
+# the TIMESTAMP columns' numeric affinity would turn a bare '9999' into a number
+MAX_TIMESTAMP = '9999-12-31 23:59:59'
+
+# Status filters for query_patients, the same thresholds as get_critical/warning/normal_patients
+STATUS_FILTERS = {
+    'critical': 'respiratory_rate >= 26 OR airflow <= 59',
+    'warning': '(respiratory_rate >= 21 AND respiratory_rate < 26) OR (airflow <= 79 AND airflow > 59)',
+    'normal': 'respiratory_rate < 21 AND airflow > 79',
+}
+
+# Columns of the floor_summary table (besides floor), kept current by triggers
+FLOOR_SUMMARY_COLUMNS = ('patients', 'critical_patients', 'warning_patients', 'normal_patients',
+                         'min_airflow', 'max_respiratory_rate', 'open_alerts')
+
+# Next value of patients.change_seq. Evaluated inside each write statement, so it runs under
+# SQLite's write lock and commits from different processes can never reuse a value.
+NEXT_CHANGE_SEQ = '(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM patients)'
+
+
+def _status_deltas(*terms: str) -> str:
+    """floor_summary SET assignments for the status counts, adding ('+NEW') or removing ('-OLD') trigger rows"""
+    assignments = []
+    for status, condition in STATUS_FILTERS.items():
+        delta = ''
+        for term in terms:
+            sign, row = term[0], term[1:]
+            row_condition = re.sub(r'\b(respiratory_rate|airflow)\b', row + r'.\1', condition)
+            delta += f' {sign} ({row_condition})'
+        assignments.append(f'{status}_patients = {status}_patients{delta}')
+    return ', '.join(assignments)
+
+
+def _keyset_clause(columns, values):
+    """WHERE clause selecting rows after `values` in the order given by `columns`.
+
+    The leading range on the first column lets SQLite seek into the index."""
+    (column, descending), value = columns[0], values[0]
+    op = '<' if descending else '>'
+    if len(columns) == 1:
+        return f'{column} {op} ?', [value]
+    rest, rest_values = _keyset_clause(columns[1:], values[1:])
+    return f'({column} {op}= ? AND ({column} {op} ? OR ({column} = ? AND {rest})))', [value, value, value] + rest_values
+
+
+@instrument_methods(STORAGE_OPERATION_DURATION, "engine", "sqlite", exclude=("data_files",))
+class PatientDatabase(PatientStorage):
+    def __init__(self, db_path: str = "patients.db", scorer: Optional[EarlyWarningScorer] = None,
+                 seed: bool = True):
         self.db_path = db_path
+        self.scorer = scorer or EarlyWarningScorer()
+        self.seed = seed
         self.init_database()
     
+    # Ordered schema migrations: (version, description, method name).
+    # PRAGMA user_version holds the last applied version, so an up-to-date
+    # database opens with a single pragma read.
+    MIGRATIONS = [
+        (1, "create patients, patient_vitals and alerts tables", "_migrate_base_tables"),
+        (2, "add early-warning score columns and index", "_migrate_news_score"),
+        (3, "add indexes for filtered and paginated patient queries", "_migrate_query_indexes"),
+        (4, "index vitals history by patient and time", "_migrate_vitals_index"),
+        (5, "create alert notification delivery tables", "_migrate_alert_deliveries"),
+        (6, "create vitals journal checkpoint table", "_migrate_vitals_journal"),
+        (7, "create trigger-maintained floor summary table", "_migrate_floor_summary"),
+        (8, "add patient change sequence for dashboard deltas", "_migrate_change_seq"),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+
     def init_database(self):
-        """Initialize the database and create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        """Bring the database schema up to date, then seed it if it was just created"""
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+
+        if version == self.SCHEMA_VERSION:
+            return
+
+        self._migrate()
+
+        # Populate with initial data if database is empty
+        if version == 0 and self.seed:
+            self._populate_initial_data()
+
+    def _migrate(self):
+        """Apply pending migrations in one write transaction, recording each in schema_migrations"""
+        conn = self._connect(isolation_level=None)
         cursor = conn.cursor()
-        
+        try:
+            # BEGIN IMMEDIATE takes the write lock, so concurrent workers migrate one at a time
+            cursor.execute('BEGIN IMMEDIATE')
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            for migration_version, description, method in self.MIGRATIONS:
+                if migration_version > version:
+                    getattr(self, method)(cursor)
+                    cursor.execute('INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                                   (migration_version, description))
+
+            cursor.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _migrate_base_tables(self, cursor):
+        """Migration 1: the original schema (tables may already exist in pre-versioning databases)"""
         # Create patients table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS patients (
@@ -28,7 +156,7 @@ class PatientDatabase:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
+
         # Create patient_vitals table for tracking historical vital signs
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS patient_vitals (
@@ -40,7 +168,7 @@ class PatientDatabase:
                 FOREIGN KEY (patient_id) REFERENCES patients (id)
             )
         ''')
-        
+
         # Create alerts table for tracking critical conditions
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS alerts (
@@ -55,41 +183,209 @@ class PatientDatabase:
                 FOREIGN KEY (patient_id) REFERENCES patients (id)
             )
         ''')
-        
-        conn.commit()
-        conn.close()
-        
-        # Populate with initial data if database is empty
-        self._populate_initial_data()
-    
+
+    def _migrate_news_score(self, cursor):
+        """Migration 2: persisted early-warning scores"""
+        # Databases created before versioning may already have the columns
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(patients)')]
+        if 'news_score' not in columns:
+            cursor.execute("ALTER TABLE patients ADD COLUMN news_score INTEGER NOT NULL DEFAULT 0")
+            cursor.execute("ALTER TABLE patients ADD COLUMN news_risk TEXT NOT NULL DEFAULT 'low'")
+            self._rescore(cursor)
+
+        # Index for serving the ranked "who to see next" list without a full sort
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_patients_news_score
+            ON patients (news_score DESC, name)
+        ''')
+
+    def _migrate_query_indexes(self, cursor):
+        """Migration 3: one index per query_patients filter and sort, each ending in the
+        full keyset so pages are read straight off the index without a sort"""
+        cursor.execute('DROP INDEX IF EXISTS idx_patients_news_score')
+        cursor.execute('CREATE INDEX idx_patients_news_score ON patients (news_score DESC, name, id)')
+        cursor.execute('CREATE INDEX idx_patients_name ON patients (name, id)')
+        cursor.execute('CREATE INDEX idx_patients_floor_name ON patients (floor, name, id)')
+        cursor.execute('CREATE INDEX idx_patients_floor_news_score ON patients (floor, news_score DESC, name, id)')
+        cursor.execute('CREATE INDEX idx_patients_condition ON patients (condition COLLATE NOCASE, name, id)')
+
+    def _migrate_vitals_index(self, cursor):
+        """Migration 4: history and trend queries read one patient's time range, not the whole table"""
+        cursor.execute('CREATE INDEX idx_patient_vitals_patient_time ON patient_vitals (patient_id, timestamp)')
+
+    def _migrate_alert_deliveries(self, cursor):
+        """Migration 5: per-sink delivery state for outbound alert notifications"""
+        # One row per (alert, sink). next_attempt_at (unix seconds) doubles as the
+        # lease: claiming a row pushes it forward so other workers skip it.
+        cursor.execute('''
+            CREATE TABLE alert_deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert_id INTEGER NOT NULL,
+                sink TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                claim TEXT,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                delivered_at TIMESTAMP,
+                UNIQUE (alert_id, sink),
+                FOREIGN KEY (alert_id) REFERENCES alerts (id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX idx_alert_deliveries_due ON alert_deliveries (sink, status, next_attempt_at)')
+
+        # The last alert id each sink has had deliveries queued for
+        cursor.execute('''
+            CREATE TABLE notification_sinks (
+                sink TEXT PRIMARY KEY,
+                last_alert_id INTEGER NOT NULL
+            )
+        ''')
+
+    def _migrate_vitals_journal(self, cursor):
+        """Migration 6: how far each vitals journal has been compacted into this database"""
+        cursor.execute('''
+            CREATE TABLE vitals_journal_checkpoints (
+                journal TEXT PRIMARY KEY,
+                last_sequence INTEGER NOT NULL
+            )
+        ''')
+
+    def _migrate_floor_summary(self, cursor):
+        """Migration 7: per-floor counts and extremes, updated by triggers on every patient and
+        alert write so floor overviews read one row per floor instead of every patient"""
+        cursor.execute('''
+            CREATE TABLE floor_summary (
+                floor INTEGER PRIMARY KEY,
+                patients INTEGER NOT NULL DEFAULT 0,
+                critical_patients INTEGER NOT NULL DEFAULT 0,
+                warning_patients INTEGER NOT NULL DEFAULT 0,
+                normal_patients INTEGER NOT NULL DEFAULT 0,
+                min_airflow INTEGER,
+                max_respiratory_rate INTEGER,
+                open_alerts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # A floor's extremes are only recomputed when the patient holding one of them moves
+        # off it; these indexes make that a seek instead of a scan of the floor
+        cursor.execute('CREATE INDEX idx_patients_floor_airflow ON patients (floor, airflow)')
+        cursor.execute('CREATE INDEX idx_patients_floor_respiratory_rate ON patients (floor, respiratory_rate)')
+
+        def open_alerts(row):
+            return f"(SELECT COUNT(*) FROM alerts WHERE patient_id = {row}.id AND acknowledged = FALSE)"
+
+        # Recomputing is only needed when the row held the extreme and moved away from it
+        min_airflow_after_leaving = '''CASE WHEN min_airflow < OLD.airflow THEN min_airflow
+            ELSE (SELECT MIN(airflow) FROM patients WHERE floor = OLD.floor) END'''
+        max_respiratory_rate_after_leaving = '''CASE WHEN max_respiratory_rate > OLD.respiratory_rate THEN max_respiratory_rate
+            ELSE (SELECT MAX(respiratory_rate) FROM patients WHERE floor = OLD.floor) END'''
+
+        def leave_floor():
+            return f'''
+                UPDATE floor_summary
+                SET patients = patients - 1, {_status_deltas('-OLD')}, open_alerts = open_alerts - {open_alerts('OLD')},
+                    min_airflow = {min_airflow_after_leaving},
+                    max_respiratory_rate = {max_respiratory_rate_after_leaving}
+                WHERE floor = OLD.floor;
+                DELETE FROM floor_summary WHERE floor = OLD.floor AND patients = 0;
+            '''
+
+        def join_floor(alerts):
+            return f'''
+                INSERT OR IGNORE INTO floor_summary (floor) VALUES (NEW.floor);
+                UPDATE floor_summary
+                SET patients = patients + 1, {_status_deltas('+NEW')}, open_alerts = open_alerts + {alerts},
+                    min_airflow = MIN(COALESCE(min_airflow, NEW.airflow), NEW.airflow),
+                    max_respiratory_rate = MAX(COALESCE(max_respiratory_rate, NEW.respiratory_rate), NEW.respiratory_rate)
+                WHERE floor = NEW.floor;
+            '''
+
+        triggers = [
+            f'''CREATE TRIGGER floor_summary_patient_insert AFTER INSERT ON patients
+                BEGIN {join_floor('0')} END''',
+            # The ingest hot path: one UPDATE of the floor's row. UPDATE OF limits it to vitals
+            # changes, so rescoring never fires it.
+            f'''CREATE TRIGGER floor_summary_patient_vitals AFTER UPDATE OF respiratory_rate, airflow ON patients
+                WHEN OLD.floor = NEW.floor
+                BEGIN
+                    UPDATE floor_summary
+                    SET {_status_deltas('-OLD', '+NEW')},
+                        min_airflow = CASE WHEN NEW.airflow <= min_airflow THEN NEW.airflow
+                            ELSE {min_airflow_after_leaving} END,
+                        max_respiratory_rate = CASE WHEN NEW.respiratory_rate >= max_respiratory_rate THEN NEW.respiratory_rate
+                            ELSE {max_respiratory_rate_after_leaving} END
+                    WHERE floor = NEW.floor;
+                END''',
+            f'''CREATE TRIGGER floor_summary_patient_move AFTER UPDATE OF floor, respiratory_rate, airflow ON patients
+                WHEN OLD.floor != NEW.floor
+                BEGIN {leave_floor()} {join_floor(open_alerts('NEW'))} END''',
+            f'''CREATE TRIGGER floor_summary_patient_delete AFTER DELETE ON patients
+                BEGIN {leave_floor()} END''',
+            '''CREATE TRIGGER floor_summary_alert_insert AFTER INSERT ON alerts WHEN NEW.acknowledged = FALSE
+                BEGIN
+                    UPDATE floor_summary SET open_alerts = open_alerts + 1
+                    WHERE floor = (SELECT floor FROM patients WHERE id = NEW.patient_id);
+                END''',
+            '''CREATE TRIGGER floor_summary_alert_update AFTER UPDATE OF acknowledged ON alerts
+                WHEN (OLD.acknowledged = FALSE) != (NEW.acknowledged = FALSE)
+                BEGIN
+                    UPDATE floor_summary SET open_alerts = open_alerts + CASE WHEN NEW.acknowledged = FALSE THEN 1 ELSE -1 END
+                    WHERE floor = (SELECT floor FROM patients WHERE id = NEW.patient_id);
+                END''',
+            '''CREATE TRIGGER floor_summary_alert_delete AFTER DELETE ON alerts WHEN OLD.acknowledged = FALSE
+                BEGIN
+                    UPDATE floor_summary SET open_alerts = open_alerts - 1
+                    WHERE floor = (SELECT floor FROM patients WHERE id = OLD.patient_id);
+                END''',
+        ]
+        # One execute per trigger: executescript would commit the migration transaction
+        for trigger in triggers:
+            cursor.execute(trigger)
+
+        # Backfill from the existing census; the triggers keep it current from here on
+        counts = ', '.join(f'SUM({condition})' for condition in STATUS_FILTERS.values())
+        cursor.execute(f'''
+            INSERT INTO floor_summary (floor, {', '.join(FLOOR_SUMMARY_COLUMNS)})
+            SELECT p.floor, COUNT(*), {counts}, MIN(p.airflow), MAX(p.respiratory_rate),
+                (SELECT COUNT(*) FROM alerts a JOIN patients ap ON ap.id = a.patient_id
+                 WHERE ap.floor = p.floor AND a.acknowledged = FALSE)
+            FROM patients p
+            GROUP BY p.floor
+        ''')
+
+    def _migrate_change_seq(self, cursor):
+        """Migration 8: every patient write stamps the row with the next change sequence number,
+        so dashboards fetch only the patients changed since their last poll"""
+        cursor.execute("ALTER TABLE patients ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+        cursor.execute('CREATE INDEX idx_patients_change_seq ON patients (change_seq)')
+
+    def data_files(self) -> List[str]:
+        """SQLite files backing this database"""
+        return [self.db_path]
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        """Open a connection whose statements are timed and checked against the slow-query log"""
+        return sqlite3.connect(self.db_path, factory=TimedConnection, **kwargs)
+
     def _populate_initial_data(self):
         """Populate the database with initial patient data"""
         if self.get_all_patients():
             return  # Database already has data
         
-        initial_patients = [
-            {"id": "P001", "name": "John Smith", "age": 45, "condition": "Diabetes", "last_visit": "2024-01-15", "floor": 1, "respiratory_rate": 18, "airflow": 85},
-            {"id": "P002", "name": "Sarah Johnson", "age": 32, "condition": "Hypertension", "last_visit": "2024-01-10", "floor": 2, "respiratory_rate": 25, "airflow": 65},
-            {"id": "P003", "name": "Mike Davis", "age": 58, "condition": "Heart Disease", "last_visit": "2024-01-12", "floor": 3, "respiratory_rate": 14, "airflow": 100},
-            {"id": "P004", "name": "Emily Brown", "age": 28, "condition": "Asthma", "last_visit": "2024-01-08", "floor": 4, "respiratory_rate": 30, "airflow": 45},
-            {"id": "P005", "name": "Robert Wilson", "age": 67, "condition": "Arthritis", "last_visit": "2024-01-05", "floor": 5, "respiratory_rate": 23, "airflow": 85},
-            {"id": "P006", "name": "Russell Wilson", "age": 33, "condition": "Chicken Pox", "last_visit": "2024-01-05", "floor": 1, "respiratory_rate": 17, "airflow": 94},
-            {"id": "P007", "name": "Larry Bird", "age": 72, "condition": "Respiratory Problems", "last_visit": "2024-01-05", "floor": 2, "respiratory_rate": 13, "airflow": 85},
-            {"id": "P008", "name": "Kevin Durant", "age": 83, "condition": "General Checkup", "last_visit": "2024-01-05", "floor": 3, "respiratory_rate": 22, "airflow": 80}
-        ]
-        
-        for patient in initial_patients:
+        for patient in INITIAL_PATIENTS:
             self.add_patient(patient)
     
     def add_patient(self, patient_data: Dict) -> bool:
         """Add a new patient to the database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT INTO patients (id, name, age, condition, last_visit, floor, respiratory_rate, airflow)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            news_score = self.scorer.score(patient_data)
+            cursor.execute(f'''
+                INSERT INTO patients (id, name, age, condition, last_visit, floor, respiratory_rate, airflow, news_score, news_risk, change_seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {NEXT_CHANGE_SEQ})
             ''', (
                 patient_data['id'],
                 patient_data['name'],
@@ -98,7 +394,9 @@ class PatientDatabase:
                 patient_data['last_visit'],
                 patient_data['floor'],
                 patient_data['respiratory_rate'],
-                patient_data['airflow']
+                patient_data['airflow'],
+                news_score,
+                self.scorer.risk_level(news_score)
             ))
             
             conn.commit()
@@ -110,7 +408,7 @@ class PatientDatabase:
     
     def get_all_patients(self) -> List[Dict]:
         """Get all patients from the database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -122,7 +420,7 @@ class PatientDatabase:
     
     def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
         """Get a specific patient by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -135,15 +433,18 @@ class PatientDatabase:
     def update_patient_vitals(self, patient_id: str, respiratory_rate: int, airflow: int) -> bool:
         """Update patient vital signs and log the change"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
+            news_score = self.scorer.score({'respiratory_rate': respiratory_rate, 'airflow': airflow})
+
             # Update patient table
-            cursor.execute('''
-                UPDATE patients 
-                SET respiratory_rate = ?, airflow = ?, updated_at = CURRENT_TIMESTAMP
+            cursor.execute(f'''
+                UPDATE patients
+                SET respiratory_rate = ?, airflow = ?, news_score = ?, news_risk = ?, updated_at = CURRENT_TIMESTAMP,
+                    change_seq = {NEXT_CHANGE_SEQ}
                 WHERE id = ?
-            ''', (respiratory_rate, airflow, patient_id))
+            ''', (respiratory_rate, airflow, news_score, self.scorer.risk_level(news_score), patient_id))
             
             # Log the vital signs change
             cursor.execute('''
@@ -158,9 +459,178 @@ class PatientDatabase:
             print(f"Error updating patient vitals: {e}")
             return False
     
+    def _current_vitals(self, cursor, patient_ids) -> Dict[str, Tuple[int, int]]:
+        """Stored (respiratory_rate, airflow) for a set of patients in one query (json_each avoids the bound-parameter limit)"""
+        cursor.execute('SELECT id, respiratory_rate, airflow FROM patients WHERE id IN (SELECT value FROM json_each(?))',
+                       (json.dumps(list(patient_ids)),))
+        return {patient_id: (respiratory_rate, airflow) for patient_id, respiratory_rate, airflow in cursor.fetchall()}
+
+    @staticmethod
+    def _insert_alerts(cursor, alerts: List[Dict]):
+        cursor.executemany('''
+            INSERT INTO alerts (patient_id, alert_type, severity, value, message)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(a['patient_id'], a['alert_type'], a['severity'], a['value'], a['message']) for a in alerts])
+
+    def ingest_vitals_batch(self, readings: List[Dict]) -> Optional[List[Dict]]:
+        """Apply one ingest tick of vital sign readings, raise alerts and rescore the census in one transaction"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            # Take the write lock before reading the stored vitals, so no other worker's tick
+            # can land between the comparison and the write
+            cursor.execute('BEGIN IMMEDIATE')
+            alerts = evaluate_alerts(self._current_vitals(cursor, {r['patient_id'] for r in readings}), readings)
+
+            rows = [(r['respiratory_rate'], r['airflow'], r['patient_id']) for r in readings]
+            cursor.executemany(f'''
+                UPDATE patients
+                SET respiratory_rate = ?, airflow = ?, updated_at = CURRENT_TIMESTAMP, change_seq = {NEXT_CHANGE_SEQ}
+                WHERE id = ?
+            ''', rows)
+
+            # Log the vital signs readings
+            cursor.executemany('''
+                INSERT INTO patient_vitals (patient_id, respiratory_rate, airflow)
+                VALUES (?, ?, ?)
+            ''', [(patient_id, rr, af) for rr, af, patient_id in rows])
+
+            self._insert_alerts(cursor, alerts)
+            self._rescore(cursor)
+
+            conn.commit()
+            conn.close()
+            for alert in alerts:
+                ALERTS_FIRED.inc(severity=alert['severity'])
+            return alerts
+        except sqlite3.Error as e:
+            print(f"Error ingesting vitals batch: {e}")
+            return None
+
+    def get_latest_vitals(self, floor: Optional[int] = None, limit: int = 5) -> Dict[str, List[Dict]]:
+        """Latest readings for many patients in one query: one seek into idx_patient_vitals_patient_time per patient"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'''
+            SELECT v.* FROM patients p
+            JOIN patient_vitals v ON v.id IN (
+                SELECT id FROM patient_vitals WHERE patient_id = p.id ORDER BY timestamp DESC, id DESC LIMIT ?
+            )
+            {'WHERE p.floor = ?' if floor is not None else ''}
+            ORDER BY v.patient_id, v.timestamp DESC, v.id DESC
+        ''', [limit] + ([floor] if floor is not None else [])).fetchall()
+        conn.close()
+
+        latest = {}
+        for row in rows:
+            latest.setdefault(row['patient_id'], []).append(dict(row))
+        return latest
+
+    def get_vitals_journal_checkpoint(self, journal: str) -> int:
+        """Last journal sequence number compacted into this database"""
+        conn = self._connect()
+        row = conn.execute('SELECT last_sequence FROM vitals_journal_checkpoints WHERE journal = ?',
+                           (journal,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def apply_vitals_journal(self, journal: str, records: List[Dict], through_sequence: int) -> bool:
+        """Fold a run of journaled readings and the new checkpoint into one transaction"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            row = cursor.execute('SELECT last_sequence FROM vitals_journal_checkpoints WHERE journal = ?',
+                                 (journal,)).fetchone()
+            fresh = [r for r in records if r['sequence'] > (row[0] if row else 0)]
+            # Every journaled reading is checked in order, even those superseded within the run
+            alerts = evaluate_alerts(self._current_vitals(cursor, {r['patient_id'] for r in fresh}), fresh)
+
+            cursor.executemany('''
+                INSERT INTO patient_vitals (patient_id, respiratory_rate, airflow, timestamp)
+                VALUES (?, ?, ?, ?)
+            ''', [(r['patient_id'], r['respiratory_rate'], r['airflow'], r['timestamp']) for r in fresh])
+
+            # Only each patient's newest reading becomes their current vitals
+            latest = {r['patient_id']: r for r in fresh}
+            updates = []
+            for reading in latest.values():
+                news_score = self.scorer.score(reading)
+                updates.append((reading['respiratory_rate'], reading['airflow'], news_score,
+                                self.scorer.risk_level(news_score), reading['timestamp'], reading['patient_id']))
+            cursor.executemany(f'''
+                UPDATE patients
+                SET respiratory_rate = ?, airflow = ?, news_score = ?, news_risk = ?, updated_at = ?,
+                    change_seq = {NEXT_CHANGE_SEQ}
+                WHERE id = ?
+            ''', updates)
+
+            cursor.execute('''
+                INSERT INTO vitals_journal_checkpoints (journal, last_sequence) VALUES (?, ?)
+                ON CONFLICT (journal) DO UPDATE SET last_sequence = MAX(last_sequence, excluded.last_sequence)
+            ''', (journal, through_sequence))
+            self._insert_alerts(cursor, alerts)
+
+            conn.commit()
+            conn.close()
+            for alert in alerts:
+                ALERTS_FIRED.inc(severity=alert['severity'])
+            return True
+        except sqlite3.Error as e:
+            print(f"Error applying vitals journal: {e}")
+            return False
+
+    def rescore_all_patients(self) -> bool:
+        """Recompute early-warning scores for every patient in one pass"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            self._rescore(cursor)
+            conn.commit()
+            conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error rescoring patients: {e}")
+            return False
+
+    def _rescore(self, cursor):
+        """Set-based rescore of the whole patients table from the scorer's band tables"""
+        score = self.scorer.score_expression()
+        cursor.execute(f'''
+            UPDATE patients
+            SET news_score = {score}, news_risk = {self.scorer.risk_expression(f"({score})")}
+        ''')
+
+    def get_floor_summaries(self) -> List[Dict]:
+        """Per-floor aggregates, read from the trigger-maintained floor_summary table"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'SELECT floor, {", ".join(FLOOR_SUMMARY_COLUMNS)} FROM floor_summary ORDER BY floor').fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def get_ranked_patients(self, limit: int = 10) -> List[Dict]:
+        """Get the patients with the highest early-warning scores"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        # Walks idx_patients_news_score and stops after `limit` rows
+        cursor.execute('''
+            SELECT * FROM patients
+            ORDER BY news_score DESC, name
+            LIMIT ?
+        ''', (limit,))
+
+        patients = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return patients
+
     def get_patient_vitals_history(self, patient_id: str, limit: int = 10) -> List[Dict]:
         """Get historical vital signs for a patient"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -174,11 +644,31 @@ class PatientDatabase:
         vitals = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return vitals
+
+    def get_patient_vitals_range(self, patient_id: str, start: Optional[str] = None,
+                                 end: Optional[str] = None) -> List[Dict]:
+        """Get a patient's vital signs between two timestamps (inclusive), oldest first"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT timestamp, respiratory_rate, airflow FROM patient_vitals
+            WHERE patient_id = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp, id
+        ''', (patient_id, start or '', end or MAX_TIMESTAMP))
+
+        # Plain tuples: long ranges run to tens of thousands of rows and sqlite3.Row is slow to copy
+        vitals = [
+            {'timestamp': timestamp, 'respiratory_rate': respiratory_rate, 'airflow': airflow}
+            for timestamp, respiratory_rate, airflow in cursor.fetchall()
+        ]
+        conn.close()
+        return vitals
     
     def add_alert(self, patient_id: str, alert_type: str, severity: str, value: float, message: str = None) -> bool:
         """Add an alert to the database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -188,6 +678,7 @@ class PatientDatabase:
             
             conn.commit()
             conn.close()
+            ALERTS_FIRED.inc(severity=severity)
             return True
         except sqlite3.Error as e:
             print(f"Error adding alert: {e}")
@@ -195,7 +686,7 @@ class PatientDatabase:
     
     def get_unacknowledged_alerts(self) -> List[Dict]:
         """Get all unacknowledged alerts"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -210,11 +701,24 @@ class PatientDatabase:
         alerts = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return alerts
+
+    def get_alert(self, alert_id: int) -> Optional[Dict]:
+        """Get one alert by id"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('''
+            SELECT a.*, p.name as patient_name
+            FROM alerts a
+            JOIN patients p ON a.patient_id = p.id
+            WHERE a.id = ?
+        ''', (alert_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
     
     def acknowledge_alert(self, alert_id: int) -> bool:
         """Acknowledge an alert"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -229,10 +733,113 @@ class PatientDatabase:
         except sqlite3.Error as e:
             print(f"Error acknowledging alert: {e}")
             return False
+
+    def queue_alert_deliveries(self, sink: str, severities: Optional[List[str]] = None) -> int:
+        """Queue a pending delivery to a sink for every alert past its high-water mark"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            # Read first so an idle poll never takes the write lock
+            row = cursor.execute('SELECT last_alert_id FROM notification_sinks WHERE sink = ?', (sink,)).fetchone()
+            latest = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+
+            queued = 0
+            if row is None:
+                # A new sink starts from the latest alert rather than replaying history
+                cursor.execute('INSERT OR IGNORE INTO notification_sinks (sink, last_alert_id) VALUES (?, ?)',
+                               (sink, latest))
+            elif latest > row[0]:
+                # INSERT OR IGNORE makes this safe to run from every worker at once
+                query = '''
+                    INSERT OR IGNORE INTO alert_deliveries (alert_id, sink)
+                    SELECT id, ? FROM alerts WHERE id > ? AND id <= ?
+                '''
+                params = [sink, row[0], latest]
+                if severities:
+                    query += f" AND severity IN ({', '.join('?' * len(severities))})"
+                    params.extend(severities)
+                queued = cursor.execute(query, params).rowcount
+                cursor.execute('UPDATE notification_sinks SET last_alert_id = MAX(last_alert_id, ?) WHERE sink = ?',
+                               (latest, sink))
+
+            conn.commit()
+            conn.close()
+            return queued
+        except sqlite3.Error as e:
+            print(f"Error queueing alert deliveries: {e}")
+            return 0
+
+    def claim_alert_deliveries(self, sink: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """Lease the oldest due deliveries for a sink and return them with their alerts"""
+        claim = uuid.uuid4().hex
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+
+            due = cursor.execute('''
+                SELECT 1 FROM alert_deliveries WHERE sink = ? AND status = 'pending' AND next_attempt_at <= ? LIMIT 1
+            ''', (sink, now)).fetchone()
+            if due is None:
+                conn.close()
+                return []
+
+            # A single UPDATE is atomic, so two workers can never lease the same row
+            cursor.execute('''
+                UPDATE alert_deliveries SET claim = ?, next_attempt_at = ?
+                WHERE id IN (
+                    SELECT id FROM alert_deliveries
+                    WHERE sink = ? AND status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY id LIMIT ?
+                )
+            ''', (claim, now + lease_seconds, sink, now, limit))
+            conn.commit()
+
+            cursor.execute('''
+                SELECT a.*, d.id AS delivery_id, d.attempts, p.name AS patient_name, p.floor
+                FROM alert_deliveries d
+                JOIN alerts a ON a.id = d.alert_id
+                LEFT JOIN patients p ON p.id = a.patient_id
+                WHERE d.claim = ?
+                ORDER BY d.id
+            ''', (claim,))
+
+            deliveries = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return deliveries
+        except sqlite3.Error as e:
+            print(f"Error claiming alert deliveries: {e}")
+            return []
+
+    def update_alert_deliveries(self, delivery_ids: List[int], status: str, error: Optional[str] = None,
+                                retry_at: Optional[float] = None) -> bool:
+        """Record an attempt's outcome and release the lease"""
+        if not delivery_ids:
+            return True
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute(f'''
+                UPDATE alert_deliveries
+                SET status = ?, attempts = attempts + 1, last_error = ?, claim = NULL,
+                    next_attempt_at = COALESCE(?, next_attempt_at),
+                    delivered_at = CASE WHEN ? = 'delivered' THEN CURRENT_TIMESTAMP END
+                WHERE id IN ({', '.join('?' * len(delivery_ids))})
+            ''', [status, error, retry_at, status, *delivery_ids])
+
+            conn.commit()
+            conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating alert deliveries: {e}")
+            return False
     
     def get_patients_by_floor(self, floor: int) -> List[Dict]:
         """Get all patients on a specific floor"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -242,9 +849,31 @@ class PatientDatabase:
         conn.close()
         return patients
     
+    def get_patient_changes(self, since: Optional[str] = None, floor: Optional[int] = None) -> Tuple[List[Dict], str]:
+        """Patients whose change_seq is past the cursor, read off idx_patients_change_seq"""
+        try:
+            since_seq = int(since) if since else -1
+        except ValueError:
+            raise ValueError("Invalid change cursor")
+
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        # Read the high-water mark first: a commit landing in between is sent again next poll, never skipped
+        latest = conn.execute('SELECT COALESCE(MAX(change_seq), 0) FROM patients').fetchone()[0]
+        if since_seq > latest:
+            since_seq = -1  # cursor from a database that has since been replaced: resend everything
+        # Without INDEXED BY the planner walks the name index to skip the sort, reading the whole census
+        rows = conn.execute(f'''
+            SELECT * FROM patients INDEXED BY idx_patients_change_seq
+            WHERE change_seq > ? {'AND floor = ?' if floor is not None else ''}
+            ORDER BY name
+        ''', [since_seq] + ([floor] if floor is not None else [])).fetchall()
+        conn.close()
+        return [dict(row) for row in rows], str(latest)
+
     def search_patients(self, search_term: str) -> List[Dict]:
         """Search patients by name or ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -253,14 +882,48 @@ class PatientDatabase:
             WHERE name LIKE ? OR id LIKE ? 
             ORDER BY name
         ''', (f'%{search_term}%', f'%{search_term}%'))
-        
+
         patients = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return patients
-    
+
+    def query_patients(self, floor: Optional[int] = None, status: Optional[str] = None,
+                       condition: Optional[str] = None, sort: str = 'name',
+                       after: Optional[List] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Filter and sort patients with keyset pagination, served from the patient indexes"""
+        clauses, params = [], []
+        if floor is not None:
+            clauses.append('floor = ?')
+            params.append(floor)
+        if condition:
+            clauses.append('condition = ? COLLATE NOCASE')
+            params.append(condition)
+        if status:
+            clauses.append(f'({STATUS_FILTERS[status]})')
+        if after is not None:
+            clause, values = _keyset_clause(PATIENT_SORTS[sort], after)
+            clauses.append(clause)
+            params.extend(values)
+
+        sql = 'SELECT * FROM patients'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + ', '.join(f"{column}{' DESC' if descending else ''}" for column, descending in PATIENT_SORTS[sort])
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        patients = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return patients
+
     def get_critical_patients(self) -> List[Dict]:
         """Get patients with critical vital signs"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -276,7 +939,7 @@ class PatientDatabase:
     
     def get_warning_patients(self) -> List[Dict]:
         """Get patients with warning vital signs"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -293,7 +956,7 @@ class PatientDatabase:
     
     def get_normal_patients(self) -> List[Dict]:
         """Get patients with normal vital signs"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -4,45 +4,48 @@ Database Management Script for Patient Management System
 This script provides utilities for managing the SQLite database
 """
 
+import calendar
+import csv
+import json
+import os
 import sqlite3
+import statistics
 import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
 from database import PatientDatabase
+from handoff import collect_handoff, summarize_handoff
+from sharding import ShardedPatientDatabase
+from storage import open_storage, patient_db_path
 
 def show_database_stats():
     """Show database statistics"""
-    db = PatientDatabase()
+    db = open_storage()
     
     print("=== Patient Management Database Statistics ===")
     
-    # Count patients
-    patients = db.get_all_patients()
-    print(f"Total Patients: {len(patients)}")
-    
-    # Count by floor
-    floors = {}
-    for patient in patients:
-        floor = patient['floor']
-        floors[floor] = floors.get(floor, 0) + 1
+    # Every count comes from the per-floor summaries, so no patient rows are read
+    floors = db.get_floor_summaries()
+    print(f"Total Patients: {sum(floor['patients'] for floor in floors)}")
     
     print("\nPatients by Floor:")
-    for floor in sorted(floors.keys()):
-        print(f"  Floor {floor}: {floors[floor]} patients")
-    
-    # Count critical/warning/normal patients
-    critical = db.get_critical_patients()
-    warning = db.get_warning_patients()
-    normal = db.get_normal_patients()
+    for floor in floors:
+        print(f"  Floor {floor['floor']}: {floor['patients']} patients")
     
     print(f"\nPatient Status:")
-    print(f"  Critical: {len(critical)} patients")
-    print(f"  Warning: {len(warning)} patients")
-    print(f"  Normal: {len(normal)} patients")
+    print(f"  Critical: {sum(floor['critical_patients'] for floor in floors)} patients")
+    print(f"  Warning: {sum(floor['warning_patients'] for floor in floors)} patients")
+    print(f"  Normal: {sum(floor['normal_patients'] for floor in floors)} patients")
     
     # Count alerts
-    alerts = db.get_unacknowledged_alerts()
-    print(f"\nUnacknowledged Alerts: {len(alerts)}")
+    open_alerts = sum(floor['open_alerts'] for floor in floors)
+    print(f"\nUnacknowledged Alerts: {open_alerts}")
     
-    if alerts:
+    if open_alerts:
+        alerts = db.get_unacknowledged_alerts()
         print("\nRecent Alerts:")
         for alert in alerts[:5]:  # Show last 5 alerts
             print(f"  - {alert['patient_name']}: {alert['alert_type']} {alert['severity']} ({alert['value']})")
@@ -50,15 +53,15 @@ def show_database_stats():
 def reset_database():
     """Reset the database to initial state"""
     import os
-    if os.path.exists("patients.db"):
-        os.remove("patients.db")
+    if os.path.exists(patient_db_path()):
+        os.remove(patient_db_path())
         print("Database reset successfully!")
     else:
         print("Database file not found.")
 
 def add_sample_patient():
     """Add a sample patient for testing"""
-    db = PatientDatabase()
+    db = open_storage()
     
     sample_patient = {
         "id": "P999",
@@ -77,9 +80,57 @@ def add_sample_patient():
     else:
         print("Failed to add sample patient.")
 
+def shard_database(shard_dir):
+    """Split the PATIENT_DB_PATH database into one SQLite file per floor"""
+    source_path = patient_db_path()
+    PatientDatabase(source_path)  # make sure the source schema is current
+    # No demo patients: every shard must hold exactly the source's census
+    sharded = ShardedPatientDatabase(shard_dir, seed=False)
+
+    source = sqlite3.connect(source_path)
+    floors = [row[0] for row in source.execute('SELECT DISTINCT floor FROM patients')]
+    source.close()
+
+    shard_floors = {}
+    for floor in floors:
+        shard_floors.setdefault(sharded.router.shard_for_floor(floor), []).append(floor)
+    # Shards left from an earlier run that no source floor maps to are emptied too
+    for shard in sharded.shards:
+        shard_floors.setdefault(shard, [])
+
+    for shard, shard_floor_list in sorted(shard_floors.items()):
+        shard_db = sharded._get_shard(shard)
+        placeholders = ",".join("?" for _ in shard_floor_list)
+        conn = sqlite3.connect(shard_db.db_path)
+        conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+
+        # Replace whatever the shard holds with the real census for its floors
+        conn.execute("DELETE FROM alerts")
+        conn.execute("DELETE FROM patient_vitals")
+        conn.execute("DELETE FROM patients")
+        columns = "id, name, age, condition, last_visit, floor, respiratory_rate, airflow, news_score, news_risk, created_at, updated_at, change_seq"
+        conn.execute(f"INSERT INTO patients ({columns}) SELECT {columns} FROM source.patients WHERE floor IN ({placeholders})",
+                     shard_floor_list)
+        conn.execute('''
+            INSERT INTO patient_vitals (patient_id, respiratory_rate, airflow, timestamp)
+            SELECT patient_id, respiratory_rate, airflow, timestamp FROM source.patient_vitals
+            WHERE patient_id IN (SELECT id FROM patients)
+        ''')
+        conn.execute('''
+            INSERT INTO alerts (patient_id, alert_type, severity, value, message, acknowledged, created_at)
+            SELECT patient_id, alert_type, severity, value, message, acknowledged, created_at FROM source.alerts
+            WHERE patient_id IN (SELECT id FROM patients)
+        ''')
+        conn.commit()
+        count = conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+        conn.close()
+        print(f"Shard {shard} (floors {', '.join(map(str, sorted(shard_floor_list))) or 'none'}): {count} patients")
+
+    print(f"Database sharded into {shard_dir}")
+
 def show_patient_details(patient_id):
     """Show detailed information about a specific patient"""
-    db = PatientDatabase()
+    db = open_storage()
     patient = db.get_patient_by_id(patient_id)
     
     if patient:
@@ -101,6 +152,229 @@ def show_patient_details(patient_id):
     else:
         print(f"Patient {patient_id} not found.")
 
+def show_handoff(floor=None):
+    """Print shift handoff summaries for a floor (or every floor) as they are generated"""
+    db = open_storage()
+    start = time.perf_counter()
+    entries = collect_handoff(db, floor)
+    
+    print(f"=== Shift Handoff: {f'Floor {floor}' if floor is not None else 'All Floors'} ({len(entries)} patients) ===")
+    for record in summarize_handoff(entries):
+        print(f"\n[{record['status'].upper()}] {record['summary']}")
+    
+    print(f"\n{len(entries)} handoff summaries in {time.perf_counter() - start:.2f} s")
+
+TRACE_FIELDS = ['patient_id', 'respiratory_rate', 'airflow', 'timestamp']
+# Fastest paced replay, as a multiple of the recorded rate; 'max' (speed 0) sends ticks back to back
+MAX_REPLAY_SPEED = 1000
+REPLAY_USAGE = ("  replay <patients.db|trace.csv|trace.jsonl> [speed|max] [server_url] - Replay recorded vitals "
+                f"through ingestion and alerting at speed x real time (above 0, at most {MAX_REPLAY_SPEED}; default 1) "
+                "or max")
+
+def load_vitals_trace(source):
+    """Recorded vitals, oldest first, from a SQLite database or an export_vitals .csv / .jsonl file"""
+    if source.endswith('.csv'):
+        with open(source, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    elif source.endswith(('.jsonl', '.json')):
+        with open(source, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        conn = sqlite3.connect(source)
+        conn.row_factory = sqlite3.Row
+        rows = [dict(row) for row in conn.execute(
+            'SELECT patient_id, respiratory_rate, airflow, timestamp FROM patient_vitals ORDER BY timestamp, id')]
+        conn.close()
+
+    trace = [{
+        'patient_id': row['patient_id'],
+        'respiratory_rate': int(row['respiratory_rate']),
+        'airflow': int(row['airflow']),
+        'timestamp': row['timestamp'],
+    } for row in rows]
+    trace.sort(key=lambda reading: reading['timestamp'])  # stable, so same-second readings keep their order
+    return trace
+
+def _storage_trace(db):
+    """Every reading recorded in a storage engine, oldest first"""
+    trace = [{
+        'patient_id': patient['id'],
+        'respiratory_rate': reading['respiratory_rate'],
+        'airflow': reading['airflow'],
+        'timestamp': reading['timestamp'],
+    } for patient in db.get_all_patients() for reading in db.get_patient_vitals_range(patient['id'])]
+    trace.sort(key=lambda reading: reading['timestamp'])  # stable, so each patient's readings keep their order
+    return trace
+
+def export_vitals(path):
+    """Write the recorded vitals history of the configured storage to a .csv or .jsonl trace for replay"""
+    trace = _storage_trace(open_storage())
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for reading in trace:
+                f.write(json.dumps(reading) + '\n')
+        else:
+            writer = csv.DictWriter(f, fieldnames=TRACE_FIELDS)
+            writer.writeheader()
+            writer.writerows(trace)
+    print(f"Exported {len(trace)} readings to {path}")
+
+def _replay_census(source, trace):
+    """Patients for the scratch database, each starting from their first recorded reading"""
+    if source.endswith(('.csv', '.jsonl', '.json')):
+        patients = open_storage().get_all_patients()
+    else:
+        conn = sqlite3.connect(source)
+        conn.row_factory = sqlite3.Row
+        patients = [dict(row) for row in conn.execute('SELECT * FROM patients')]
+        conn.close()
+
+    census = {patient['id']: patient for patient in patients}
+    first_readings = {}
+    for reading in trace:
+        first_readings.setdefault(reading['patient_id'], reading)
+    for patient_id, reading in first_readings.items():
+        # Patients missing from the census still get a row so their alerts are evaluated
+        patient = census.setdefault(patient_id, {
+            "id": patient_id, "name": patient_id, "age": 0, "condition": "Unknown", "last_visit": "", "floor": 0,
+        })
+        patient.update(respiratory_rate=reading['respiratory_rate'], airflow=reading['airflow'])
+    return list(census.values())
+
+def _in_process_target(scratch_dir, census):
+    """Post ticks to a private app instance backed by a scratch database"""
+    db_path = os.path.join(scratch_dir, "replay.db")
+    scratch = PatientDatabase(db_path, seed=False)
+    for patient in census:
+        scratch.add_patient(patient)
+
+    os.environ['PATIENT_DB_PATH'] = db_path
+    for name in ('PATIENT_STORAGE', 'PATIENT_DB_SHARD_DIR', 'NOTIFY_WEBHOOK_URL', 'NOTIFY_PAGER_URL', 'NOTIFY_FILE'):
+        os.environ.pop(name, None)  # replayed alerts must never page anyone
+    if os.environ.get('VITALS_JOURNAL_DIR'):
+        os.environ['VITALS_JOURNAL_DIR'] = os.path.join(scratch_dir, "journal")
+
+    import app
+    client = app.create_app().test_client()
+
+    def post(readings):
+        response = client.post('/api/vitals', json=readings)
+        try:
+            return response.status_code, response.get_json()
+        finally:
+            response.close()  # releases the request scheduler slot
+
+    def close():
+        if app.vitals_compactor:
+            app.vitals_compactor.stop()
+        app.watcher.stop()
+
+    return post, close
+
+def _http_target(url):
+    """Post ticks to a running server"""
+    endpoint = url.rstrip('/') + '/api/vitals'
+
+    def post(readings):
+        request = urllib.request.Request(endpoint, data=json.dumps(readings).encode('utf-8'), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+        except urllib.error.URLError as e:
+            print(f"Error posting to {endpoint}: {e.reason}")
+            return 0, None
+
+    return post, lambda: None
+
+def _epoch(timestamp):
+    return calendar.timegm(datetime.fromisoformat(str(timestamp)).utctimetuple())
+
+def _latency_summary(seconds):
+    if not seconds:
+        return "n/a"
+    ordered = sorted(seconds)
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    return (f"mean {statistics.mean(ordered) * 1000:.1f} ms, p50 {pick(0.5):.1f} ms, "
+            f"p95 {pick(0.95):.1f} ms, p99 {pick(0.99):.1f} ms, max {ordered[-1] * 1000:.1f} ms")
+
+def parse_replay_speed(text):
+    """Replay speed from the command line: 'max' (0) or a number above 0 and at most MAX_REPLAY_SPEED"""
+    if text == "max":
+        return 0
+    try:
+        speed = float(text)
+    except ValueError:
+        raise ValueError(f"Replay speed must be a number or 'max', got {text!r}")
+    if not 0 < speed <= MAX_REPLAY_SPEED:
+        raise ValueError(f"Replay speed must be above 0 and at most {MAX_REPLAY_SPEED} (or 'max'), got {text}")
+    return speed
+
+def replay_vitals(source, speed=1.0, url=None):
+    """Replay recorded vitals through ingestion and alerting, speed times faster than recorded
+    (above 0 and at most MAX_REPLAY_SPEED; 0 = flat out). Other speeds raise ValueError.
+
+    Without a url the readings go to an in-process app on a scratch copy of
+    the census, so the real database is never touched; with a url they are
+    POSTed to that running server."""
+    if not (speed == 0 or 0 < speed <= MAX_REPLAY_SPEED):
+        raise ValueError(f"Replay speed must be above 0 and at most {MAX_REPLAY_SPEED} (or 0 for max), got {speed}")
+    trace = load_vitals_trace(source)
+    if not trace:
+        print(f"No recorded vitals in {source}")
+        return
+
+    # Readings recorded in the same second are sent together as one ingest tick
+    ticks = []
+    for reading in trace:
+        epoch = _epoch(reading['timestamp'])
+        if not ticks or ticks[-1][0] != epoch:
+            ticks.append((epoch, []))
+        ticks[-1][1].append({key: reading[key] for key in ('patient_id', 'respiratory_rate', 'airflow')})
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        post, close = _http_target(url) if url else _in_process_target(scratch_dir, _replay_census(source, trace))
+        latencies, lags, alert_latencies, alerts, failed = [], [], [], [], 0
+
+        start = time.perf_counter()
+        for epoch, readings in ticks:
+            due = start + (epoch - ticks[0][0]) / speed if speed else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            lags.append(sent - due)
+            status, body = post(readings)
+            done = time.perf_counter()
+            latencies.append(done - sent)
+            if status != 200:
+                failed += 1
+                continue
+            for alert in body.get('alerts', []):
+                alerts.append(alert)
+                alert_latencies.append(done - due)
+        elapsed = time.perf_counter() - start
+        close()
+
+    span = ticks[-1][0] - ticks[0][0]
+    print(f"=== Replay of {source}: {len(trace)} readings in {len(ticks)} ticks at {f'{speed:g}x' if speed else 'full speed'} ===")
+    print(f"Trace span {span} s replayed in {elapsed:.2f} s")
+    print(f"Throughput: {len(trace) / elapsed:,.0f} readings/s ({len(ticks) / elapsed:,.0f} ticks/s)")
+    print(f"Ingest latency per tick: {_latency_summary(latencies)}")
+    print(f"Schedule lag: {_latency_summary(lags)}")
+    by_severity, by_type = {}, {}
+    for alert in alerts:
+        by_severity[alert['severity']] = by_severity.get(alert['severity'], 0) + 1
+        by_type[alert['alert_type']] = by_type.get(alert['alert_type'], 0) + 1
+    print(f"Alerts: {len(alerts)} ({', '.join(f'{k} {v}' for k, v in sorted(by_severity.items())) or 'none'}; "
+          f"{', '.join(f'{k} {v}' for k, v in sorted(by_type.items())) or 'none'})")
+    print(f"Alert latency (reading due -> alert raised): {_latency_summary(alert_latencies)}")
+    if failed:
+        print(f"Failed ticks: {failed}")
+
 def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
@@ -110,6 +384,10 @@ def main():
         print("  reset - Reset database to initial state")
         print("  add_sample - Add a sample patient")
         print("  patient <id> - Show patient details")
+        print("  shard <dir> - Split the database into one file per floor")
+        print("  handoff [floor] - Shift handoff summaries for one floor or the whole hospital")
+        print("  export_vitals <file.csv|file.jsonl> - Export the recorded vitals history as a replay trace")
+        print(REPLAY_USAGE)
         return
     
     command = sys.argv[1].lower()
@@ -123,6 +401,21 @@ def main():
     elif command == "patient" and len(sys.argv) > 2:
         patient_id = sys.argv[2]
         show_patient_details(patient_id)
+    elif command == "handoff":
+        show_handoff(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    elif command == "shard" and len(sys.argv) > 2:
+        shard_database(sys.argv[2])
+    elif command == "export_vitals" and len(sys.argv) > 2:
+        export_vitals(sys.argv[2])
+    elif command == "replay" and len(sys.argv) > 2:
+        try:
+            speed = parse_replay_speed(sys.argv[3] if len(sys.argv) > 3 else "1")
+        except ValueError as e:
+            print(f"Error: {e}")
+            print("Usage:")
+            print(REPLAY_USAGE)
+            return
+        replay_vitals(sys.argv[2], speed, sys.argv[4] if len(sys.argv) > 4 else None)
     else:
         print("Invalid command. Use 'python db_manager.py' to see available commands.")
 
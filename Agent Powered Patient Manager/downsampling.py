@@ -0,0 +1,45 @@
+from typing import List, Sequence, Tuple
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most `threshold` points (always including the
+    first and last) chosen so the line keeps its visual shape: each bucket
+    keeps the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, so spikes and dips survive."""
+    count = len(points)
+    if count <= threshold:
+        return list(range(count))
+    if threshold < 3:
+        return [0, count - 1][:max(threshold, 0)]
+
+    selected = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the following bucket (just the last point for the final bucket)
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        if next_start >= next_end:
+            next_start, next_end = count - 1, count
+        span = next_end - next_start
+        avg_x = sum(points[i][0] for i in range(next_start, next_end)) / span
+        avg_y = sum(points[i][1] for i in range(next_start, next_end)) / span
+
+        prev_x, prev_y = points[previous]
+        best_area, best_index = -1.0, start
+        for i in range(start, end):
+            x, y = points[i]
+            area = abs((prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y))
+            if area > best_area:
+                best_area, best_index = area, i
+
+        selected.append(best_index)
+        previous = best_index
+
+    selected.append(count - 1)
+    return selected
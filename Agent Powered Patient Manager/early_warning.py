@@ -0,0 +1,81 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+# Each band is (low, high, points); bounds are inclusive and None means open-ended.
+# Respiratory rate follows the NEWS2 bands, airflow mirrors the dashboard thresholds.
+DEFAULT_SCORING_TABLES = {
+    "respiratory_rate": [
+        (None, 8, 3),
+        (9, 11, 1),
+        (12, 20, 0),
+        (21, 24, 2),
+        (25, None, 3),
+    ],
+    "airflow": [
+        (None, 59, 3),
+        (60, 69, 2),
+        (70, 79, 1),
+        (80, None, 0),
+    ],
+}
+
+# Aggregate score thresholds, checked from the top down
+DEFAULT_RISK_LEVELS = [
+    (7, "high"),
+    (5, "medium"),
+    (0, "low"),
+]
+
+
+class EarlyWarningScorer:
+    def __init__(self, tables: Optional[Dict[str, List[Tuple]]] = None,
+                 risk_levels: Optional[List[Tuple[int, str]]] = None):
+        self.tables = tables or DEFAULT_SCORING_TABLES
+        self.risk_levels = sorted(risk_levels or DEFAULT_RISK_LEVELS, reverse=True)
+
+    def score_parameter(self, parameter: str, value: float) -> int:
+        """Score a single vital sign against its band table"""
+        for low, high, points in self.tables[parameter]:
+            if (low is None or value >= low) and (high is None or value <= high):
+                return points
+        return 0
+
+    def score(self, patient: Dict) -> int:
+        """Aggregate early-warning score for one patient"""
+        return sum(self.score_parameter(parameter, patient[parameter]) for parameter in self.tables)
+
+    def risk_level(self, score: int) -> str:
+        """Map an aggregate score to its risk level"""
+        for threshold, level in self.risk_levels:
+            if score >= threshold:
+                return level
+        return self.risk_levels[-1][1]
+
+    def score_expression(self) -> str:
+        """SQL expression computing the aggregate score from a patients row.
+
+        Lets the database rescore the whole census in one set-based UPDATE
+        instead of a Python loop over every patient."""
+        terms = []
+        for parameter, bands in self.tables.items():
+            cases = []
+            for low, high, points in bands:
+                conditions = []
+                if low is not None:
+                    conditions.append(f"{parameter} >= {low}")
+                if high is not None:
+                    conditions.append(f"{parameter} <= {high}")
+                cases.append(f"WHEN {' AND '.join(conditions) or '1'} THEN {int(points)}")
+            terms.append(f"(CASE {' '.join(cases)} ELSE 0 END)")
+        return " + ".join(terms)
+
+    def risk_expression(self, score_column: str = "news_score") -> str:
+        """SQL expression mapping a score column to its risk level"""
+        cases = " ".join(f"WHEN {score_column} >= {int(threshold)} THEN '{level}'"
+                         for threshold, level in self.risk_levels)
+        return f"(CASE {cases} ELSE '{self.risk_levels[-1][1]}' END)"
+
+    def top_k(self, patients: List[Dict], k: int) -> List[Dict]:
+        """Return the k highest scoring patients without sorting the whole list"""
+        # Ties break by name, matching the ORDER BY used by PatientDatabase
+        return heapq.nsmallest(k, patients, key=lambda patient: (-(patient.get('news_score') or 0), patient.get('name', '')))
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from alerting import airflow_status, respiratory_status
+from nurse_agent import NurseAgent
+from storage import PatientStorage
+
+STATUS_ORDER = ('normal', 'warning', 'critical')
+# Readings shown in each patient's trend line
+HANDOFF_VITALS = 5
+# Smaller reports are summarized in the calling process: at ~0.1 ms a patient, shipping
+# them to worker processes costs more than it saves
+PARALLEL_MIN_PATIENTS = int(os.environ.get('HANDOFF_PARALLEL_MIN', 2000))
+# Patients per task sent to a worker process
+CHUNK_PATIENTS = 250
+
+_pool = None
+_pool_lock = threading.Lock()
+_worker_agent = None
+
+
+def collect_handoff(storage: PatientStorage, floor: Optional[int] = None) -> List[Dict]:
+    """Everything a handoff needs in three bulk reads: the patients, their latest vitals and open alerts.
+    Ordered by floor, then name."""
+    patients = storage.get_all_patients() if floor is None else storage.get_patients_by_floor(floor)
+    latest = storage.get_latest_vitals(floor, HANDOFF_VITALS)
+    alerts = {}
+    for alert in storage.get_unacknowledged_alerts():
+        alerts.setdefault(alert['patient_id'], []).append(alert)
+
+    patients.sort(key=lambda p: p['floor'])  # stable, so each floor stays in name order
+    return [{'patient': p, 'vitals': latest.get(p['id'], []), 'alerts': alerts.get(p['id'], [])} for p in patients]
+
+
+def summarize_entry(agent: NurseAgent, entry: Dict) -> Dict:
+    """One patient's handoff record"""
+    patient = entry['patient']
+    status = max(respiratory_status(patient['respiratory_rate']), airflow_status(patient['airflow']),
+                 key=STATUS_ORDER.index)
+    return {
+        'patient_id': patient['id'],
+        'name': patient['name'],
+        'floor': patient['floor'],
+        'status': status,
+        'open_alerts': len(entry['alerts']),
+        'summary': agent.handoff_summary(patient, entry['vitals'], entry['alerts']),
+    }
+
+
+def _start_worker():
+    global _worker_agent
+    _worker_agent = NurseAgent()
+
+
+def _summarize_chunk(entries: List[Dict]) -> List[Dict]:
+    return [summarize_entry(_worker_agent, entry) for entry in entries]
+
+
+def handoff_pool() -> ProcessPoolExecutor:
+    """Worker processes shared by every report, started on first use. HANDOFF_WORKERS sets the size
+    (default: one per CPU)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the server's background threads may hold locks a forked child would inherit
+            _pool = ProcessPoolExecutor(max_workers=int(os.environ.get('HANDOFF_WORKERS', 0)) or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'), initializer=_start_worker)
+        return _pool
+
+
+def summarize_handoff(entries: List[Dict], parallel_min: int = PARALLEL_MIN_PATIENTS) -> Iterator[Dict]:
+    """Handoff records in entry order, yielded as they are produced. Reports of at least
+    parallel_min patients are split across the process pool in chunks."""
+    if len(entries) < parallel_min:
+        agent = NurseAgent()
+        for entry in entries:
+            yield summarize_entry(agent, entry)
+        return
+
+    chunks = [entries[i:i + CHUNK_PATIENTS] for i in range(0, len(entries), CHUNK_PATIENTS)]
+    # map hands back chunks in order as soon as each (and every one before it) is done
+    for summaries in handoff_pool().map(_summarize_chunk, chunks):
+        yield from summaries
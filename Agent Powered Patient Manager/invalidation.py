@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+from metrics import CACHE_REQUESTS
+
+
+class DataVersionWatcher:
+    """Notices commits made by any process to the patient database files.
+
+    SQLite bumps `PRAGMA data_version` on a connection whenever another
+    connection commits to the same file, so polling one long-lived connection
+    per file is a cheap cross-process change feed. Every Gunicorn worker runs
+    its own watcher and clears its own caches when something changes."""
+
+    def __init__(self, data_files: Callable[[], List[str]], interval: float = 0.5):
+        self.data_files = data_files
+        self.interval = interval
+        self.subscribers: List[Callable[[], None]] = []
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._versions: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback: Callable[[], None]):
+        """Register a callback to run after another connection commits"""
+        self.subscribers.append(callback)
+
+    def check(self) -> bool:
+        """Poll every data file once and notify subscribers if any changed"""
+        changed = False
+        for path in self.data_files():
+            if path not in self._connections:
+                self._connections[path] = sqlite3.connect(path, check_same_thread=False)
+                # A file appearing after the baseline (a new shard) already holds data
+                changed = changed or self._thread is not None
+            version = self._connections[path].execute('PRAGMA data_version').fetchone()[0]
+            if path in self._versions and self._versions[path] != version:
+                changed = True
+            self._versions[path] = version
+
+        if changed:
+            for callback in self.subscribers:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error in change subscriber: {e}")
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except sqlite3.Error as e:
+                print(f"Error polling data version: {e}")
+
+    def start(self):
+        """Start polling on a daemon thread (call once per worker process)"""
+        if self._thread is None:
+            self.check()  # record the baseline versions
+            self._thread = threading.Thread(target=self._run, name="data-version-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop polling and close the watcher connections"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+
+class InvalidatingCache:
+    """Per-worker memo of database reads, cleared whenever the watcher sees a commit.
+
+    Keys include client query parameters, so at most max_entries are kept and
+    the least recently used entry is evicted first."""
+
+    def __init__(self, watcher: DataVersionWatcher, name: str = "patients", max_entries: int = 256):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        watcher.subscribe(self.clear)
+
+    def get(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, loading it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                return self._entries[key]
+            generation = self._generation
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        value = loader()
+        with self._lock:
+            # Don't store a value loaded before a concurrent invalidation
+            if generation == self._generation:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
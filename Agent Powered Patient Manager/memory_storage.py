@@ -0,0 +1,692 @@
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from alerting import evaluate_alerts
+from database import INITIAL_PATIENTS, MAX_TIMESTAMP
+from early_warning import EarlyWarningScorer
+from storage import PATIENT_SORTS, PatientStorage, patient_sort_key
+from metrics import ALERTS_FIRED, STORAGE_OPERATION_DURATION, instrument_methods
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run a single process there
+    fcntl = None
+
+
+def _now() -> str:
+    """Timestamp in the same format as SQLite's CURRENT_TIMESTAMP"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+# Status predicates for query_patients, the same thresholds as the get_*_patients methods
+STATUS_PREDICATES = {
+    'critical': lambda p: p['respiratory_rate'] >= 26 or p['airflow'] <= 59,
+    'warning': lambda p: 21 <= p['respiratory_rate'] < 26 or 59 < p['airflow'] <= 79,
+    'normal': lambda p: p['respiratory_rate'] < 21 and p['airflow'] > 79,
+}
+FLOOR_COUNTS = ('patients', 'critical_patients', 'warning_patients', 'normal_patients', 'open_alerts')
+
+
+@instrument_methods(STORAGE_OPERATION_DURATION, "engine", "memory", exclude=("data_files",))
+class InMemoryPatientStorage(PatientStorage):
+    """Pure in-memory storage engine for hot-path deployments, tests and demos.
+
+    With no data_dir nothing touches disk. With a data_dir every mutation is
+    appended to a JSON-lines log (and fsynced, unless sync=False) before it is
+    applied, and a background thread periodically writes a full snapshot.
+    The snapshot copies the state and rotates the log under the lock, then
+    serialises outside it, so writers are only blocked for the copy. Each log
+    starts with a generation header and the snapshot records the generation it
+    covers, so startup loads the snapshot and replays exactly the log entries
+    written after it.
+
+    The state lives in one process, so run a single worker: a data_dir is
+    locked exclusively and opening it from a second process raises."""
+
+    SNAPSHOT_FILE = "snapshot.json"
+    LOG_FILE = "append.log"
+    ROTATED_LOG_FILE = "append.log.prev"
+
+    def __init__(self, data_dir: Optional[str] = None, scorer: Optional[EarlyWarningScorer] = None,
+                 seed: bool = True, snapshot_interval: float = 60.0, sync: bool = True):
+        self.data_dir = data_dir
+        self.scorer = scorer or EarlyWarningScorer()
+        self.snapshot_interval = snapshot_interval
+        self.sync = sync
+        self._lock = threading.RLock()
+        self._patients: Dict[str, Dict] = {}
+        self._vitals: Dict[str, List[Dict]] = {}
+        self._alerts: Dict[int, Dict] = {}
+        self._next_vitals_id = 1
+        self._next_alert_id = 1
+        self._deliveries: Dict[int, Dict] = {}
+        self._sink_marks: Dict[str, int] = {}
+        self._next_delivery_id = 1
+        self._journal_checkpoints: Dict[str, int] = {}
+        # floor -> counts plus airflow / respiratory rate value histograms, updated on every mutation
+        self._floors: Dict[int, Dict] = {}
+        # patient id -> change_seq, in the order the patients last changed
+        self._changed: Dict[str, int] = {}
+        self._change_seq = 0
+        self._log = None
+        self._log_generation = 0
+        self._stop = threading.Event()
+        self._snapshot_thread = None
+        self._lock_file = None
+
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            self._lock_data_dir()
+            self._load()
+            self._open_log()
+            if snapshot_interval:
+                self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="memory-snapshot", daemon=True)
+                self._snapshot_thread.start()
+
+        if seed and not self._patients:
+            for patient in INITIAL_PATIENTS:
+                self.add_patient(patient)
+
+    # Persistence
+
+    def _load(self):
+        """Restore state from the last snapshot plus the append log"""
+        snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+        covered = -1
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as f:
+                state = json.load(f)
+            self._patients = state['patients']
+            self._vitals = state['vitals']
+            self._alerts = {alert['id']: alert for alert in state['alerts']}
+            self._next_vitals_id = state['next_vitals_id']
+            self._next_alert_id = state['next_alert_id']
+            # Snapshots written before notification deliveries existed lack these keys
+            self._deliveries = {delivery['id']: delivery for delivery in state.get('deliveries', [])}
+            self._sink_marks = state.get('sink_marks', {})
+            self._next_delivery_id = state.get('next_delivery_id', 1)
+            self._journal_checkpoints = state.get('journal_checkpoints', {})
+            # Snapshots written before log generations existed cover nothing still in the log
+            covered = state.get('log_generation', -1)
+            for patient in self._patients.values():
+                self._floor_delta(patient, 1)
+            for alert in self._alerts.values():
+                if not alert['acknowledged']:
+                    self._open_alert_delta(alert, 1)
+            for patient in sorted(self._patients.values(), key=lambda p: p.setdefault('change_seq', 0)):
+                self._changed[patient['id']] = patient['change_seq']
+            self._change_seq = max(self._changed.values(), default=0)
+
+        # A rotated log is left behind when a snapshot did not finish; it predates the current one
+        self._log_generation = covered + 1
+        for log_file in (self.ROTATED_LOG_FILE, self.LOG_FILE):
+            log_path = os.path.join(self.data_dir, log_file)
+            if not os.path.exists(log_path):
+                continue
+            generation = None  # logs written before generations existed have no header
+            with open(log_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn line from a crash mid-write; _open_log terminated it
+                    if entry['op'] == 'generation':
+                        generation = entry['data']
+                        self._log_generation = max(self._log_generation, generation + 1)
+                    elif generation is None or generation > covered:
+                        self._apply(entry['op'], entry['data'])
+
+    def _lock_data_dir(self):
+        """Fail fast if another process already owns data_dir; its log and snapshots are not shared-safe"""
+        self._lock_file = open(os.path.join(self.data_dir, 'memory.lock'), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                self._lock_file = None
+                raise RuntimeError(f"{self.data_dir} is in use by another process; the in-memory engine "
+                                   f"is single-process only (run one worker)")
+
+    def _open_log(self):
+        """Start appending to the log under a new generation header"""
+        log_path = os.path.join(self.data_dir, self.LOG_FILE)
+        torn = False
+        if os.path.exists(log_path) and os.path.getsize(log_path):
+            with open(log_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._log = open(log_path, 'a', encoding='utf-8')
+        if torn:
+            self._log.write('\n')
+        self._write_log({'op': 'generation', 'data': self._log_generation})
+
+    def _write_log(self, entry: Dict):
+        self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+        if self.sync:
+            os.fsync(self._log.fileno())
+
+    def _record(self, op: str, data):
+        """Append a mutation to the log, then apply it"""
+        if self._log is not None:
+            self._write_log({'op': op, 'data': data})
+        self._apply(op, data)
+
+    def _floor_delta(self, patient: Dict, sign: int):
+        """Add (1) or remove (-1) a patient's current vitals from its floor's summary"""
+        floor = self._floors.get(patient['floor'])
+        if floor is None:
+            floor = self._floors[patient['floor']] = dict(
+                dict.fromkeys(FLOOR_COUNTS, 0), airflow=Counter(), respiratory_rate=Counter())
+        floor['patients'] += sign
+        for status, predicate in STATUS_PREDICATES.items():
+            floor[f'{status}_patients'] += sign * predicate(patient)
+        for vital in ('airflow', 'respiratory_rate'):
+            values = floor[vital]
+            values[patient[vital]] += sign
+            if not values[patient[vital]]:
+                del values[patient[vital]]
+
+    def _touch(self, patient: Dict):
+        """Stamp a patient with the next change sequence number and move it to the end of the change order.
+        Assigned while applying, so replaying the log reproduces the same numbers."""
+        self._change_seq += 1
+        patient['change_seq'] = self._change_seq
+        self._changed.pop(patient['id'], None)
+        self._changed[patient['id']] = self._change_seq
+
+    def _open_alert_delta(self, alert: Dict, delta: int):
+        """Adjust the open alert count of the floor an alert's patient is on"""
+        patient = self._patients.get(alert['patient_id'])
+        if patient is not None:
+            self._floors[patient['floor']]['open_alerts'] += delta
+
+    def _apply(self, op: str, data):
+        """Apply a logged mutation to the in-memory state"""
+        if op == 'add_patient':
+            self._patients[data['id']] = data
+            self._vitals.setdefault(data['id'], [])
+            self._floor_delta(data, 1)
+            self._touch(data)
+        elif op == 'vitals':
+            for reading in data:
+                patient = self._patients[reading['patient_id']]
+                self._floor_delta(patient, -1)
+                patient.update(
+                    respiratory_rate=reading['respiratory_rate'],
+                    airflow=reading['airflow'],
+                    news_score=reading['news_score'],
+                    news_risk=reading['news_risk'],
+                    updated_at=reading['timestamp'],
+                )
+                self._floor_delta(patient, 1)
+                self._touch(patient)
+                self._vitals[reading['patient_id']].append({
+                    'id': reading['id'],
+                    'patient_id': reading['patient_id'],
+                    'respiratory_rate': reading['respiratory_rate'],
+                    'airflow': reading['airflow'],
+                    'timestamp': reading['timestamp'],
+                })
+                self._next_vitals_id = max(self._next_vitals_id, reading['id'] + 1)
+        elif op == 'journal':
+            self._apply('vitals', data['readings'])
+            self._journal_checkpoints[data['journal']] = data['through']
+        elif op == 'rescore':
+            for patient_id, (news_score, news_risk) in data.items():
+                self._patients[patient_id].update(news_score=news_score, news_risk=news_risk)
+        elif op == 'add_alert':
+            self._alerts[data['id']] = data
+            self._next_alert_id = max(self._next_alert_id, data['id'] + 1)
+            if not data['acknowledged']:
+                self._open_alert_delta(data, 1)
+        elif op == 'acknowledge_alert':
+            if not self._alerts[data]['acknowledged']:
+                self._open_alert_delta(self._alerts[data], -1)
+            self._alerts[data]['acknowledged'] = 1
+        elif op == 'queue_deliveries':
+            self._sink_marks[data['sink']] = data['mark']
+            for delivery in data['deliveries']:
+                self._deliveries[delivery['id']] = delivery
+                self._next_delivery_id = max(self._next_delivery_id, delivery['id'] + 1)
+        elif op == 'update_deliveries':
+            for delivery_id in data['ids']:
+                delivery = self._deliveries[delivery_id]
+                delivery.update(status=data['status'], last_error=data['error'], claim=None,
+                                attempts=delivery['attempts'] + 1, delivered_at=data['delivered_at'])
+                if data['retry_at'] is not None:
+                    delivery['next_attempt_at'] = data['retry_at']
+
+    def snapshot(self):
+        """Write a full snapshot atomically and drop the log entries it covers"""
+        if not self.data_dir:
+            return
+        with self._lock:
+            if self._log is None:
+                return
+            # Copy what _apply mutates in place; vitals readings are never changed once appended
+            state = {
+                'patients': {patient_id: dict(patient) for patient_id, patient in self._patients.items()},
+                'vitals': {patient_id: list(history) for patient_id, history in self._vitals.items()},
+                'alerts': [dict(alert) for alert in self._alerts.values()],
+                'next_vitals_id': self._next_vitals_id,
+                'next_alert_id': self._next_alert_id,
+                'deliveries': [dict(delivery) for delivery in self._deliveries.values()],
+                'sink_marks': dict(self._sink_marks),
+                'next_delivery_id': self._next_delivery_id,
+                'journal_checkpoints': dict(self._journal_checkpoints),
+                'log_generation': self._log_generation,
+            }
+            self._rotate_log()
+
+        snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+        with open(snapshot_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(snapshot_path + '.tmp', snapshot_path)
+        os.remove(os.path.join(self.data_dir, self.ROTATED_LOG_FILE))
+
+    def _rotate_log(self):
+        """Move the current log aside (onto any left by a failed snapshot) and start the next generation"""
+        self._log.close()
+        log_path = os.path.join(self.data_dir, self.LOG_FILE)
+        rotated_path = os.path.join(self.data_dir, self.ROTATED_LOG_FILE)
+        if os.path.exists(rotated_path):
+            with open(log_path, encoding='utf-8') as src, open(rotated_path, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(log_path)
+        else:
+            os.replace(log_path, rotated_path)
+        self._log_generation += 1
+        self._open_log()
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except OSError as e:
+                print(f"Error writing snapshot: {e}")
+
+    def close(self):
+        """Stop the snapshot thread and write a final snapshot"""
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        if self._log is not None:
+            self.snapshot()
+            self._log.close()
+            self._log = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the data_dir lock
+            self._lock_file = None
+
+    def data_files(self) -> List[str]:
+        """No SQLite files back this engine"""
+        return []
+
+    # Patients
+
+    @staticmethod
+    def _sorted_by_name(patients) -> List[Dict]:
+        return [dict(patient) for patient in sorted(patients, key=lambda p: p['name'])]
+
+    def add_patient(self, patient_data: Dict) -> bool:
+        """Add a new patient"""
+        with self._lock:
+            if patient_data['id'] in self._patients:
+                print(f"Error adding patient: patient {patient_data['id']} already exists")
+                return False
+
+            news_score = self.scorer.score(patient_data)
+            timestamp = _now()
+            self._record('add_patient', {
+                'id': patient_data['id'],
+                'name': patient_data['name'],
+                'age': patient_data['age'],
+                'condition': patient_data['condition'],
+                'last_visit': patient_data['last_visit'],
+                'floor': patient_data['floor'],
+                'respiratory_rate': patient_data['respiratory_rate'],
+                'airflow': patient_data['airflow'],
+                'news_score': news_score,
+                'news_risk': self.scorer.risk_level(news_score),
+                'created_at': timestamp,
+                'updated_at': timestamp,
+            })
+            return True
+
+    def get_all_patients(self) -> List[Dict]:
+        """Get all patients ordered by name"""
+        with self._lock:
+            return self._sorted_by_name(self._patients.values())
+
+    def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
+        """Get a specific patient by ID"""
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            return dict(patient) if patient else None
+
+    def get_patients_by_floor(self, floor: int) -> List[Dict]:
+        """Get all patients on a specific floor ordered by name"""
+        with self._lock:
+            return self._sorted_by_name(p for p in self._patients.values() if p['floor'] == floor)
+
+    def get_patient_changes(self, since: Optional[str] = None, floor: Optional[int] = None) -> Tuple[List[Dict], str]:
+        """Walk the change order back from the newest change until reaching the cursor"""
+        try:
+            since_seq = int(since) if since else -1
+        except ValueError:
+            raise ValueError("Invalid change cursor")
+
+        with self._lock:
+            if since_seq < 0 or since_seq > self._change_seq:
+                changed = self._patients.values()
+            else:
+                changed = []
+                for patient_id, change_seq in reversed(self._changed.items()):
+                    if change_seq <= since_seq:
+                        break
+                    changed.append(self._patients[patient_id])
+            return (self._sorted_by_name(p for p in changed if floor is None or p['floor'] == floor),
+                    str(self._change_seq))
+
+    def search_patients(self, search_term: str) -> List[Dict]:
+        """Search patients by name or ID (case-insensitive, like SQL LIKE)"""
+        term = search_term.lower()
+        with self._lock:
+            return self._sorted_by_name(
+                p for p in self._patients.values() if term in p['name'].lower() or term in p['id'].lower()
+            )
+
+    def query_patients(self, floor: Optional[int] = None, status: Optional[str] = None,
+                       condition: Optional[str] = None, sort: str = 'name',
+                       after: Optional[List] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Filter and sort patients with keyset pagination"""
+        after_key = patient_sort_key(dict(zip((c for c, _ in PATIENT_SORTS[sort]), after)), sort) if after is not None else None
+        condition = condition.lower() if condition else None
+        with self._lock:
+            matches = [
+                p for p in self._patients.values()
+                if (floor is None or p['floor'] == floor)
+                and (condition is None or p['condition'].lower() == condition)
+                and (status is None or STATUS_PREDICATES[status](p))
+                and (after_key is None or patient_sort_key(p, sort) > after_key)
+            ]
+            key = lambda p: patient_sort_key(p, sort)
+            ordered = heapq.nsmallest(limit, matches, key=key) if limit is not None else sorted(matches, key=key)
+            return [dict(p) for p in ordered]
+
+    # Vitals
+
+    def update_patient_vitals(self, patient_id: str, respiratory_rate: int, airflow: int) -> bool:
+        """Update patient vital signs and log the change"""
+        with self._lock:
+            self._record_vitals([{'patient_id': patient_id, 'respiratory_rate': respiratory_rate, 'airflow': airflow}])
+            return True
+
+    def ingest_vitals_batch(self, readings: List[Dict]) -> Optional[List[Dict]]:
+        """Apply one ingest tick of vital sign readings and raise alerts against the current vitals.
+
+        Only the touched patients can change score, so they are the only ones rescored."""
+        with self._lock:
+            alerts = evaluate_alerts(self._current_vitals(readings), readings)
+            self._record_vitals(readings)
+            for alert in alerts:
+                self.add_alert(alert['patient_id'], alert['alert_type'], alert['severity'], alert['value'],
+                               alert['message'])
+            return alerts
+
+    def _current_vitals(self, readings: List[Dict]) -> Dict[str, Tuple[int, int]]:
+        """Current (respiratory_rate, airflow) of the known patients in a run of readings"""
+        return {r['patient_id']: (self._patients[r['patient_id']]['respiratory_rate'], self._patients[r['patient_id']]['airflow'])
+                for r in readings if r['patient_id'] in self._patients}
+
+    def _record_vitals(self, readings: List[Dict]):
+        """Log and apply readings for known patients, stamped now (call with the lock held)"""
+        timestamp = _now()
+        records = []
+        for reading in readings:
+            if reading['patient_id'] not in self._patients:
+                continue
+            news_score = self.scorer.score(reading)
+            records.append({
+                'id': self._next_vitals_id + len(records),
+                'patient_id': reading['patient_id'],
+                'respiratory_rate': reading['respiratory_rate'],
+                'airflow': reading['airflow'],
+                'news_score': news_score,
+                'news_risk': self.scorer.risk_level(news_score),
+                'timestamp': timestamp,
+            })
+        if records:
+            self._record('vitals', records)
+
+    def get_vitals_journal_checkpoint(self, journal: str) -> int:
+        """Last journal sequence number applied"""
+        with self._lock:
+            return self._journal_checkpoints.get(journal, 0)
+
+    def apply_vitals_journal(self, journal: str, records: List[Dict], through_sequence: int) -> bool:
+        """Apply journaled readings and the new checkpoint as one logged mutation"""
+        with self._lock:
+            checkpoint = self._journal_checkpoints.get(journal, 0)
+            fresh = [r for r in records if r['sequence'] > checkpoint and r['patient_id'] in self._patients]
+            alerts = evaluate_alerts(self._current_vitals(fresh), fresh)
+            readings = []
+            for record in records:
+                if record['sequence'] <= checkpoint or record['patient_id'] not in self._patients:
+                    continue
+                news_score = self.scorer.score(record)
+                readings.append({
+                    'id': self._next_vitals_id + len(readings),
+                    'patient_id': record['patient_id'],
+                    'respiratory_rate': record['respiratory_rate'],
+                    'airflow': record['airflow'],
+                    'news_score': news_score,
+                    'news_risk': self.scorer.risk_level(news_score),
+                    'timestamp': record['timestamp'],
+                })
+            self._record('journal', {'journal': journal, 'through': max(checkpoint, through_sequence),
+                                     'readings': readings})
+            for alert in alerts:
+                self.add_alert(alert['patient_id'], alert['alert_type'], alert['severity'], alert['value'],
+                               alert['message'])
+            return True
+
+    def get_patient_vitals_history(self, patient_id: str, limit: int = 10) -> List[Dict]:
+        """Get historical vital signs for a patient, newest first"""
+        with self._lock:
+            history = self._vitals.get(patient_id, [])
+            return [dict(vital) for vital in reversed(history[-limit:])] if limit > 0 else []
+
+    def get_latest_vitals(self, floor: Optional[int] = None, limit: int = 5) -> Dict[str, List[Dict]]:
+        """Latest readings for every patient (or one floor's), newest first"""
+        with self._lock:
+            return {
+                patient_id: [dict(vital) for vital in reversed(self._vitals[patient_id][-limit:])]
+                for patient_id, patient in self._patients.items()
+                if (floor is None or patient['floor'] == floor) and self._vitals[patient_id] and limit > 0
+            }
+
+    def get_patient_vitals_range(self, patient_id: str, start: Optional[str] = None,
+                                 end: Optional[str] = None) -> List[Dict]:
+        """Get a patient's vital signs between two timestamps (inclusive), oldest first"""
+        with self._lock:
+            history = self._vitals.get(patient_id, [])
+            # History is appended in time order, so the range is found by bisection
+            low = bisect.bisect_left(history, start or '', key=lambda v: v['timestamp'])
+            high = bisect.bisect_right(history, end or MAX_TIMESTAMP, key=lambda v: v['timestamp'])
+            return [
+                {'timestamp': v['timestamp'], 'respiratory_rate': v['respiratory_rate'], 'airflow': v['airflow']}
+                for v in history[low:high]
+            ]
+
+    # Early-warning scores
+
+    def rescore_all_patients(self) -> bool:
+        """Recompute early-warning scores for every patient"""
+        with self._lock:
+            scores = {}
+            for patient_id, patient in self._patients.items():
+                news_score = self.scorer.score(patient)
+                scores[patient_id] = (news_score, self.scorer.risk_level(news_score))
+            self._record('rescore', scores)
+            return True
+
+    def get_ranked_patients(self, limit: int = 10) -> List[Dict]:
+        """Get the patients with the highest early-warning scores"""
+        with self._lock:
+            return [dict(patient) for patient in self.scorer.top_k(list(self._patients.values()), limit)]
+
+    def get_floor_summaries(self) -> List[Dict]:
+        """Per-floor aggregates from the incrementally maintained counts and histograms"""
+        with self._lock:
+            return [
+                {'floor': number, 'patients': floor['patients'], 'critical_patients': floor['critical_patients'],
+                 'warning_patients': floor['warning_patients'], 'normal_patients': floor['normal_patients'],
+                 'min_airflow': min(floor['airflow']), 'max_respiratory_rate': max(floor['respiratory_rate']),
+                 'open_alerts': floor['open_alerts']}
+                for number, floor in sorted(self._floors.items())
+            ]
+
+    # Alerts
+
+    def add_alert(self, patient_id: str, alert_type: str, severity: str, value: float, message: str = None) -> bool:
+        """Add an alert"""
+        with self._lock:
+            self._record('add_alert', {
+                'id': self._next_alert_id,
+                'patient_id': patient_id,
+                'alert_type': alert_type,
+                'severity': severity,
+                'value': float(value),
+                'message': message,
+                'acknowledged': 0,
+                'created_at': _now(),
+            })
+            ALERTS_FIRED.inc(severity=severity)
+            return True
+
+    def get_unacknowledged_alerts(self) -> List[Dict]:
+        """Get all unacknowledged alerts, newest first"""
+        with self._lock:
+            alerts = [
+                dict(alert, patient_name=self._patients[alert['patient_id']]['name'])
+                for alert in self._alerts.values()
+                if not alert['acknowledged'] and alert['patient_id'] in self._patients
+            ]
+        return sorted(alerts, key=lambda a: (a['created_at'], a['id']), reverse=True)
+
+    def get_alert(self, alert_id: int) -> Optional[Dict]:
+        """Get one alert by id"""
+        with self._lock:
+            alert = self._alerts.get(alert_id)
+            if alert is None or alert['patient_id'] not in self._patients:
+                return None
+            return dict(alert, patient_name=self._patients[alert['patient_id']]['name'])
+
+    def acknowledge_alert(self, alert_id: int) -> bool:
+        """Acknowledge an alert"""
+        with self._lock:
+            if alert_id in self._alerts:
+                self._record('acknowledge_alert', alert_id)
+            return True
+
+    # Alert notification deliveries (leases are not logged: after a restart every lease has expired)
+
+    def queue_alert_deliveries(self, sink: str, severities: Optional[List[str]] = None) -> int:
+        """Queue a pending delivery to a sink for every alert past its high-water mark"""
+        with self._lock:
+            latest = self._next_alert_id - 1
+            mark = self._sink_marks.get(sink)
+            if mark is None:
+                self._record('queue_deliveries', {'sink': sink, 'mark': latest, 'deliveries': []})
+                return 0
+            if latest <= mark:
+                return 0
+
+            deliveries = []
+            for alert_id in range(mark + 1, latest + 1):
+                alert = self._alerts.get(alert_id)
+                if alert is None or (severities and alert['severity'] not in severities):
+                    continue
+                deliveries.append({
+                    'id': self._next_delivery_id + len(deliveries),
+                    'alert_id': alert_id,
+                    'sink': sink,
+                    'status': 'pending',
+                    'attempts': 0,
+                    'next_attempt_at': 0,
+                    'claim': None,
+                    'last_error': None,
+                    'created_at': _now(),
+                    'delivered_at': None,
+                })
+            self._record('queue_deliveries', {'sink': sink, 'mark': latest, 'deliveries': deliveries})
+            return len(deliveries)
+
+    def claim_alert_deliveries(self, sink: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """Lease the oldest due deliveries for a sink and return them with their alerts"""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            # Deliveries are inserted in id order, so dict order is already oldest first
+            for delivery_id, delivery in self._deliveries.items():
+                if delivery['sink'] != sink or delivery['status'] != 'pending' or delivery['next_attempt_at'] > now:
+                    continue
+                delivery['next_attempt_at'] = now + lease_seconds
+                patient = self._patients.get(self._alerts[delivery['alert_id']]['patient_id'], {})
+                claimed.append(dict(
+                    self._alerts[delivery['alert_id']],
+                    delivery_id=delivery_id,
+                    attempts=delivery['attempts'],
+                    patient_name=patient.get('name'),
+                    floor=patient.get('floor'),
+                ))
+                if len(claimed) >= limit:
+                    break
+        return claimed
+
+    def update_alert_deliveries(self, delivery_ids: List[int], status: str, error: Optional[str] = None,
+                                retry_at: Optional[float] = None) -> bool:
+        """Record an attempt's outcome and release the lease"""
+        with self._lock:
+            self._record('update_deliveries', {
+                'ids': [delivery_id for delivery_id in delivery_ids if delivery_id in self._deliveries],
+                'status': status,
+                'error': error,
+                'retry_at': retry_at,
+                'delivered_at': _now() if status == 'delivered' else None,
+            })
+            return True
+
+    # Status queries (same thresholds as the SQL in PatientDatabase)
+
+    def get_critical_patients(self) -> List[Dict]:
+        """Get patients with critical vital signs"""
+        with self._lock:
+            return self._sorted_by_name(
+                p for p in self._patients.values() if p['respiratory_rate'] >= 26 or p['airflow'] <= 59
+            )
+
+    def get_warning_patients(self) -> List[Dict]:
+        """Get patients with warning vital signs"""
+        with self._lock:
+            return self._sorted_by_name(
+                p for p in self._patients.values()
+                if 21 <= p['respiratory_rate'] < 26 or 59 < p['airflow'] <= 79
+            )
+
+    def get_normal_patients(self) -> List[Dict]:
+        """Get patients with normal vital signs"""
+        with self._lock:
+            return self._sorted_by_name(
+                p for p in self._patients.values() if p['respiratory_rate'] < 21 and p['airflow'] > 79
+            )
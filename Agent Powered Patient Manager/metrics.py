@@ -0,0 +1,211 @@
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond storage calls up to slow chat requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value that can go up and down, optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[2] if series else 0
+
+    def time(self, **labels):
+        """Decorator recording the wrapped function's duration"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in sorted(self._series.items())]
+        for key, bucket_counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served at /metrics
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Flask request latency by route", ("method", "route", "status"))
+STORAGE_OPERATION_DURATION = REGISTRY.histogram(
+    "storage_operation_duration_seconds", "Patient storage method latency", ("engine", "operation"))
+AGENT_HANDLER_DURATION = REGISTRY.histogram(
+    "agent_handler_duration_seconds", "Agent intent handler latency", ("agent", "handler"))
+VITALS_INGESTED = REGISTRY.counter(
+    "vitals_ingested_total", "Vital sign readings ingested")
+ALERTS_FIRED = REGISTRY.counter(
+    "alerts_fired_total", "Alerts recorded", ("severity",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by result", ("cache", "result"))
+SCHEDULER_QUEUE_WAIT = REGISTRY.histogram(
+    "scheduler_queue_wait_seconds", "Time requests waited for a slot in their priority class", ("priority",))
+SCHEDULER_REJECTED = REGISTRY.counter(
+    "scheduler_rejected_total", "Requests turned away with 503 by priority class", ("priority", "reason"))
+SCHEDULER_ACTIVE = REGISTRY.gauge(
+    "scheduler_active_requests", "Requests currently running by priority class", ("priority",))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    "scheduler_queued_requests", "Requests currently waiting by priority class", ("priority",))
+NOTIFICATION_DELIVERIES = REGISTRY.counter(
+    "notification_deliveries_total", "Alert notification delivery attempts by sink and result", ("sink", "result"))
+NOTIFICATION_SEND_DURATION = REGISTRY.histogram(
+    "notification_send_duration_seconds", "Time to send one batch of alerts to a sink", ("sink",))
+VITALS_JOURNAL_PENDING = REGISTRY.gauge(
+    "vitals_journal_pending_records", "Journaled vital sign readings not yet compacted into storage")
+VITALS_JOURNAL_COMPACTION_DURATION = REGISTRY.histogram(
+    "vitals_journal_compaction_seconds", "Time to fold one batch of journaled readings into storage")
+AUDIT_EVENTS = REGISTRY.counter(
+    "audit_events_total", "Audit events recorded by event type", ("event",))
+AUDIT_BUFFERED = REGISTRY.gauge(
+    "audit_buffered_events", "Audit events waiting to be flushed to the audit store")
+AUDIT_OVERFLOW_FLUSHES = REGISTRY.counter(
+    "audit_overflow_flushes_total", "Audit flushes done on a request thread because the buffer was full")
+AUDIT_DROPPED = REGISTRY.counter(
+    "audit_dropped_events_total", "Audit events discarded because the store kept failing with a full buffer")
+
+
+def instrument_methods(histogram: Histogram, label: str, value: str,
+                       include: Optional[Callable[[str], bool]] = None, method_label: str = "operation",
+                       exclude: Tuple[str, ...] = ()):
+    """Class decorator timing every public method (or those matching `include`) into `histogram`"""
+    include = include or (lambda name: not name.startswith("_") and name not in exclude)
+
+    def decorator(cls):
+        for name, attr in list(vars(cls).items()):
+            if callable(attr) and not isinstance(attr, (staticmethod, classmethod, type)) and include(name):
+                setattr(cls, name, histogram.time(**{label: value, method_label: name})(attr))
+        return cls
+    return decorator
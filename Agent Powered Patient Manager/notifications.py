@@ -0,0 +1,267 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from metrics import NOTIFICATION_DELIVERIES, NOTIFICATION_SEND_DURATION
+from storage import PatientStorage
+
+DEFAULT_BATCH_SIZE = 50
+# Alert fields sent to sinks (deliveries also carry lease bookkeeping that stays internal)
+ALERT_FIELDS = ('id', 'patient_id', 'patient_name', 'floor', 'alert_type', 'severity', 'value', 'message', 'created_at')
+
+
+def alert_payload(delivery: Dict) -> Dict:
+    """The public view of a claimed delivery's alert"""
+    return {field: delivery.get(field) for field in ALERT_FIELDS}
+
+
+def post_json(url: str, payload, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0):
+    """POST a JSON body; raises on connection errors and non-2xx responses"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), method='POST',
+        headers={'Content-Type': 'application/json', **(headers or {})})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+class NotificationSink(ABC):
+    """A destination for alert notifications, sent in batches"""
+
+    def __init__(self, name: str, severities: Optional[Sequence[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.name = name
+        # Only alerts with these severities are queued for this sink (None for all)
+        self.severities = list(severities) if severities else None
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def send(self, alerts: List[Dict]):
+        """Deliver a batch of alerts; raise to have the whole batch retried"""
+
+
+class WebhookSink(NotificationSink):
+    """POSTs {"alerts": [...]} to an HTTP endpoint"""
+
+    def __init__(self, url: str, name: str = 'webhook', headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 5.0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def send(self, alerts: List[Dict]):
+        post_json(self.url, {'alerts': alerts}, self.headers, self.timeout)
+
+
+class PagerSink(NotificationSink):
+    """Sends trigger events to a pager gateway; by default only critical alerts page anyone.
+
+    Each alert's id is its dedup key, so a batch retried after a timeout does
+    not page twice."""
+
+    def __init__(self, url: str, routing_key: str, name: str = 'pager', timeout: float = 5.0,
+                 severities: Optional[Sequence[str]] = ('critical',), **kwargs):
+        super().__init__(name, severities=severities, **kwargs)
+        self.url = url
+        self.routing_key = routing_key
+        self.timeout = timeout
+
+    def send(self, alerts: List[Dict]):
+        events = [{
+            'event_action': 'trigger',
+            'dedup_key': f"alert-{alert['id']}",
+            'payload': {
+                'summary': alert['message'] or f"{alert['alert_type']} {alert['value']} for {alert['patient_name']}",
+                'severity': alert['severity'],
+                'source': f"{alert['patient_name']} ({alert['patient_id']}), Floor {alert['floor']}",
+                'timestamp': alert['created_at'],
+                'custom_details': alert,
+            },
+        } for alert in alerts]
+        post_json(self.url, {'routing_key': self.routing_key, 'events': events}, timeout=self.timeout)
+
+
+class FileSink(NotificationSink):
+    """Appends each alert as a JSON line, synced to disk before the batch counts as delivered"""
+
+    def __init__(self, path: str, name: str = 'file', **kwargs):
+        super().__init__(name, **kwargs)
+        self.path = path
+
+    def send(self, alerts: List[Dict]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class AlertNotifier:
+    """Delivers new alerts to notification sinks from background threads.
+
+    Nothing is sent from the request that records an alert: each sink's
+    worker polls storage, queues deliveries for alerts it has not seen yet,
+    leases a batch, sends it and records the outcome. Failed batches are
+    retried with exponential backoff and jitter until max_attempts, then
+    marked failed. Leases make it safe to run a notifier in every Gunicorn
+    worker, and deliveries whose worker died are retried once the lease runs
+    out, so a slow or unreachable sink only ever delays its own queue."""
+
+    def __init__(self, storage: PatientStorage, sinks: List[NotificationSink], poll_interval: float = 1.0,
+                 max_attempts: int = 8, base_backoff: float = 2.0, max_backoff: float = 300.0,
+                 lease_seconds: float = 60.0):
+        self.storage = storage
+        self.sinks = sinks
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before the next attempt after `attempts` failures"""
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run_once(self, sink: NotificationSink) -> int:
+        """Queue, lease and send one batch for a sink; returns how many alerts were delivered"""
+        self.storage.queue_alert_deliveries(sink.name, sink.severities)
+        batch = self.storage.claim_alert_deliveries(sink.name, sink.batch_size, self.lease_seconds)
+        if not batch:
+            return 0
+
+        start = time.perf_counter()
+        try:
+            sink.send([alert_payload(delivery) for delivery in batch])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:500]
+            print(f"Error delivering {len(batch)} alerts to {sink.name}: {error}")
+            exhausted = [d['delivery_id'] for d in batch if d['attempts'] + 1 >= self.max_attempts]
+            retrying = [d for d in batch if d['attempts'] + 1 < self.max_attempts]
+            self.storage.update_alert_deliveries(exhausted, 'failed', error)
+            if retrying:
+                attempts = max(d['attempts'] for d in retrying) + 1
+                self.storage.update_alert_deliveries([d['delivery_id'] for d in retrying], 'pending', error,
+                                                     time.time() + self.backoff(attempts))
+            NOTIFICATION_DELIVERIES.inc(len(exhausted), sink=sink.name, result='failed')
+            NOTIFICATION_DELIVERIES.inc(len(retrying), sink=sink.name, result='retry')
+            return 0
+        finally:
+            NOTIFICATION_SEND_DURATION.observe(time.perf_counter() - start, sink=sink.name)
+
+        self.storage.update_alert_deliveries([d['delivery_id'] for d in batch], 'delivered')
+        NOTIFICATION_DELIVERIES.inc(len(batch), sink=sink.name, result='delivered')
+        return len(batch)
+
+    def _run(self, sink: NotificationSink):
+        while not self._stop.is_set():
+            try:
+                delivered = self.run_once(sink)
+            except Exception as e:
+                print(f"Error in {sink.name} notifier: {e}")
+                delivered = 0
+            # A full batch means there is probably a backlog, so keep going without waiting
+            if delivered < sink.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start one daemon worker thread per sink"""
+        if not self._threads:
+            self._stop.clear()
+            for sink in self.sinks:
+                thread = threading.Thread(target=self._run, args=(sink,), name=f"notify-{sink.name}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Stop the workers after their current batch"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+def notifier_from_env(storage: PatientStorage) -> Optional[AlertNotifier]:
+    """Build a notifier from NOTIFY_WEBHOOK_URL, NOTIFY_PAGER_URL (+ NOTIFY_PAGER_KEY) and
+    NOTIFY_FILE, or None when no sink is configured"""
+    sinks = []
+    if os.environ.get('NOTIFY_WEBHOOK_URL'):
+        sinks.append(WebhookSink(os.environ['NOTIFY_WEBHOOK_URL']))
+    if os.environ.get('NOTIFY_PAGER_URL'):
+        sinks.append(PagerSink(os.environ['NOTIFY_PAGER_URL'], os.environ.get('NOTIFY_PAGER_KEY', '')))
+    if os.environ.get('NOTIFY_FILE'):
+        sinks.append(FileSink(os.environ['NOTIFY_FILE']))
+    if not sinks:
+        return None
+    return AlertNotifier(
+        storage, sinks,
+        poll_interval=float(os.environ.get('NOTIFY_POLL_SECONDS', 1.0)),
+        max_attempts=int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 8)),
+    )
+
+
+class StubReceiver:
+    """Local HTTP server that records the JSON bodies POSTed to it, for trying sinks out.
+
+    A failure_rate between 0 and 1 answers that share of requests with a 503
+    so retries and backoff can be watched."""
+
+    def __init__(self, port: int = 0, failure_rate: float = 0.0, quiet: bool = True):
+        self.failure_rate = failure_rate
+        self.quiet = quiet
+        self.received: List[Dict] = []
+        self.failures = 0
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if random.random() < receiver.failure_rate:
+                    receiver.failures += 1
+                    self.send_response(503)
+                else:
+                    receiver.received.append(json.loads(body))
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                if not receiver.quiet:
+                    super().log_message(format, *args)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-receiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    # python notifications.py stub [port] [failure_rate]
+    if len(sys.argv) < 2 or sys.argv[1] != 'stub':
+        print("Usage: python notifications.py stub [port] [failure_rate]")
+        sys.exit(1)
+    stub = StubReceiver(int(sys.argv[2]) if len(sys.argv) > 2 else 8099,
+                        float(sys.argv[3]) if len(sys.argv) > 3 else 0.0, quiet=False)
+    print(f"Stub receiver listening on {stub.url} (set NOTIFY_WEBHOOK_URL or NOTIFY_PAGER_URL to it)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
@@ -1,117 +1,59 @@
 import re
 import json
+import os
+import threading
 from datetime import datetime
+from condition_index import ConditionIndex
+from metrics import AGENT_HANDLER_DURATION, instrument_methods
 
+# Knowledge base for common conditions, kept out of the code so it can grow
+DEFAULT_KNOWLEDGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "medical_knowledge.json")
+
+_knowledge_cache = {}
+_knowledge_lock = threading.Lock()
+
+def load_medical_knowledge(path):
+    """Load a knowledge base file once per process and share it between agents"""
+    with _knowledge_lock:
+        if path not in _knowledge_cache:
+            with open(path, encoding="utf-8") as f:
+                _knowledge_cache[path] = json.load(f)
+        return _knowledge_cache[path]
+
+_index_cache = {}
+
+def load_condition_index(path):
+    """Build the fuzzy condition index for a knowledge base file once per process"""
+    knowledge = load_medical_knowledge(path)
+    with _knowledge_lock:
+        if path not in _index_cache:
+            _index_cache[path] = ConditionIndex(knowledge)
+        return _index_cache[path]
+
+@instrument_methods(AGENT_HANDLER_DURATION, "agent", "nurse", include=lambda name: name == "process_message",
+                    method_label="handler")
 class NurseAgent:
-    def __init__(self):
-        # Medical knowledge base for common conditions
-        self.medical_knowledge = {
-            "diabetes": {
-                "description": "Diabetes is a chronic condition that affects how your body processes blood sugar (glucose).",
-                "medications": ["Insulin", "Metformin", "Glipizide"],
-                "care_instructions": [
-                    "Monitor blood glucose levels regularly",
-                    "Maintain a balanced diet with controlled carbohydrates",
-                    "Take medications as prescribed",
-                    "Exercise regularly",
-                    "Check feet daily for any wounds or infections"
-                ],
-                "vital_monitoring": "Monitor blood glucose levels 2-4 times daily, blood pressure, and weight"
-            },
-            "hypertension": {
-                "description": "Hypertension (high blood pressure) is a condition where the force of blood against artery walls is too high.",
-                "medications": ["Lisinopril", "Losartan", "Amlodipine", "Hydrochlorothiazide"],
-                "care_instructions": [
-                    "Monitor blood pressure daily",
-                    "Limit sodium intake",
-                    "Maintain regular exercise",
-                    "Take medications as prescribed",
-                    "Avoid smoking and excessive alcohol"
-                ],
-                "vital_monitoring": "Monitor blood pressure twice daily, heart rate, and weight"
-            },
-            "heart disease": {
-                "description": "Heart disease refers to conditions that affect the heart's structure and function.",
-                "medications": ["Aspirin", "Atorvastatin", "Metoprolol", "Lisinopril"],
-                "care_instructions": [
-                    "Monitor heart rate and blood pressure",
-                    "Follow a heart-healthy diet",
-                    "Exercise as recommended by physician",
-                    "Take medications as prescribed",
-                    "Report any chest pain or shortness of breath immediately"
-                ],
-                "vital_monitoring": "Monitor heart rate, blood pressure, weight, and oxygen saturation"
-            },
-            "asthma": {
-                "description": "Asthma is a chronic respiratory condition that causes inflammation and narrowing of airways.",
-                "medications": ["Albuterol inhaler", "Fluticasone", "Montelukast"],
-                "care_instructions": [
-                    "Use rescue inhaler as needed",
-                    "Avoid known triggers (allergens, smoke)",
-                    "Monitor peak flow readings",
-                    "Take controller medications as prescribed",
-                    "Keep emergency medications accessible"
-                ],
-                "vital_monitoring": "Monitor respiratory rate, peak flow, oxygen saturation, and airflow"
-            },
-            "arthritis": {
-                "description": "Arthritis is inflammation of one or more joints, causing pain and stiffness.",
-                "medications": ["Ibuprofen", "Naproxen", "Methotrexate", "Prednisone"],
-                "care_instructions": [
-                    "Apply heat or cold therapy as needed",
-                    "Maintain gentle range of motion exercises",
-                    "Take pain medications as prescribed",
-                    "Use assistive devices if needed",
-                    "Maintain healthy weight to reduce joint stress"
-                ],
-                "vital_monitoring": "Monitor pain levels, joint mobility, and medication effectiveness"
-            },
-            "respiratory problems": {
-                "description": "Respiratory problems can include various conditions affecting breathing and lung function.",
-                "medications": ["Albuterol", "Prednisone", "Azithromycin"],
-                "care_instructions": [
-                    "Monitor breathing patterns and oxygen levels",
-                    "Use oxygen therapy as prescribed",
-                    "Practice deep breathing exercises",
-                    "Avoid respiratory irritants",
-                    "Maintain good hydration"
-                ],
-                "vital_monitoring": "Monitor respiratory rate, oxygen saturation, and airflow"
-            },
-            "chicken pox": {
-                "description": "Chicken pox is a viral infection causing itchy rash and flu-like symptoms.",
-                "medications": ["Acyclovir", "Calamine lotion", "Acetaminophen"],
-                "care_instructions": [
-                    "Keep patient isolated to prevent spread",
-                    "Apply calamine lotion for itching",
-                    "Keep fingernails short to prevent scratching",
-                    "Maintain good hygiene",
-                    "Monitor for complications"
-                ],
-                "vital_monitoring": "Monitor temperature, rash progression, and signs of secondary infection"
-            },
-            "general checkup": {
-                "description": "Routine health examination to assess overall health and detect any issues early.",
-                "medications": ["Multivitamins", "Calcium supplements"],
-                "care_instructions": [
-                    "Maintain regular exercise routine",
-                    "Follow balanced diet",
-                    "Get adequate sleep",
-                    "Stay hydrated",
-                    "Schedule regular follow-ups"
-                ],
-                "vital_monitoring": "Monitor vital signs, weight, and general well-being"
-            }
-        }
+    def __init__(self, knowledge_path=None):
+        # Medical knowledge is read on first use, not at construction, to keep startup fast
+        self.knowledge_path = knowledge_path or os.environ.get("MEDICAL_KNOWLEDGE_PATH", DEFAULT_KNOWLEDGE_PATH)
+
+    @property
+    def medical_knowledge(self):
+        """Medical knowledge base for common conditions"""
+        return load_medical_knowledge(self.knowledge_path)
+
+    @property
+    def condition_index(self):
+        """Fuzzy index resolving patient condition strings to knowledge entries"""
+        return load_condition_index(self.knowledge_path)
 
     def process_message(self, message, patient_data):
         """Process a message about a specific patient"""
         message = message.lower()
         patient_name = patient_data['name']
-        patient_condition = patient_data['condition'].lower()
-        
-        # Extract medical knowledge for patient's condition
-        condition_info = self.medical_knowledge.get(patient_condition, {})
+
+        # Extract medical knowledge for patient's condition ("Heart Failure", "asthma (severe)", "COPD", ...)
+        condition_info = self.condition_index.lookup(patient_data['condition'])
         
         # --- General greetings ---
         if any(word in message for word in ["hello", "hi", "hey"]):
@@ -192,27 +134,53 @@ class NurseAgent:
         
         # --- General patient summary ---
         if any(phrase in message for phrase in ["summary", "overview", "tell me about", "patient info"]):
-            resp_status = self._get_respiratory_status(patient_data['respiratory_rate'])
-            airflow_status = self._get_airflow_status(patient_data['airflow'])
-            
-            summary = f"Patient Summary for {patient_name}:\n\n"
-            summary += f"• Patient ID: {patient_data['id']}\n"
-            summary += f"• Age: {patient_data['age']} years\n"
-            summary += f"• Condition: {patient_data['condition']}\n"
-            summary += f"• Floor: {patient_data['floor']}\n"
-            summary += f"• Last Visit: {patient_data['last_visit']}\n"
-            summary += f"• Current Vital Signs:\n"
-            summary += f"  - Respiratory Rate: {patient_data['respiratory_rate']} bpm ({resp_status})\n"
-            summary += f"  - Airflow: {patient_data['airflow']}% ({airflow_status})\n"
-            
-            if condition_info and condition_info.get('description'):
-                summary += f"\n• Condition Details: {condition_info['description']}"
-            
-            return summary
+            return self.patient_summary(patient_data, condition_info)
         
         # --- Default response ---
         return f"I can help you with information about {patient_name}. You can ask about:\n• Patient condition and diagnosis\n• Medications and prescriptions\n• Care instructions\n• Vital signs and monitoring\n• Patient summary\n\nWhat would you like to know?"
     
+    def patient_summary(self, patient_data, condition_info=None):
+        """Summary of a patient's details, current vitals and condition"""
+        patient_name = patient_data['name']
+        resp_status = self._get_respiratory_status(patient_data['respiratory_rate'])
+        airflow_status = self._get_airflow_status(patient_data['airflow'])
+        
+        summary = f"Patient Summary for {patient_name}:\n\n"
+        summary += f"• Patient ID: {patient_data['id']}\n"
+        summary += f"• Age: {patient_data['age']} years\n"
+        summary += f"• Condition: {patient_data['condition']}\n"
+        summary += f"• Floor: {patient_data['floor']}\n"
+        summary += f"• Last Visit: {patient_data['last_visit']}\n"
+        summary += f"• Current Vital Signs:\n"
+        summary += f"  - Respiratory Rate: {patient_data['respiratory_rate']} bpm ({resp_status})\n"
+        summary += f"  - Airflow: {patient_data['airflow']}% ({airflow_status})\n"
+        
+        if condition_info and condition_info.get('description'):
+            summary += f"\n• Condition Details: {condition_info['description']}"
+        
+        return summary
+
+    def handoff_summary(self, patient_data, recent_vitals, open_alerts):
+        """Shift handoff note: the patient summary plus recent readings, open alerts and what to monitor"""
+        condition_info = self.condition_index.lookup(patient_data['condition'])
+        summary = self.patient_summary(patient_data, condition_info)
+
+        if recent_vitals:
+            # Readings come newest first; show them oldest to newest so the trend reads left to right
+            readings = recent_vitals[::-1]
+            summary += f"\n• Recent Respiratory Rate: {' → '.join(str(v['respiratory_rate']) for v in readings)} bpm"
+            summary += f"\n• Recent Airflow: {' → '.join(str(v['airflow']) for v in readings)}%"
+
+        if open_alerts:
+            summary += f"\n• Open Alerts: {len(open_alerts)}"
+            for alert in open_alerts[:3]:
+                summary += f"\n  - {alert['severity']} {alert['alert_type']} ({alert['value']:g}) at {alert['created_at']}"
+
+        if condition_info and condition_info.get('vital_monitoring'):
+            summary += f"\n• Monitor: {condition_info['vital_monitoring']}"
+
+        return summary
+    
     def _get_respiratory_status(self, respiratory_rate):
         """Determine respiratory rate status"""
         if respiratory_rate >= 26:
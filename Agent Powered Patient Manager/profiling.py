@@ -0,0 +1,191 @@
+import collections
+import contextvars
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class SlowQueryLog:
+    """Keeps recent queries slower than a threshold, with their query plans.
+
+    Entries stay in a bounded in-memory buffer and, if a path is given, are
+    also appended to a JSON-lines file for later analysis."""
+
+    def __init__(self, threshold_ms: float = 100.0, path: Optional[str] = None, max_entries: int = 200):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self._entries = collections.deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, params, duration_ms: float, plan: List[str], db_path: str):
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'db': db_path,
+            'duration_ms': round(duration_ms, 3),
+            'sql': ' '.join(sql.split()),
+            'params': repr(params)[:500],
+            'plan': plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if self.path:
+                try:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry) + '\n')
+                except OSError as e:
+                    print(f"Error writing slow query log: {e}")
+        print(f"Slow query ({entry['duration_ms']} ms) on {db_path}: {entry['sql'][:200]}")
+
+    def entries(self) -> List[Dict]:
+        """Recorded slow queries, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+
+# Shared by every PatientDatabase; SLOW_QUERY_MS < 0 disables it
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 100)),
+    path=os.environ.get('SLOW_QUERY_LOG'),
+)
+
+# Queries executed by the current request, collected while it is being profiled
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that times every statement and reports the slow ones"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, parameters, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe(sql, seq_of_parameters[0] if seq_of_parameters else (),
+                          (time.perf_counter() - start) * 1000, batch=len(seq_of_parameters))
+
+    def _observe(self, sql, parameters, duration_ms, batch=None):
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.append((' '.join(sql.split())[:120], duration_ms))
+
+        threshold = slow_query_log.threshold_ms
+        if threshold < 0 or duration_ms < threshold:
+            return
+
+        plan = []
+        if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            try:
+                rows = sqlite3.Cursor(self.connection).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+                plan = [row[-1] for row in rows]
+            except sqlite3.Error as e:
+                plan = [f"unavailable: {e}"]
+        params = {'first': parameters, 'batch_size': batch} if batch is not None else parameters
+        slow_query_log.record(sql, params, duration_ms, plan, self.connection.db_path)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursors"""
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db_path = database
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and summarises where time went.
+
+    Lighter than cProfile for whole requests: the profiled code is not traced,
+    a side thread just looks at the target thread's current frame."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.001):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = collections.Counter()
+        self.total_counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._queries = None
+        self._token = None
+        self._started = 0.0
+        self.elapsed = 0.0
+
+    def _run(self):
+        app_root = os.path.dirname(os.path.abspath(__file__))
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                filename = code.co_filename
+                location = os.path.relpath(filename, app_root) if filename.startswith(app_root) else os.path.basename(filename)
+                key = f"{code.co_name} ({location}:{code.co_firstlineno})"
+                if leaf:
+                    self.self_counts[key] += 1
+                    leaf = False
+                if key not in seen:
+                    self.total_counts[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    def start(self):
+        self._queries = []
+        self._token = _request_queries.set(self._queries)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        _request_queries.reset(self._token)
+
+    def summary(self, limit: int = 15) -> Dict:
+        """Top functions by self and cumulative samples, plus the SQL run meanwhile"""
+        def top(counter):
+            return [
+                {'function': key, 'samples': count, 'percent': round(100.0 * count / self.samples, 1)}
+                for key, count in counter.most_common(limit)
+            ] if self.samples else []
+
+        return {
+            'elapsed_ms': round(self.elapsed * 1000, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'self': top(self.self_counts),
+            'cumulative': top(self.total_counts),
+            'queries': {
+                'count': len(self._queries),
+                'total_ms': round(sum(duration for _, duration in self._queries), 3),
+                'slowest': [
+                    {'sql': sql, 'duration_ms': round(duration, 3)}
+                    for sql, duration in sorted(self._queries, key=lambda q: q[1], reverse=True)[:5]
+                ],
+            },
+        }
@@ -0,0 +1,100 @@
+import gzip
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import Response
+
+# Optional speedups: orjson serialises several times faster than the stdlib and
+# brotli compresses JSON tighter than gzip. Both fall back cleanly when missing.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PATIENT_FIELDS = (
+    'id', 'name', 'age', 'condition', 'last_visit', 'floor', 'respiratory_rate', 'airflow',
+    'news_score', 'news_risk', 'created_at', 'updated_at',
+)
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj) -> bytes:
+    """Serialise to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Parse a `?fields=` list; None means every field. Raises ValueError on unknown names."""
+    if not value:
+        return None
+    requested = {f.strip() for f in value.split(',') if f.strip()}
+    unknown = sorted(requested.difference(PATIENT_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Valid fields: {', '.join(PATIENT_FIELDS)}")
+    # Canonical order, so equivalent requests share one cached response
+    return tuple(f for f in PATIENT_FIELDS if f in requested) or None
+
+
+def project(records: Iterable[Dict], fields: Optional[Tuple[str, ...]]) -> List[Dict]:
+    """Keep only the requested fields of each record"""
+    if fields is None:
+        return list(records)
+    return [{field: record.get(field) for field in fields} for record in records]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported content coding from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+
+    def allowed(coding):
+        return accepted.get(coding, accepted.get('*', 0.0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Compress a body with the negotiated coding, if it is worth it"""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+
+
+def encoded_json(obj, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Serialise and compress a payload for a client's Accept-Encoding"""
+    return compress(dumps(obj), negotiate_encoding(accept_encoding))
+
+
+def json_response(body: bytes, encoding: Optional[str], status: int = 200) -> Response:
+    """Wrap an already serialised (and possibly compressed) JSON body"""
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
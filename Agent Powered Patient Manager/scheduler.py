@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from werkzeug.wsgi import ClosingIterator
+from metrics import SCHEDULER_ACTIVE, SCHEDULER_QUEUE_DEPTH, SCHEDULER_QUEUE_WAIT, SCHEDULER_REJECTED
+
+# Request classes, most urgent first: (method or None for any, path prefix, class).
+# The first matching rule wins; anything unmatched is "interactive".
+DEFAULT_RULES = [
+    ('POST', '/api/vitals', 'critical'),
+    (None, '/api/alerts', 'critical'),
+    (None, '/metrics', 'critical'),
+    (None, '/api/patient-chat', 'chat'),
+    (None, '/api/reports', 'batch'),
+    (None, '/api/audit', 'batch'),
+]
+
+# class -> (max concurrent requests, max queued requests, seconds a request may wait in the queue).
+# Queued requests still hold a server thread, so the non-critical classes' concurrent + queued
+# totals should stay below the server's thread count (32 with the gunicorn command in the README),
+# leaving the remainder for clinical traffic.
+DEFAULT_LIMITS = {
+    'critical': (8, 64, 5.0),
+    'interactive': (8, 6, 2.0),
+    'chat': (4, 4, 10.0),
+    'batch': (1, 1, 30.0),
+}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int, float]]:
+    """Override limits from a spec like "chat=2/4/10,batch=1/0/30" (concurrent/queue/timeout)"""
+    limits = dict(DEFAULT_LIMITS)
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, values = part.partition('=')
+        concurrent, queue, timeout = values.split('/')
+        limits[name.strip()] = (int(concurrent), int(queue), float(timeout))
+    return limits
+
+
+class PriorityClass:
+    """A bounded pool of request slots with a bounded wait queue"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed; False if the queue is full or the wait times out"""
+        start = time.perf_counter()
+        with self._condition:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    SCHEDULER_REJECTED.inc(priority=self.name, reason='queue_full')
+                    return False
+                self.waiting += 1
+                SCHEDULER_QUEUE_DEPTH.set(self.waiting, priority=self.name)
+                try:
+                    if not self._condition.wait_for(lambda: self.active < self.max_concurrent, self.queue_timeout):
+                        SCHEDULER_REJECTED.inc(priority=self.name, reason='timeout')
+                        return False
+                finally:
+                    self.waiting -= 1
+                    SCHEDULER_QUEUE_DEPTH.set(self.waiting, priority=self.name)
+            self.active += 1
+            SCHEDULER_ACTIVE.set(self.active, priority=self.name)
+        SCHEDULER_QUEUE_WAIT.observe(time.perf_counter() - start, priority=self.name)
+        return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            SCHEDULER_ACTIVE.set(self.active, priority=self.name)
+            self._condition.notify()
+
+    def status(self) -> Dict:
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+        }
+
+
+class RequestScheduler:
+    """WSGI middleware that admits each request through its priority class's pool.
+
+    Every class has its own slots, so a chat surge or a long export can only
+    exhaust its own class: ingestion and alert traffic keep their reserved
+    capacity. Requests that cannot be admitted get a fast 503 with Retry-After
+    instead of tying up the server."""
+
+    def __init__(self, app: Callable, limits: Optional[Dict[str, Tuple[int, int, float]]] = None,
+                 rules: Optional[List[Tuple[Optional[str], str, str]]] = None):
+        self.app = app
+        self.rules = rules or DEFAULT_RULES
+        self.classes = {
+            name: PriorityClass(name, *class_limits)
+            for name, class_limits in (limits or DEFAULT_LIMITS).items()
+        }
+
+    def classify(self, method: str, path: str) -> str:
+        """Priority class for a request"""
+        for rule_method, prefix, name in self.rules:
+            if (rule_method is None or rule_method == method) and path.startswith(prefix):
+                return name
+        return 'interactive'
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: priority_class.status() for name, priority_class in self.classes.items()}
+
+    def __call__(self, environ, start_response):
+        priority_class = self.classes[self.classify(environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', ''))]
+        if not priority_class.acquire():
+            body = json.dumps({'error': f'Server busy ({priority_class.name} requests), please retry'}).encode('utf-8')
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body))),
+                ('Retry-After', '1'),
+            ])
+            return [body]
+
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            priority_class.release()
+            raise
+        # Hold the slot until the body has been sent, which matters for streamed responses
+        return ClosingIterator(response, priority_class.release)
+
+
+def scheduler_from_env(app: Callable) -> Callable:
+    """Wrap a WSGI app in a RequestScheduler unless REQUEST_SCHEDULER=0"""
+    if os.environ.get('REQUEST_SCHEDULER', '1') == '0':
+        return app
+    return RequestScheduler(app, parse_limits(os.environ.get('SCHEDULER_LIMITS', '')))
@@ -0,0 +1,359 @@
+import base64
+import glob
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from database import PatientDatabase, INITIAL_PATIENTS
+from early_warning import EarlyWarningScorer
+from storage import PatientStorage, patient_sort_key
+from metrics import STORAGE_OPERATION_DURATION, instrument_methods
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run a single process there
+    fcntl = None
+
+# Alert (and alert delivery) ids are only unique inside one shard file, so the sharded
+# database hands out `local_id * ALERT_ID_STRIDE + shard` to keep them globally unique.
+ALERT_ID_STRIDE = 1000
+
+
+class ShardRouter:
+    """Maps floors to shard numbers and shard numbers to SQLite files"""
+
+    def __init__(self, shard_dir: str, floor_map: Optional[Dict[int, int]] = None):
+        self.shard_dir = shard_dir
+        # Optional floor -> shard grouping (e.g. several small floors in one ward file)
+        self.floor_map = floor_map or {}
+
+    def shard_for_floor(self, floor: int) -> int:
+        """Shard number that owns a floor"""
+        shard = self.floor_map.get(int(floor), int(floor))
+        if not 0 <= shard < ALERT_ID_STRIDE:
+            raise ValueError(f"Shard number must be between 0 and {ALERT_ID_STRIDE - 1}, got {shard}")
+        return shard
+
+    def path_for_shard(self, shard: int) -> str:
+        """SQLite file backing a shard"""
+        return os.path.join(self.shard_dir, f"patients_shard_{shard}.db")
+
+    def existing_shards(self) -> List[int]:
+        """Shard numbers that already have a file on disk"""
+        shards = []
+        for path in glob.glob(os.path.join(self.shard_dir, "patients_shard_*.db")):
+            match = re.search(r'patients_shard_(\d+)\.db$', path)
+            if match:
+                shards.append(int(match.group(1)))
+        return sorted(shards)
+
+
+@instrument_methods(STORAGE_OPERATION_DURATION, "engine", "sharded", exclude=("data_files",))
+class ShardedPatientDatabase(PatientStorage):
+    """PatientDatabase split into one SQLite file per floor (or ward).
+
+    Writes go to the owning shard only, so wards no longer queue behind a
+    single writer lock. Cross-shard reads fan out over a thread pool and
+    merge the per-shard results, which are already sorted by SQLite."""
+
+    def __init__(self, shard_dir: str, floor_map: Optional[Dict[int, int]] = None,
+                 scorer: Optional[EarlyWarningScorer] = None, max_workers: int = 8, seed: bool = True):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.router = ShardRouter(shard_dir, floor_map)
+        self.scorer = scorer or EarlyWarningScorer()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard")
+        self.shards: Dict[int, PatientDatabase] = {}
+        self._shards_lock = threading.Lock()
+        # patient id -> shard number, filled lazily so id lookups skip the fan-out
+        self._patient_shards: Dict[str, int] = {}
+        # Shard that delivery claims start from, rotated so one busy ward can't starve the rest
+        self._claim_start = 0
+
+        if seed:
+            self._seed()
+        else:
+            self._discover_shards()
+
+    def _seed(self):
+        """Open the existing shards, adding the demo census if there are none. Gunicorn workers
+        start together, so this runs under an exclusive lock on the directory and no worker can
+        see a half-seeded census"""
+        with open(os.path.join(self.router.shard_dir, 'shards.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+            self._discover_shards()
+            if not self.shards:
+                for patient in INITIAL_PATIENTS:
+                    self.add_patient(patient)
+
+    def _get_shard(self, shard: int) -> PatientDatabase:
+        """Open (and create on first use) the database for a shard"""
+        with self._shards_lock:
+            if shard not in self.shards:
+                self.shards[shard] = PatientDatabase(self.router.path_for_shard(shard), scorer=self.scorer, seed=False)
+            return self.shards[shard]
+
+    def _discover_shards(self):
+        """Open shard files another process created since this one started"""
+        for shard in self.router.existing_shards():
+            if shard not in self.shards:
+                self._get_shard(shard)
+
+    def _floor_shard(self, floor: int) -> Optional[PatientDatabase]:
+        """The open database owning a floor, or None if the floor has no shard (yet)"""
+        try:
+            shard = self.router.shard_for_floor(floor)
+        except ValueError:
+            return None  # no floor outside the shard range can hold patients
+        if shard not in self.shards and os.path.exists(self.router.path_for_shard(shard)):
+            self._get_shard(shard)
+        return self.shards.get(shard)
+
+    def data_files(self) -> List[str]:
+        """SQLite files backing every shard. The change watcher polls this, so new shards
+        are opened (and watched) within one poll interval"""
+        self._discover_shards()
+        return [db.db_path for db in list(self.shards.values())]
+
+    def _fan_out(self, operation: Callable[[PatientDatabase], Any]) -> Dict[int, Any]:
+        """Run an operation on every shard in parallel, keyed by shard number"""
+        shards = list(self.shards.items())
+        results = self.executor.map(lambda item: operation(item[1]), shards)
+        return {shard: result for (shard, _), result in zip(shards, results)}
+
+    def _locate_patient(self, patient_id: str) -> Optional[int]:
+        """Find the shard that holds a patient"""
+        if patient_id in self._patient_shards:
+            return self._patient_shards[patient_id]
+
+        self._discover_shards()
+        for shard, patient in self._fan_out(lambda db: db.get_patient_by_id(patient_id)).items():
+            if patient:
+                self._patient_shards[patient_id] = shard
+                return shard
+        return None
+
+    @staticmethod
+    def _encode_alert(shard: int, alert: Dict) -> Dict:
+        alert['id'] = alert['id'] * ALERT_ID_STRIDE + shard
+        return alert
+
+    def add_patient(self, patient_data: Dict) -> bool:
+        """Add a new patient to the shard owning their floor"""
+        try:
+            shard = self.router.shard_for_floor(patient_data['floor'])
+        except ValueError as e:
+            print(f"Error adding patient: {e}")
+            return False
+        if self._get_shard(shard).add_patient(patient_data):
+            self._patient_shards[patient_data['id']] = shard
+            return True
+        return False
+
+    def get_all_patients(self) -> List[Dict]:
+        """Get all patients from every shard"""
+        return list(heapq.merge(*self._fan_out(lambda db: db.get_all_patients()).values(), key=lambda p: p['name']))
+
+    def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
+        """Get a specific patient by ID"""
+        shard = self._locate_patient(patient_id)
+        return self.shards[shard].get_patient_by_id(patient_id) if shard is not None else None
+
+    def update_patient_vitals(self, patient_id: str, respiratory_rate: int, airflow: int) -> bool:
+        """Update patient vital signs on the owning shard"""
+        shard = self._locate_patient(patient_id)
+        if shard is None:
+            return False
+        return self.shards[shard].update_patient_vitals(patient_id, respiratory_rate, airflow)
+
+    def ingest_vitals_batch(self, readings: List[Dict]) -> Optional[List[Dict]]:
+        """Split an ingest tick by shard and apply the parts in parallel; each shard raises its own patients' alerts"""
+        by_shard: Dict[int, List[Dict]] = {}
+        for reading in readings:
+            shard = self._locate_patient(reading['patient_id'])
+            if shard is not None:
+                by_shard.setdefault(shard, []).append(reading)
+
+        results = list(self.executor.map(lambda item: self.shards[item[0]].ingest_vitals_batch(item[1]), by_shard.items()))
+        if any(alerts is None for alerts in results):
+            return None
+        return [alert for alerts in results for alert in alerts]
+
+    def get_latest_vitals(self, floor: Optional[int] = None, limit: int = 5) -> Dict[str, List[Dict]]:
+        """One floor's readings come from its shard, the whole hospital's from every shard"""
+        if floor is not None:
+            db = self._floor_shard(floor)
+            return db.get_latest_vitals(floor, limit) if db else {}
+        latest = {}
+        for shard_latest in self._fan_out(lambda db: db.get_latest_vitals(None, limit)).values():
+            latest.update(shard_latest)
+        return latest
+
+    def get_vitals_journal_checkpoint(self, journal: str) -> int:
+        """The lowest shard checkpoint: replay starts there and each shard skips what it already has"""
+        checkpoints = self._fan_out(lambda db: db.get_vitals_journal_checkpoint(journal)).values()
+        return min(checkpoints, default=0)
+
+    def apply_vitals_journal(self, journal: str, records: List[Dict], through_sequence: int) -> bool:
+        """Apply each shard's readings in parallel; every shard's checkpoint advances, even with no readings"""
+        by_shard: Dict[int, List[Dict]] = {shard: [] for shard in self.shards}
+        # Locate each patient once; unknown ids would otherwise fan out for every reading
+        shards = {patient_id: self._locate_patient(patient_id) for patient_id in {r['patient_id'] for r in records}}
+        for record in records:
+            if shards[record['patient_id']] is not None:
+                by_shard[shards[record['patient_id']]].append(record)
+
+        results = self.executor.map(
+            lambda item: self.shards[item[0]].apply_vitals_journal(journal, item[1], through_sequence),
+            by_shard.items())
+        return all(results)
+
+    def rescore_all_patients(self) -> bool:
+        """Recompute early-warning scores on every shard"""
+        return all(self._fan_out(lambda db: db.rescore_all_patients()).values())
+
+    def get_ranked_patients(self, limit: int = 10) -> List[Dict]:
+        """Merge each shard's top-K into the hospital-wide top-K"""
+        candidates = [patient for ranked in self._fan_out(lambda db: db.get_ranked_patients(limit)).values() for patient in ranked]
+        return self.scorer.top_k(candidates, limit)
+
+    def get_floor_summaries(self) -> List[Dict]:
+        """Each floor lives in exactly one shard, so the shards' summaries just concatenate"""
+        summaries = itertools.chain.from_iterable(self._fan_out(lambda db: db.get_floor_summaries()).values())
+        return sorted(summaries, key=lambda summary: summary['floor'])
+
+    def get_patient_vitals_history(self, patient_id: str, limit: int = 10) -> List[Dict]:
+        """Get historical vital signs for a patient"""
+        shard = self._locate_patient(patient_id)
+        return self.shards[shard].get_patient_vitals_history(patient_id, limit) if shard is not None else []
+
+    def get_patient_vitals_range(self, patient_id: str, start: Optional[str] = None,
+                                 end: Optional[str] = None) -> List[Dict]:
+        """Get a patient's vital signs in a time range from the owning shard"""
+        shard = self._locate_patient(patient_id)
+        return self.shards[shard].get_patient_vitals_range(patient_id, start, end) if shard is not None else []
+
+    def add_alert(self, patient_id: str, alert_type: str, severity: str, value: float, message: str = None) -> bool:
+        """Add an alert on the shard holding the patient"""
+        shard = self._locate_patient(patient_id)
+        if shard is None:
+            return False
+        return self.shards[shard].add_alert(patient_id, alert_type, severity, value, message)
+
+    def get_unacknowledged_alerts(self) -> List[Dict]:
+        """Get unacknowledged alerts from every shard, newest first"""
+        per_shard = [
+            [self._encode_alert(shard, alert) for alert in alerts]
+            for shard, alerts in self._fan_out(lambda db: db.get_unacknowledged_alerts()).items()
+        ]
+        return list(heapq.merge(*per_shard, key=lambda a: a['created_at'], reverse=True))
+
+    def get_alert(self, alert_id: int) -> Optional[Dict]:
+        """Get an alert by its sharded id"""
+        shard, local_id = alert_id % ALERT_ID_STRIDE, alert_id // ALERT_ID_STRIDE
+        if shard not in self.shards:
+            return None
+        alert = self.shards[shard].get_alert(local_id)
+        return self._encode_alert(shard, alert) if alert else None
+
+    def acknowledge_alert(self, alert_id: int) -> bool:
+        """Acknowledge an alert by its sharded id"""
+        shard, local_id = alert_id % ALERT_ID_STRIDE, alert_id // ALERT_ID_STRIDE
+        if shard not in self.shards:
+            return False
+        return self.shards[shard].acknowledge_alert(local_id)
+
+    def queue_alert_deliveries(self, sink: str, severities: Optional[List[str]] = None) -> int:
+        """Queue deliveries for new alerts on every shard"""
+        return sum(self._fan_out(lambda db: db.queue_alert_deliveries(sink, severities)).values())
+
+    def claim_alert_deliveries(self, sink: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """Lease due deliveries shard by shard until `limit` is reached"""
+        shards = sorted(self.shards)
+        if not shards:
+            return []
+        self._claim_start = (self._claim_start + 1) % len(shards)
+        deliveries = []
+        for shard in shards[self._claim_start:] + shards[:self._claim_start]:
+            for delivery in self.shards[shard].claim_alert_deliveries(sink, limit - len(deliveries), lease_seconds):
+                delivery['delivery_id'] = delivery['delivery_id'] * ALERT_ID_STRIDE + shard
+                deliveries.append(self._encode_alert(shard, delivery))
+            if len(deliveries) >= limit:
+                break
+        return deliveries
+
+    def update_alert_deliveries(self, delivery_ids: List[int], status: str, error: Optional[str] = None,
+                                retry_at: Optional[float] = None) -> bool:
+        """Record delivery outcomes on the shards that own them"""
+        by_shard: Dict[int, List[int]] = {}
+        for delivery_id in delivery_ids:
+            by_shard.setdefault(delivery_id % ALERT_ID_STRIDE, []).append(delivery_id // ALERT_ID_STRIDE)
+        return all(
+            self.shards[shard].update_alert_deliveries(local_ids, status, error, retry_at)
+            for shard, local_ids in by_shard.items() if shard in self.shards
+        )
+
+    def get_patients_by_floor(self, floor: int) -> List[Dict]:
+        """Get all patients on a specific floor from its shard"""
+        db = self._floor_shard(floor)
+        return db.get_patients_by_floor(floor) if db else []
+
+    def get_patient_changes(self, since: Optional[str] = None, floor: Optional[int] = None) -> Tuple[List[Dict], str]:
+        """Merge each shard's changes; the cursor carries every shard's own cursor, and a shard
+        missing from it (opened since) sends all its patients"""
+        cursors = {}
+        if since:
+            try:
+                cursors = json.loads(base64.urlsafe_b64decode(since.encode('ascii')))
+            except (ValueError, UnicodeError):
+                raise ValueError("Invalid change cursor")
+            if not isinstance(cursors, dict):
+                raise ValueError("Invalid change cursor")
+
+        shards = dict(self.shards)
+        if floor is not None:
+            db = self._floor_shard(floor)
+            shards = {self.router.shard_for_floor(floor): db} if db else {}
+
+        def changes(item):
+            shard, db = item
+            return str(shard), db.get_patient_changes(cursors.get(str(shard)), floor)
+
+        results = dict(self.executor.map(changes, shards.items()))
+        cursors.update((shard, cursor) for shard, (_, cursor) in results.items())
+        patients = list(heapq.merge(*(changed for changed, _ in results.values()), key=lambda p: p['name']))
+        return patients, base64.urlsafe_b64encode(json.dumps(cursors, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+    def search_patients(self, search_term: str) -> List[Dict]:
+        """Search patients by name or ID across every shard"""
+        return list(heapq.merge(*self._fan_out(lambda db: db.search_patients(search_term)).values(), key=lambda p: p['name']))
+
+    def query_patients(self, floor: Optional[int] = None, status: Optional[str] = None,
+                       condition: Optional[str] = None, sort: str = 'name',
+                       after: Optional[List] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Route a floor query to its shard; otherwise merge each shard's first `limit` rows"""
+        def query(db):
+            return db.query_patients(floor, status, condition, sort, after, limit)
+
+        if floor is not None:
+            db = self._floor_shard(floor)
+            return query(db) if db else []
+
+        merged = heapq.merge(*self._fan_out(query).values(), key=lambda p: patient_sort_key(p, sort))
+        return list(itertools.islice(merged, limit))
+
+    def get_critical_patients(self) -> List[Dict]:
+        """Get patients with critical vital signs"""
+        return list(heapq.merge(*self._fan_out(lambda db: db.get_critical_patients()).values(), key=lambda p: p['name']))
+
+    def get_warning_patients(self) -> List[Dict]:
+        """Get patients with warning vital signs"""
+        return list(heapq.merge(*self._fan_out(lambda db: db.get_warning_patients()).values(), key=lambda p: p['name']))
+
+    def get_normal_patients(self) -> List[Dict]:
+        """Get patients with normal vital signs"""
+        return list(heapq.merge(*self._fan_out(lambda db: db.get_normal_patients()).values(), key=lambda p: p['name']))
@@ -6,6 +6,10 @@ const currentUserSpan = document.getElementById('current-user');
 let airflowUpdateInterval = null;
 let notificationQueue = [];
 let isNotificationShowing = false;
+// Server change cursor: each poll asks only for patients changed since the last one
+let patientChangeCursor = null;
+const patientsById = new Map();
+const PATIENT_FIELDS = 'id,name,floor,respiratory_rate,airflow';
 
 // Initialize the app
 document.addEventListener('DOMContentLoaded', function() {
@@ -19,9 +23,15 @@ document.addEventListener('DOMContentLoaded', function() {
             currentUserSpan.textContent = storedUsername;
         }
         
-        loadPatients();
         setupPatientEventListeners();
-        startAirflowUpdates();
+        // /patients?benchmark=10000 measures rendering frame time instead of loading real data
+        const benchmarkSize = new URLSearchParams(window.location.search).get('benchmark');
+        if (benchmarkSize && typeof runDashboardBenchmark === 'function') {
+            runDashboardBenchmark(Number(benchmarkSize));
+        } else {
+            loadPatients();
+            startAirflowUpdates();
+        }
     } else {
         // Just show login form for home page
         showLoginForm();
@@ -78,15 +88,25 @@ function setupPatientEventListeners() {
     if (floorSelect) {
         floorSelect.addEventListener('change', handleFloorFilter);
     }
+
+    // The list only renders the rows in view, so scrolling and resizing render a new window
+    const container = document.getElementById('patients-container');
+    if (container) {
+        container.addEventListener('scroll', scheduleRenderWindow);
+        window.addEventListener('resize', () => {
+            patientRowHeight = 0; // cards may wrap differently at the new width
+            renderPatients(visiblePatients);
+        });
+    }
 }
 
 // Load patients data
 async function loadPatients() {
     try {
-        const response = await fetch('/api/patients');
-        if (response.ok) {
-            const patients = await response.json();
+        const patients = await fetchPatientChanges();
+        if (patients) {
             window.allPatients = patients;
+            patients.forEach(patient => patientsById.set(patient.id, patient));
             renderPatients(patients);
         }
     } catch (error) {
@@ -94,32 +114,157 @@ async function loadPatients() {
     }
 }
 
+// Patients changed since the last call (all of them on the first), or null if the request failed
+async function fetchPatientChanges() {
+    // A floor nurse station (/patients?floor=3) only downloads its own floor
+    const params = new URLSearchParams({ fields: PATIENT_FIELDS });
+    const stationFloor = new URLSearchParams(window.location.search).get('floor');
+    if (stationFloor) {
+        params.set('floor', stationFloor);
+    }
+    if (patientChangeCursor !== null) {
+        params.set('since', patientChangeCursor);
+    }
+    const response = await fetch(`/api/patients/changes?${params}`);
+    if (!response.ok) return null;
+    const patients = await response.json();
+    patientChangeCursor = response.headers.get('X-Change-Cursor');
+    return patients;
+}
+
+// Windowed patient list: only the cards in (or just outside) the viewport exist in the DOM,
+// keyed by patient id, so a 10,000-bed census renders as cheaply as a screenful
+const ROW_OVERSCAN = 5;
+let visiblePatients = [];
+let patientRowHeight = 0;
+const patientRows = new Map(); // patient id -> card currently in the DOM
+let renderWindowScheduled = false;
+
 // Render patients on the page
 function renderPatients(patients) {
     const container = document.getElementById('patients-container');
+    visiblePatients = patients;
     
     if (patients.length === 0) {
+        patientRows.clear();
         container.innerHTML = '<div class="empty-state"><h3>No patients found</h3></div>';
         return;
     }
     
-    const patientsHTML = patients.map(patient => `
-        <div class="patient-card">
-            <div class="patient-info">
-                <div class="patient-name">${patient.name}</div>
-                <div class="ventilation-data">
-                    <span class="respiratory-rate-value" data-status="${getRespiratoryStatus(patient.respiratory_rate)}">Respiratory Rate: ${patient.respiratory_rate} bpm</span>
-                    <span class="airflow-value" data-status="${getAirflowStatus(patient.airflow)}">Airflow: ${patient.airflow}%</span>
-                </div>
-            </div>
-            <div class="patient-id">${patient.id}</div>
-            <div class="patient-actions">
-                <button class="btn-view" onclick="viewPatient('${patient.id}')">View</button>
+    let spacer = container.querySelector('.patients-spacer');
+    if (!spacer) {
+        patientRows.clear();
+        container.innerHTML = '<div class="patients-spacer"></div>';
+        spacer = container.querySelector('.patients-spacer');
+    }
+    if (!patientRowHeight) {
+        patientRowHeight = measurePatientRow(spacer, patients[0]);
+    }
+    // The spacer is as tall as the whole list so the scrollbar behaves as if every card were there
+    spacer.style.height = `${patients.length * patientRowHeight}px`;
+    renderWindow();
+}
+
+function scheduleRenderWindow() {
+    if (renderWindowScheduled) return;
+    renderWindowScheduled = true;
+    requestAnimationFrame(() => {
+        renderWindowScheduled = false;
+        renderWindow();
+    });
+}
+
+// Bring the cards in view up to date, reusing cards that scrolled out for ones scrolling in
+function renderWindow() {
+    const container = document.getElementById('patients-container');
+    const spacer = container.querySelector('.patients-spacer');
+    if (!spacer || !patientRowHeight) return;
+    
+    const first = Math.max(0, Math.floor(container.scrollTop / patientRowHeight) - ROW_OVERSCAN);
+    const last = Math.min(visiblePatients.length,
+        Math.ceil((container.scrollTop + container.clientHeight) / patientRowHeight) + ROW_OVERSCAN);
+    const wanted = new Set();
+    for (let index = first; index < last; index++) {
+        wanted.add(visiblePatients[index].id);
+    }
+    
+    const spareRows = [];
+    patientRows.forEach((row, patientId) => {
+        if (!wanted.has(patientId)) {
+            patientRows.delete(patientId);
+            spareRows.push(row);
+        }
+    });
+    
+    for (let index = first; index < last; index++) {
+        const patient = visiblePatients[index];
+        let row = patientRows.get(patient.id);
+        if (!row) {
+            row = spareRows.pop() || spacer.appendChild(createPatientRow());
+            patientRows.set(patient.id, row);
+        }
+        patchPatientRow(row, patient, index);
+    }
+    spareRows.forEach(row => row.remove());
+}
+
+function createPatientRow() {
+    const row = document.createElement('div');
+    row.className = 'patient-card';
+    row.innerHTML = `
+        <div class="patient-info">
+            <div class="patient-name"></div>
+            <div class="ventilation-data">
+                <span class="respiratory-rate-value"></span>
+                <span class="airflow-value"></span>
             </div>
         </div>
-    `).join('');
-    
-    container.innerHTML = patientsHTML;
+        <div class="patient-id"></div>
+        <div class="patient-actions">
+            <button class="btn-view">View</button>
+        </div>
+    `;
+    row.querySelector('.btn-view').addEventListener('click', () => viewPatient(row.dataset.patientId));
+    return row;
+}
+
+// Write only what differs from what the card already shows, so unchanged cards cost no DOM work
+function patchPatientRow(row, patient, index) {
+    const top = `${index * patientRowHeight}px`;
+    if (row.style.top !== top) {
+        row.style.top = top;
+    }
+    if (row.dataset.patientId !== patient.id) {
+        row.dataset.patientId = patient.id;
+    }
+    patchText(row.querySelector('.patient-name'), patient.name);
+    patchText(row.querySelector('.patient-id'), patient.id);
+    patchVital(row.querySelector('.respiratory-rate-value'),
+        `Respiratory Rate: ${patient.respiratory_rate} bpm`, getRespiratoryStatus(patient.respiratory_rate));
+    patchVital(row.querySelector('.airflow-value'), `Airflow: ${patient.airflow}%`, getAirflowStatus(patient.airflow));
+}
+
+function patchText(element, text) {
+    if (element.textContent !== text) {
+        element.textContent = text;
+    }
+}
+
+function patchVital(element, text, status) {
+    patchText(element, text);
+    if (element.dataset.status !== status) {
+        element.dataset.status = status;
+    }
+}
+
+// Height of one card plus the gap below it, measured once with a real card
+function measurePatientRow(spacer, patient) {
+    const row = createPatientRow();
+    spacer.appendChild(row);
+    patchPatientRow(row, patient, 0);
+    const height = row.offsetHeight + parseFloat(getComputedStyle(row).marginBottom || 0);
+    row.remove();
+    return height || 1;
 }
 
 // Patient action functions
@@ -133,6 +278,7 @@ function viewPatient(patientId) {
 // functions for filtering out patients
 function handleFloorFilter(event) {
     const selectedFloor = event.target.value;
+    document.getElementById('patients-container').scrollTop = 0;
     filterPatientsByFloor(selectedFloor);
 }
 
@@ -174,38 +320,56 @@ function startAirflowUpdates() {
         clearInterval(airflowUpdateInterval);
     }
     
-    // Update airflow values every 15 seconds
+    // Fetch changed vitals every 15 seconds
     airflowUpdateInterval = setInterval(updateAirflowValues, 15000);
 }
 
-function updateAirflowValues() {
+async function updateAirflowValues() {
     if (!window.allPatients) return;
     
-    // Update airflow and respiratory rate values for all patients
-    window.allPatients.forEach(patient => {
+    let changedPatients;
+    try {
+        changedPatients = await fetchPatientChanges();
+    } catch (error) {
+        console.error('Error fetching patient changes:', error);
+        return;
+    }
+    if (!changedPatients || changedPatients.length === 0) return;
+    
+    applyPatientChanges(changedPatients);
+    
+    // Re-render the current view; only cards in view whose values changed are touched
+    const floorSelect = document.getElementById('floor-select');
+    if (floorSelect) {
+        filterPatientsByFloor(floorSelect.value);
+    } else {
+        renderPatients(window.allPatients);
+    }
+}
+
+// Merge changed patients into the loaded census, alerting on any that crossed into a worse band
+function applyPatientChanges(changedPatients) {
+    let added = false;
+    changedPatients.forEach(changed => {
+        const patient = patientsById.get(changed.id);
+        if (!patient) {
+            patientsById.set(changed.id, changed);
+            window.allPatients.push(changed);
+            added = true;
+            return;
+        }
+        
         const oldAirflow = patient.airflow;
         const oldRespiratoryRate = patient.respiratory_rate;
-        
-        // Generate realistic airflow changes (-5 to +5 range)
-        const airflowChange = Math.floor(Math.random() * 11) - 5; // -5 to +5
-        const newAirflow = Math.max(1, Math.min(100, patient.airflow + airflowChange));
-        patient.airflow = newAirflow;
-        
-        // Generate realistic respiratory rate changes (-3 to +3 range)
-        const respiratoryChange = Math.floor(Math.random() * 7) - 3; // -3 to +3
-        const newRespiratoryRate = Math.max(1, Math.min(40, patient.respiratory_rate + respiratoryChange));
-        patient.respiratory_rate = newRespiratoryRate;
+        Object.assign(patient, changed);
         
         // Check for critical conditions and create alerts
         checkForCriticalConditions(patient, oldAirflow, oldRespiratoryRate);
     });
     
-    // Re-render the current view
-    const floorSelect = document.getElementById('floor-select');
-    if (floorSelect) {
-        filterPatientsByFloor(floorSelect.value);
-    } else {
-        renderPatients(window.allPatients);
+    if (added) {
+        // Same order as the server (SQLite compares names byte by byte)
+        window.allPatients.sort((a, b) => (a.name < b.name ? -1 : a.name > b.name ? 1 : 0));
     }
 }
 
@@ -0,0 +1,111 @@
+// Dashboard rendering benchmark: open /patients?benchmark=10000
+//
+// Builds a synthetic census of that many patients and, on every animation frame,
+// applies a delta like one poll of /api/patients/changes (a tenth of the patients'
+// vitals change) and re-renders the list: first by rebuilding every card's HTML (how
+// the dashboard used to render), then through the keyed, windowed list. Frame time is
+// measured between animation frames, so it includes style, layout and paint.
+const BENCHMARK_FRAMES = 120;
+const BENCHMARK_CHANGED_FRACTION = 0.1;
+
+function makeBenchmarkPatients(count) {
+    const patients = [];
+    for (let i = 0; i < count; i++) {
+        patients.push({
+            id: `B${String(i).padStart(6, '0')}`,
+            name: `Benchmark Patient ${String(i).padStart(6, '0')}`,
+            floor: (i % 5) + 1,
+            respiratory_rate: 12 + Math.floor(Math.random() * 10),
+            airflow: 70 + Math.floor(Math.random() * 30)
+        });
+    }
+    return patients;
+}
+
+// Random walk on a fraction of the census, the size of a typical server delta
+function applyBenchmarkDelta(patients) {
+    const changes = Math.max(1, Math.floor(patients.length * BENCHMARK_CHANGED_FRACTION));
+    for (let i = 0; i < changes; i++) {
+        const patient = patients[Math.floor(Math.random() * patients.length)];
+        patient.airflow = Math.max(1, Math.min(100, patient.airflow + Math.floor(Math.random() * 11) - 5));
+        patient.respiratory_rate = Math.max(1, Math.min(40, patient.respiratory_rate + Math.floor(Math.random() * 7) - 3));
+    }
+}
+
+// The previous renderer: every card's HTML rebuilt on every update
+function rebuildAllPatientCards(patients) {
+    const container = document.getElementById('patients-container');
+    container.innerHTML = patients.map(patient => `
+        <div class="patient-card">
+            <div class="patient-info">
+                <div class="patient-name">${patient.name}</div>
+                <div class="ventilation-data">
+                    <span class="respiratory-rate-value" data-status="${getRespiratoryStatus(patient.respiratory_rate)}">Respiratory Rate: ${patient.respiratory_rate} bpm</span>
+                    <span class="airflow-value" data-status="${getAirflowStatus(patient.airflow)}">Airflow: ${patient.airflow}%</span>
+                </div>
+            </div>
+            <div class="patient-id">${patient.id}</div>
+            <div class="patient-actions">
+                <button class="btn-view" onclick="viewPatient('${patient.id}')">View</button>
+            </div>
+        </div>
+    `).join('');
+}
+
+// Run renderFrame on BENCHMARK_FRAMES consecutive frames and summarize the gaps between them
+function measureFrames(label, renderFrame) {
+    return new Promise(resolve => {
+        const frameTimes = [];
+        let previous = null;
+
+        function frame(now) {
+            if (previous !== null) {
+                frameTimes.push(now - previous);
+            }
+            previous = now;
+            if (frameTimes.length === BENCHMARK_FRAMES) {
+                frameTimes.sort((a, b) => a - b);
+                resolve({
+                    renderer: label,
+                    'median ms': frameTimes[Math.floor(frameTimes.length / 2)].toFixed(1),
+                    'p95 ms': frameTimes[Math.floor(frameTimes.length * 0.95)].toFixed(1),
+                    'max ms': frameTimes[frameTimes.length - 1].toFixed(1)
+                });
+                return;
+            }
+            renderFrame();
+            requestAnimationFrame(frame);
+        }
+        requestAnimationFrame(frame);
+    });
+}
+
+async function runDashboardBenchmark(count) {
+    count = count > 0 ? count : 10000;
+    const container = document.getElementById('patients-container');
+    const output = document.createElement('pre');
+    output.id = 'benchmark-results';
+    output.textContent = `Benchmarking ${count} patients over ${BENCHMARK_FRAMES} frames...`;
+    container.parentNode.insertBefore(output, container);
+
+    const patients = makeBenchmarkPatients(count);
+    window.allPatients = patients;
+
+    const results = [];
+    results.push(await measureFrames('full rebuild', () => {
+        applyBenchmarkDelta(patients);
+        rebuildAllPatientCards(patients);
+    }));
+
+    container.innerHTML = '';
+    container.scrollTop = 0;
+    results.push(await measureFrames('keyed + windowed', () => {
+        applyBenchmarkDelta(patients);
+        renderPatients(patients);
+    }));
+
+    console.table(results);
+    output.textContent = [`${count} patients, ${Math.round(BENCHMARK_CHANGED_FRACTION * 100)}% changed per frame`]
+        .concat(results.map(r => `${r.renderer.padEnd(18)} median ${r['median ms']} ms  p95 ${r['p95 ms']} ms  max ${r['max ms']} ms`))
+        .join('\n');
+}
@@ -0,0 +1,206 @@
+import base64
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+
+# Sort orders for query_patients: the keyset columns and whether each is
+# descending. id comes last so every key is unique and pages never overlap.
+PATIENT_SORTS = {
+    'name': (('name', False), ('id', False)),
+    'floor': (('floor', False), ('name', False), ('id', False)),
+    'news_score': (('news_score', True), ('name', False), ('id', False)),
+}
+PATIENT_STATUSES = ('critical', 'warning', 'normal')
+
+
+def patient_sort_key(patient: Dict, sort: str) -> Tuple:
+    """Comparable key for a patient (or keyset dict) in the given sort order"""
+    return tuple(-patient[column] if descending else patient[column] for column, descending in PATIENT_SORTS[sort])
+
+
+def encode_cursor(patient: Dict, sort: str) -> str:
+    """Opaque pagination cursor holding the last row's keyset values"""
+    values = [patient[column] for column, _ in PATIENT_SORTS[sort]]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, sort: str) -> List:
+    """Keyset values from a cursor; raises ValueError if it is malformed or for another sort"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != len(PATIENT_SORTS[sort]):
+        raise ValueError("Invalid cursor for this sort order")
+    return values
+
+
+class PatientStorage(ABC):
+    """Storage interface shared by the SQLite, sharded SQLite and in-memory engines"""
+
+    @abstractmethod
+    def data_files(self) -> List[str]:
+        """SQLite files backing this storage (empty if there are none)"""
+
+    # Patients
+    @abstractmethod
+    def add_patient(self, patient_data: Dict) -> bool:
+        """Add a new patient"""
+
+    @abstractmethod
+    def get_all_patients(self) -> List[Dict]:
+        """Get all patients ordered by name"""
+
+    @abstractmethod
+    def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
+        """Get a specific patient by ID"""
+
+    @abstractmethod
+    def get_patients_by_floor(self, floor: int) -> List[Dict]:
+        """Get all patients on a specific floor ordered by name"""
+
+    @abstractmethod
+    def search_patients(self, search_term: str) -> List[Dict]:
+        """Search patients by name or ID"""
+
+    @abstractmethod
+    def get_patient_changes(self, since: Optional[str] = None, floor: Optional[int] = None) -> Tuple[List[Dict], str]:
+        """Patients added or updated after the change cursor `since` (every patient if it is None),
+        ordered by name, and the cursor to pass next time. Cursors are opaque to callers and raise
+        ValueError if malformed."""
+
+    @abstractmethod
+    def query_patients(self, floor: Optional[int] = None, status: Optional[str] = None,
+                       condition: Optional[str] = None, sort: str = 'name',
+                       after: Optional[List] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Filter and sort patients, returning at most `limit` rows after the keyset `after`"""
+
+    # Vitals
+    @abstractmethod
+    def update_patient_vitals(self, patient_id: str, respiratory_rate: int, airflow: int) -> bool:
+        """Update patient vital signs and log the change"""
+
+    @abstractmethod
+    def ingest_vitals_batch(self, readings: List[Dict]) -> Optional[List[Dict]]:
+        """Apply one ingest tick of vital sign readings and rescore the census. Alerts for readings
+        that cross into a worse band (alerting.evaluate_alerts, against the stored vitals) are
+        recorded in the same write; returns them, or None if the write failed."""
+
+    @abstractmethod
+    def get_patient_vitals_history(self, patient_id: str, limit: int = 10) -> List[Dict]:
+        """Get historical vital signs for a patient, newest first"""
+
+    @abstractmethod
+    def get_patient_vitals_range(self, patient_id: str, start: Optional[str] = None,
+                                 end: Optional[str] = None) -> List[Dict]:
+        """Get a patient's vital signs between two timestamps (inclusive), oldest first"""
+
+    @abstractmethod
+    def get_latest_vitals(self, floor: Optional[int] = None, limit: int = 5) -> Dict[str, List[Dict]]:
+        """Each patient's newest `limit` readings (newest first) for one floor or the whole
+        hospital, keyed by patient id, in one bulk read; patients with no readings are omitted"""
+
+    @abstractmethod
+    def get_vitals_journal_checkpoint(self, journal: str) -> int:
+        """Last journal sequence number applied to storage (0 if none)"""
+
+    @abstractmethod
+    def apply_vitals_journal(self, journal: str, records: List[Dict], through_sequence: int) -> bool:
+        """Apply journaled readings (with their own timestamps) in one transaction, skipping any
+        at or below the checkpoint, and move the checkpoint to `through_sequence` atomically.
+        Alerts are raised as in ingest_vitals_batch."""
+
+    # Early-warning scores
+    @abstractmethod
+    def rescore_all_patients(self) -> bool:
+        """Recompute early-warning scores for every patient"""
+
+    @abstractmethod
+    def get_ranked_patients(self, limit: int = 10) -> List[Dict]:
+        """Get the patients with the highest early-warning scores"""
+
+    # Floor summaries
+    @abstractmethod
+    def get_floor_summaries(self) -> List[Dict]:
+        """Per-floor patient and status counts, lowest airflow, highest respiratory rate and open
+        alert count, ordered by floor. Kept up to date on every write, so reading costs O(floors)."""
+
+    # Alerts
+    @abstractmethod
+    def add_alert(self, patient_id: str, alert_type: str, severity: str, value: float, message: str = None) -> bool:
+        """Add an alert"""
+
+    @abstractmethod
+    def get_unacknowledged_alerts(self) -> List[Dict]:
+        """Get all unacknowledged alerts, newest first"""
+
+    @abstractmethod
+    def get_alert(self, alert_id: int) -> Optional[Dict]:
+        """Get one alert (with patient_name) by id, or None"""
+
+    @abstractmethod
+    def acknowledge_alert(self, alert_id: int) -> bool:
+        """Acknowledge an alert"""
+
+    # Alert notification deliveries
+    @abstractmethod
+    def queue_alert_deliveries(self, sink: str, severities: Optional[List[str]] = None) -> int:
+        """Queue a pending delivery to `sink` for each alert newer than the sink's high-water mark
+        (a sink seen for the first time starts from the latest alert); returns how many were queued"""
+
+    @abstractmethod
+    def claim_alert_deliveries(self, sink: str, limit: int, lease_seconds: float) -> List[Dict]:
+        """Lease up to `limit` due deliveries for a sink, oldest first, joined with their alerts.
+        Leased deliveries are hidden from other workers until the lease runs out."""
+
+    @abstractmethod
+    def update_alert_deliveries(self, delivery_ids: List[int], status: str, error: Optional[str] = None,
+                                retry_at: Optional[float] = None) -> bool:
+        """Record the outcome of one attempt: 'delivered', 'failed', or 'pending' to retry at `retry_at`"""
+
+    # Status queries
+    @abstractmethod
+    def get_critical_patients(self) -> List[Dict]:
+        """Get patients with critical vital signs"""
+
+    @abstractmethod
+    def get_warning_patients(self) -> List[Dict]:
+        """Get patients with warning vital signs"""
+
+    @abstractmethod
+    def get_normal_patients(self) -> List[Dict]:
+        """Get patients with normal vital signs"""
+
+
+def patient_db_path() -> str:
+    """The single-file SQLite database, PATIENT_DB_PATH (patients.db by default)"""
+    return os.environ.get('PATIENT_DB_PATH', 'patients.db')
+
+
+def open_storage() -> PatientStorage:
+    """Open the storage engine selected by the environment.
+
+    PATIENT_STORAGE=sqlite (default) uses PATIENT_DB_PATH (patients.db), or one
+    file per floor when PATIENT_DB_SHARD_DIR is set. PATIENT_STORAGE=memory keeps everything
+    in memory, persisted to PATIENT_MEMORY_DIR when that is set (its append log is
+    fsynced on every write unless PATIENT_MEMORY_SYNC=0). The memory engine is single-process
+    only: every worker would hold its own census, so a second process opening the same
+    PATIENT_MEMORY_DIR fails."""
+    engine = os.environ.get('PATIENT_STORAGE', 'sqlite').lower()
+
+    if engine == 'memory':
+        from memory_storage import InMemoryPatientStorage
+        return InMemoryPatientStorage(os.environ.get('PATIENT_MEMORY_DIR'),
+                                      sync=os.environ.get('PATIENT_MEMORY_SYNC', '1') != '0')
+
+    if engine != 'sqlite':
+        raise ValueError(f"Unknown PATIENT_STORAGE engine: {engine}")
+
+    shard_dir = os.environ.get('PATIENT_DB_SHARD_DIR')
+    if shard_dir:
+        from sharding import ShardedPatientDatabase
+        return ShardedPatientDatabase(shard_dir)
+
+    from database import PatientDatabase
+    return PatientDatabase(patient_db_path())
@@ -0,0 +1,107 @@
+import sqlite3
+import time
+
+import pytest
+
+from database import PatientDatabase
+from notifications import AlertNotifier, WebhookSink, StubReceiver
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return PatientDatabase(str(tmp_path / "patients.db"))
+
+
+@pytest.fixture
+def receiver():
+    stub = StubReceiver().start()
+    yield stub
+    stub.stop()
+
+
+def make_notifier(storage, receiver, **kwargs):
+    sink = WebhookSink(receiver.url, timeout=2.0)
+    notifier = AlertNotifier(storage, [sink], **kwargs)
+    # A sink starts from the latest alert, so register it before raising any
+    assert notifier.run_once(sink) == 0
+    return notifier, sink
+
+
+def deliveries(storage):
+    conn = sqlite3.connect(storage.db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute('SELECT * FROM alert_deliveries ORDER BY id')]
+    conn.close()
+    return rows
+
+
+def test_delivers_new_alerts(storage, receiver):
+    notifier, sink = make_notifier(storage, receiver)
+    storage.add_alert("P001", "respiratory_rate", "critical", 32, "Respiratory rate 32 bpm")
+    storage.add_alert("P002", "airflow", "warning", 72, "Airflow 72%")
+
+    assert notifier.run_once(sink) == 2
+    assert len(receiver.received) == 1
+    alerts = receiver.received[0]['alerts']
+    assert [alert['patient_id'] for alert in alerts] == ["P001", "P002"]
+    assert alerts[0]['severity'] == "critical" and alerts[0]['patient_name']
+    assert [(d['status'], d['attempts']) for d in deliveries(storage)] == [('delivered', 1), ('delivered', 1)]
+
+    # Delivered alerts are never sent again
+    assert notifier.run_once(sink) == 0
+    assert len(receiver.received) == 1
+
+
+def test_failed_batch_is_retried_after_backoff(storage, receiver):
+    notifier, sink = make_notifier(storage, receiver, base_backoff=0.2)
+    storage.add_alert("P001", "respiratory_rate", "critical", 32)
+    receiver.failure_rate = 1.0
+
+    before = time.time()
+    assert notifier.run_once(sink) == 0
+    after = time.time()
+    [delivery] = deliveries(storage)
+    assert (delivery['status'], delivery['attempts']) == ('pending', 1)
+    assert '503' in delivery['last_error']
+    # First retry waits base_backoff, jittered down to no less than half of it
+    assert before + 0.1 <= delivery['next_attempt_at'] <= after + 0.2
+
+    # Not due yet, so nothing is sent
+    assert notifier.run_once(sink) == 0
+    assert receiver.failures == 1
+
+    receiver.failure_rate = 0.0
+    time.sleep(max(0.0, delivery['next_attempt_at'] - time.time()) + 0.01)
+    assert notifier.run_once(sink) == 1
+    assert len(receiver.received) == 1
+    [delivery] = deliveries(storage)
+    assert (delivery['status'], delivery['attempts']) == ('delivered', 2)
+
+
+def test_delivery_fails_after_max_attempts(storage, receiver):
+    notifier, sink = make_notifier(storage, receiver, max_attempts=3, base_backoff=0.01)
+    storage.add_alert("P001", "respiratory_rate", "critical", 32)
+    receiver.failure_rate = 1.0
+
+    assert notifier.run_once(sink) == 0
+    for _ in range(2):
+        [delivery] = deliveries(storage)
+        time.sleep(max(0.0, delivery['next_attempt_at'] - time.time()) + 0.01)
+        assert notifier.run_once(sink) == 0
+
+    [delivery] = deliveries(storage)
+    assert (delivery['status'], delivery['attempts']) == ('failed', 3)
+    assert receiver.failures == 3
+
+    # A failed delivery is not retried, even once the sink recovers
+    receiver.failure_rate = 0.0
+    time.sleep(0.05)
+    assert notifier.run_once(sink) == 0
+    assert receiver.failures == 3 and receiver.received == []
+
+
+def test_backoff_doubles_up_to_the_cap(storage):
+    notifier = AlertNotifier(storage, [], base_backoff=2.0, max_backoff=10.0)
+    for attempts, ceiling in [(1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (10, 10.0)]:
+        for _ in range(20):
+            assert ceiling / 2 <= notifier.backoff(attempts) <= ceiling
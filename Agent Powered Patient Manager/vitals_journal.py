@@ -0,0 +1,306 @@
+import glob
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+from metrics import VITALS_JOURNAL_COMPACTION_DURATION, VITALS_JOURNAL_PENDING
+from storage import PatientStorage
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run a single process there
+    fcntl = None
+
+# sequence, unix timestamp, patient id, respiratory rate, airflow, padding, CRC-32 of the preceding bytes.
+# 64 bytes, so records never straddle a page and a torn or unwritten record fails its checksum.
+RECORD = struct.Struct('<Qd32sii4xI')
+RECORD_BODY = RECORD.size - 4
+PATIENT_ID_BYTES = 32
+INT32_RANGE = range(-2 ** 31, 2 ** 31)
+# Records per segment file (4 MiB); fully compacted segments are deleted
+SEGMENT_RECORDS = 65536
+
+
+def format_timestamp(timestamp: float) -> str:
+    """Unix time in the same format as SQLite's CURRENT_TIMESTAMP"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+
+
+class JournalSegment:
+    """One preallocated, memory-mapped segment file holding records first_sequence onwards"""
+
+    def __init__(self, path: str, first_sequence: int, capacity: int):
+        self.path = path
+        self.first_sequence = first_sequence
+        self.capacity = capacity
+        with open(path, 'a+b') as f:
+            if os.fstat(f.fileno()).st_size < capacity * RECORD.size:
+                f.truncate(capacity * RECORD.size)
+            self.mmap = mmap.mmap(f.fileno(), capacity * RECORD.size)
+        self.count = self._scan()
+
+    def _scan(self) -> int:
+        """Number of valid records, stopping at the first unwritten or torn one"""
+        for index in range(self.capacity):
+            record = self.record_at(index)
+            if record is None or record[0] != self.first_sequence + index:
+                return index
+        return self.capacity
+
+    def record_at(self, index: int) -> Optional[Tuple]:
+        offset = index * RECORD.size
+        raw = self.mmap[offset:offset + RECORD.size]
+        fields = RECORD.unpack(raw)
+        if fields[-1] != zlib.crc32(raw[:RECORD_BODY]) or fields[0] == 0:
+            return None
+        return fields
+
+    def clear_tail(self):
+        """Zero whatever follows the last valid record, so records after a torn one can't
+        reappear once new appends reach them"""
+        start = self.count * RECORD.size
+        tail = self.mmap[start:]
+        if tail.count(0) != len(tail):
+            self.mmap[start:] = bytes(len(tail))
+            self.mmap.flush()
+
+    @property
+    def last_sequence(self) -> int:
+        return self.first_sequence + self.count - 1
+
+    def close(self):
+        self.mmap.close()
+
+
+class VitalsJournal:
+    """Append-only, memory-mapped journal of vital sign readings.
+
+    Appends are sequential writes into a preallocated mapping, so a reading
+    is safe from a process crash as soon as append returns (and from power
+    loss too when sync is on) without waiting for a SQLite commit. The
+    directory is locked for as long as the journal is open, so each worker
+    process writes its own journal."""
+
+    def __init__(self, directory: str, segment_records: int = SEGMENT_RECORDS, sync: bool = True):
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.segment_records = segment_records
+        self.sync = sync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(directory, 'journal.lock'), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise
+
+        self.segments: List[JournalSegment] = []
+        for path in sorted(glob.glob(os.path.join(directory, 'vitals-*.journal'))):
+            first_sequence = int(re.search(r'vitals-(\d+)\.journal$', path).group(1))
+            segment = JournalSegment(path, first_sequence, segment_records)
+            if self.segments and first_sequence != self.segments[-1].last_sequence + 1:
+                # Anything after a gap was never acknowledged as contiguous; drop it
+                segment.close()
+                os.remove(path)
+                continue
+            self.segments.append(segment)
+        if self.segments:
+            self.segments[-1].clear_tail()
+        else:
+            self._new_segment(1)
+
+    def _new_segment(self, first_sequence: int) -> JournalSegment:
+        path = os.path.join(self.directory, f'vitals-{first_sequence:020d}.journal')
+        segment = JournalSegment(path, first_sequence, self.segment_records)
+        self.segments.append(segment)
+        return segment
+
+    @property
+    def last_sequence(self) -> int:
+        """Sequence number of the newest record (0 if the journal has never been written)"""
+        return self.segments[-1].last_sequence
+
+    def append(self, readings: List[Dict]) -> int:
+        """Write readings to the journal; returns the last sequence number written.
+        Raises ValueError (before writing anything) if a reading cannot be stored."""
+        now = time.time()
+        bodies = []
+        for reading in readings:
+            patient_id = str(reading['patient_id']).encode('utf-8')
+            if len(patient_id) > PATIENT_ID_BYTES:
+                raise ValueError(f"Patient id longer than {PATIENT_ID_BYTES} bytes: {reading['patient_id']}")
+            respiratory_rate, airflow = int(reading['respiratory_rate']), int(reading['airflow'])
+            if respiratory_rate not in INT32_RANGE or airflow not in INT32_RANGE:
+                raise ValueError(f"Vital sign out of range for {reading['patient_id']}")
+            bodies.append((patient_id, respiratory_rate, airflow))
+
+        with self._lock:
+            segment = self.segments[-1]
+            dirty_start = segment.count * RECORD.size
+            for patient_id, respiratory_rate, airflow in bodies:
+                if segment.count == segment.capacity:
+                    self._flush(segment, dirty_start)
+                    segment = self._new_segment(segment.last_sequence + 1)
+                    dirty_start = 0
+                sequence = segment.first_sequence + segment.count
+                body = RECORD.pack(sequence, now, patient_id, respiratory_rate, airflow, 0)[:RECORD_BODY]
+                offset = segment.count * RECORD.size
+                segment.mmap[offset:offset + RECORD.size] = body + struct.pack('<I', zlib.crc32(body))
+                segment.count += 1
+            self._flush(segment, dirty_start)
+            return segment.last_sequence
+
+    def _flush(self, segment: JournalSegment, dirty_start: int):
+        """msync the records written since dirty_start, when syncing is on"""
+        if self.sync and segment.count * RECORD.size > dirty_start:
+            start = dirty_start - dirty_start % mmap.ALLOCATIONGRANULARITY
+            segment.mmap.flush(start, segment.count * RECORD.size - start)
+
+    def read(self, after_sequence: int, limit: int) -> List[Dict]:
+        """Up to `limit` records with sequence numbers after `after_sequence`, oldest first"""
+        records = []
+        with self._lock:
+            for segment in self.segments:
+                if segment.last_sequence <= after_sequence:
+                    continue
+                for index in range(max(0, after_sequence + 1 - segment.first_sequence), segment.count):
+                    sequence, timestamp, patient_id, respiratory_rate, airflow, _ = segment.record_at(index)
+                    records.append({
+                        'sequence': sequence,
+                        'patient_id': patient_id.rstrip(b'\0').decode('utf-8'),
+                        'respiratory_rate': respiratory_rate,
+                        'airflow': airflow,
+                        'timestamp': format_timestamp(timestamp),
+                    })
+                    if len(records) >= limit:
+                        return records
+        return records
+
+    def release(self, through_sequence: int):
+        """Delete segments whose records have all been compacted (never the one being written)"""
+        with self._lock:
+            while len(self.segments) > 1 and self.segments[0].last_sequence <= through_sequence:
+                segment = self.segments.pop(0)
+                segment.close()
+                os.remove(segment.path)
+
+    def close(self):
+        with self._lock:
+            for segment in self.segments:
+                if self.sync:
+                    segment.mmap.flush()
+                segment.close()
+            self.segments = []
+        self._lock_file.close()
+
+
+class JournalCompactor:
+    """Folds journaled readings into patient storage in large transactions.
+
+    Storage records each journal's checkpoint in the same transaction as the
+    readings, so a crash between compactions replays from the checkpoint and
+    nothing is applied twice."""
+
+    def __init__(self, journal: VitalsJournal, storage: PatientStorage, interval: float = 0.5,
+                 batch_records: int = 10000, on_apply: Optional[Callable[[], None]] = None):
+        self.journal = journal
+        self.storage = storage
+        self.interval = interval
+        self.batch_records = batch_records
+        # Called after readings reach storage, e.g. to drop cached patient lists
+        self.on_apply = on_apply
+        self._stop = threading.Event()
+        self._thread = None
+
+    def compact(self, journal: Optional[VitalsJournal] = None) -> int:
+        """Apply everything journaled so far; returns the number of readings applied"""
+        journal = journal or self.journal
+        applied = 0
+        checkpoint = self.storage.get_vitals_journal_checkpoint(journal.name)
+        while True:
+            records = journal.read(checkpoint, self.batch_records)
+            if not records:
+                break
+            start = time.perf_counter()
+            if not self.storage.apply_vitals_journal(journal.name, records, records[-1]['sequence']):
+                break  # leave the records in the journal and retry on the next pass
+            VITALS_JOURNAL_COMPACTION_DURATION.observe(time.perf_counter() - start)
+            checkpoint = records[-1]['sequence']
+            applied += len(records)
+        journal.release(checkpoint)
+        if applied and self.on_apply:
+            self.on_apply()
+        if journal is self.journal:
+            VITALS_JOURNAL_PENDING.set(journal.last_sequence - checkpoint)
+        return applied
+
+    def recover(self, orphans: List[VitalsJournal]):
+        """Replay this worker's journal and fold in (then delete) any extra journals left by dead workers"""
+        replayed = self.compact()
+        for orphan in orphans:
+            replayed += self.compact(orphan)
+            orphan.close()
+            shutil.rmtree(orphan.directory)
+        if replayed:
+            print(f"Replayed {replayed} journaled vital sign readings")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting vitals journal: {e}")
+
+    def start(self):
+        """Compact on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="vitals-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the compactor after a final pass and close the journal"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.compact()
+        self.journal.close()
+
+
+def open_journals(root: str, sync: bool = True) -> Tuple[VitalsJournal, List[VitalsJournal]]:
+    """Lock this process's journal under `root`: the first one no live process holds,
+    or a new one. Also returns the other unheld journals so they can be replayed."""
+    os.makedirs(root, exist_ok=True)
+    journals = []
+    for name in sorted(os.listdir(root)):
+        if os.path.isdir(os.path.join(root, name)):
+            try:
+                journals.append(VitalsJournal(os.path.join(root, name), sync=sync))
+            except OSError:
+                continue  # held by a running worker
+    if not journals:
+        journals.append(VitalsJournal(os.path.join(root, f'journal-{uuid.uuid4().hex[:8]}'), sync=sync))
+    return journals[0], journals[1:]
+
+
+def journal_from_env(storage: PatientStorage, on_apply: Optional[Callable[[], None]] = None) -> Optional[JournalCompactor]:
+    """Open, replay and start compacting a vitals journal under VITALS_JOURNAL_DIR, or None if it is unset.
+    VITALS_JOURNAL_SYNC=0 skips msync (a process crash loses nothing, power loss may)."""
+    root = os.environ.get('VITALS_JOURNAL_DIR')
+    if not root:
+        return None
+    journal, orphans = open_journals(root, sync=os.environ.get('VITALS_JOURNAL_SYNC', '1') != '0')
+    compactor = JournalCompactor(journal, storage, interval=float(os.environ.get('VITALS_COMPACT_SECONDS', 0.5)),
+                                 on_apply=on_apply)
+    compactor.recover(orphans)
+    compactor.start()
+    return compactor
@@ -0,0 +1,9 @@
+"""
+Production entry point for running under a WSGI server, e.g.
+
+    gunicorn -w 4 -k gthread --threads 32 -b 0.0.0.0:5001 wsgi:application
+"""
+
+from app import create_app
+
+application = create_app()